@@ -1,5 +1,7 @@
 from pathlib import Path
 import struct
+import zlib
+import numpy as np
 
 def generate_crc32_table(initial_polynome: int = 0x04C11DB7) -> list[int]:
     def bit_sum(byte: int) -> int:
@@ -18,14 +20,60 @@ def crc32_stm(bytes_arr: bytes, crc: int = 0xffffffff) -> int:
             crc = ((crc << 8) & 0xffffffff) ^ table_val
     return crc
 
-def check_firmware_crc(bytes_arr: bytes) -> bool:
-    crc: int = 0xFFFFFFFF
-    for i in range(0, len(bytes_arr)-4, 4):
-        if (crc == 0) and (i == int.from_bytes(bytes_arr[i:i+4], 'little')*4):
-            return True
-        crc = crc32_stm(bytes_arr[i:i+4], crc=crc)
+def generate_slicing_tables(table: list[int] = crc_table, n: int = 4) -> list[list[int]]:
+    """Slicing-by-N tables: tables[k][b] is byte b at the top of the register shifted through 8*(k+1) bits."""
+    tables = [table]
+    for _ in range(n - 1):
+        tables.append([((val << 8) & 0xffffffff) ^ table[val >> 24] for val in tables[-1]])
+    return tables
+
+crc_tables: list[list[int]] = generate_slicing_tables()
+
+# The STM32 CRC is the reflected CRC32 (zlib) with the bits of every word mirrored on the way in and out
+_rev8: bytes = bytes(int(f"{i:08b}"[::-1], 2) for i in range(256))
+
+def _bitrev32(val: int) -> int:
+    return int(f"{val:032b}"[::-1], 2)
 
-    return False
+def crc32_stm_fast(bytes_arr: bytes, crc: int = 0xffffffff) -> int:
+    """Same as crc32_stm, computed by zlib. Length % 4 = 0, any bytes-like input."""
+    mirrored = np.frombuffer(bytes_arr, dtype='<u4').byteswap().tobytes().translate(_rev8)
+    return _bitrev32(~zlib.crc32(mirrored, ~_bitrev32(crc) & 0xffffffff) & 0xffffffff)
+
+def crc32_stm_find_end(bytes_arr: bytes) -> tuple[int, int, bool]:
+    """
+    Scans the words of a firmware image (all but the last one) for its end: the first index at which the CRC of
+    the words before it is 0, i.e. the image ends with its own CRC word.
+    Returns (index, CRC of the words before index - 1, found); without an end, the last index scanned.
+    Images followed by their size in words (the index itself) are checked with crc32_stm_fast from those
+    candidates only; the word-by-word slicing-by-4 loop runs when none of them matches.
+    """
+    count = (len(bytes_arr) - 1) // 4
+    if count <= 0:
+        return 0, 0, False
+    words = np.frombuffer(bytes_arr, dtype='<u4', count=count)
+    crc, pos = 0xFFFFFFFF, 0
+    for idx in np.flatnonzero(words == np.arange(count, dtype='<u4')):
+        if idx == 0:
+            continue
+        crc, pos = crc32_stm_fast(bytes_arr[pos * 4:idx * 4], crc), int(idx)
+        if crc == 0:
+            # A step of the register is zero only for a zero input, so the CRC before the CRC word is that word
+            return pos, int(words[pos - 1]), True
+
+    t0, t1, t2, t3 = crc_tables
+    crc, prev_crc = 0xFFFFFFFF, 0
+    for idx, word in enumerate(words.tolist()):
+        if crc == 0:
+            return idx, prev_crc, True
+        prev_crc = crc
+        x = crc ^ word
+        crc = t3[x >> 24] ^ t2[(x >> 16) & 0xFF] ^ t1[(x >> 8) & 0xFF] ^ t0[x & 0xFF]
+    return count - 1, prev_crc, False
+
+def check_firmware_crc(bytes_arr: bytes) -> bool:
+    idx, _, found = crc32_stm_find_end(bytes_arr)
+    return found and idx == int.from_bytes(bytes_arr[idx * 4:idx * 4 + 4], 'little')
 
 if __name__ == '__main__':
     fw_path: Path = Path(__file__).parent / 'FWs' / 'OMMCU_v02_09_00_r.bin'
@@ -1,54 +1,144 @@
 from OM_comm_interface import *
+from OM_metrics import CommMetrics
 import threading
 import queue
 import time
 import asyncio
-from usb_can_driver.usb_can import USB_CAN_Driver
-from usb_can_driver.canv_structs import IVar
+from collections import namedtuple
+try:
+    from usb_can_driver.canv_structs import IVar
+except ImportError:
+    # Without the driver package only a stand-in driver (OM_simulator.SimUSBCANDriver) can be used,
+    # which takes the variable address in the same (dev, var, offset) order
+    IVar = namedtuple("IVar", "dev_id var_id offset")
 
-bg = 0
-diff = 0
+# Modbus-over-CAN gateway variable: 8 bytes of config followed by the register data
+MBCAN_VAR_ID        = 9
+MBCAN_CFG_LEN       = 8
+MBCAN_FCODE_READ    = 0x03
+MBCAN_FCODE_WRITE   = 0x10
+
+# Exec-status byte (first byte of the config): host writes 0, gateway sets it once the transaction is done.
+# Gateways that leave it at 0 (a dummy byte in older firmware) are waited out for MBCAN_EXEC_FALLBACK
+# as before, until the gateway has once reported a status.
+MBCAN_EXEC_PENDING  = 0x00
+MBCAN_EXEC_ERR_MASK = 0x80
+
+MBCAN_EXEC_TIMEOUT  = 1.0
+MBCAN_EXEC_FALLBACK = 0.05
+MBCAN_POLL_MIN      = 0.002
+MBCAN_POLL_MAX      = 0.02
+
+
+def MBCAN_build_cfg(port: int, fcode: int, slave_id: int, address: int, count: int):
+    return bytearray([
+        0,  # exec status (dummy)
+        port,
+        fcode,
+        slave_id,
+        address & 0xFF,
+        (address >> 8) & 0xFF,
+        count & 0xFF,
+        (count >> 8) & 0xFF,
+    ])
+
+def MBCAN_registers_to_bytes(registers: list):
+    data_bytes = bytearray()
+    for reg in registers:
+        data_bytes += reg.to_bytes(2, "big")
+    return data_bytes
+
+def MBCAN_parse_registers(data: bytes, count: int):
+    return [int.from_bytes(data[MBCAN_CFG_LEN+i*2:MBCAN_CFG_LEN+i*2+2], "big") for i in range(count)]
+
+async def MBCAN_wait_exec(can_driver, dev_id: int, exec_timeout: float = MBCAN_EXEC_TIMEOUT, fallback: float = None):
+    """
+    Polls the exec-status byte of var 9 until the gateway finishes the transaction.
+    Poll interval starts short and doubles up to MBCAN_POLL_MAX.
+    With fallback set, a byte still at 0 after fallback seconds is taken as done (gateway without exec status).
+    Returns the status byte, MBCAN_EXEC_PENDING on fallback or None on deadline.
+    """
+    ivar = IVar(dev_id, MBCAN_VAR_ID, 0)
+    t_start = time.monotonic()
+    deadline = t_start + exec_timeout
+    interval = MBCAN_POLL_MIN
+    while True:
+        status = (await can_driver.read(ivar, d_len=1))[0]
+        if status != MBCAN_EXEC_PENDING:
+            return status
+        now = time.monotonic()
+        if fallback is not None and now - t_start >= fallback:
+            return MBCAN_EXEC_PENDING
+        if now + interval > deadline:
+            return None
+        if fallback is not None:
+            interval = min(interval, t_start + fallback - now)
+        await asyncio.sleep(interval)
+        interval = min(interval * 2, MBCAN_POLL_MAX)
+
+async def _MBCAN_exec_status(can_driver, dev_id: int, exec_timeout: float, exec_state: dict):
+    """MBCAN_wait_exec with the fallback on until the gateway has reported a status (recorded in exec_state)."""
+    reports = exec_state is not None and exec_state.get("reports_status", False)
+    status = await MBCAN_wait_exec(can_driver, dev_id, exec_timeout, fallback=None if reports else MBCAN_EXEC_FALLBACK)
+    if status and exec_state is not None and not reports:
+        exec_state["reports_status"] = True
+    return status
+
+async def MBCAN_transact(can_driver, dev_id: int, port: int, request, exec_timeout: float = MBCAN_EXEC_TIMEOUT, exec_state: dict = None):
+    """
+    Runs one Modbus transaction through the CAN gateway.
+    exec_state: per-gateway dict remembering whether it reports the exec status (see MBCAN_EXEC_FALLBACK).
+    """
+    if request.type == ModbusRequestType.READ:
+        ivar = IVar(dev_id, MBCAN_VAR_ID, 0)
+        payload = MBCAN_build_cfg(port, MBCAN_FCODE_READ, request.slave_id, request.address, request.count)
+        await can_driver.write(ivar, payload)
+        status = await _MBCAN_exec_status(can_driver, dev_id, exec_timeout, exec_state)
+        if status is None:
+            return {"error": "Exec timeout"}
+        if status & MBCAN_EXEC_ERR_MASK:
+            return {"error": f"Exec status 0x{status:02X}"}
+        data = await can_driver.read(ivar, d_len=MBCAN_CFG_LEN + request.count * 2)
+        return {"data": MBCAN_parse_registers(data, request.count)}
+    elif request.type == ModbusRequestType.WRITE_MULTY:
+        # Data goes after the config, config write triggers the transaction
+        payload = MBCAN_registers_to_bytes(request.registers)
+        await can_driver.write(IVar(dev_id, MBCAN_VAR_ID, MBCAN_CFG_LEN), payload)
+        payload_cmd = MBCAN_build_cfg(port, MBCAN_FCODE_WRITE, request.slave_id, request.address, len(request.registers))
+        await can_driver.write(IVar(dev_id, MBCAN_VAR_ID, 0), payload_cmd)
+        status = await _MBCAN_exec_status(can_driver, dev_id, exec_timeout, exec_state)
+        if status is None:
+            return {"error": "Exec timeout"}
+        if status & MBCAN_EXEC_ERR_MASK:
+            return {"error": f"Exec status 0x{status:02X}"}
+        return {"status": "success"}
+    else:
+        return {"error": "Unsupported request type"}
 
 class MBOverCANWorker(threading.Thread, OMCommInterface):
-    def __init__(self, can_driver, dev_id=4, port_to_use=0):
+    def __init__(self, can_driver, dev_id=4, port_to_use=0, exec_timeout=MBCAN_EXEC_TIMEOUT):
         super().__init__()
         self.can_driver = can_driver
         self.dev_id = dev_id
         self.port_to_use = port_to_use
+        self.exec_timeout = exec_timeout
+        self.exec_state = {}
         self.request_queue = queue.Queue(maxsize=100)
-        self.response_queue = queue.Queue()
+        self.pending = PendingRequests()
+        self.metrics = CommMetrics()
         self.running = False
         self.loop = None
 
-    def send_request(self, request, blocking=True, timeout=5, silent=False):
-        self.request_queue.put((request, silent))
-        if blocking:
-            start_time = time.time()
-            while True:
-                try:
-                    response = self.response_queue.get(timeout=0.1)
-                    return response
-                except queue.Empty:
-                    if time.time() - start_time > timeout:
-                        return {"error": "Timeout"}
-        else:
-            return None
-
     def run(self):
         self.loop = asyncio.new_event_loop()
         asyncio.set_event_loop(self.loop)
         self.running = True
         while self.running:
             try:
-                item = self.request_queue.get(timeout=1)
-                if item is None:
+                pending = self.request_queue.get(timeout=1)
+                if pending is None:
                     continue
-                if isinstance(item, tuple):
-                    request, silent = item
-                else:
-                    request, silent = item, False
-                response = self.handle_request(request, silent=silent)
-                self.response_queue.put(response)
+                self._process_pending(pending)
             except queue.Empty:
                 pass
 
@@ -56,60 +146,73 @@ class MBOverCANWorker(threading.Thread, OMCommInterface):
         self.running = False
         self.request_queue.put(None)
         self.join()
+        self.metrics.stop_log()
         if self.loop:
             self.loop.close()
 
     def handle_request(self, request, silent=False):
-        var_id = 9
-
-        if request.type == ModbusRequestType.READ:
-            # Build payload for Modbus-over-CAN read
-            payload = bytearray([
-                0,  # exec status (dummy)
-                self.port_to_use,
-                0x03,  # FCode for read
-                request.slave_id,
-                request.address & 0xFF,
-                (request.address >> 8) & 0xFF,
-                request.count & 0xFF,
-                (request.count >> 8) & 0xFF,
-            ])
-            ivar = IVar(self.dev_id, var_id, 0)
-            # Write config to CAN (async)
-            asyncio.run(self.can_driver.write(ivar, payload))
-            # Read back data (async)
-            time.sleep(0.05)
-            data = asyncio.run(self.can_driver.read(ivar, d_len=8 + request.count * 2))
-            # Parse data field (skip first 8 bytes)
-            return {"data": [int.from_bytes(data[8+i*2:8+i*2+2], "big") for i in range(request.count)]}
-        elif request.type == ModbusRequestType.WRITE_MULTY:
-            # Build payload for Modbus-over-CAN write
-            data_bytes = bytearray()
-            for reg in request.registers:
-                data_bytes += reg.to_bytes(2, "big")
-            payload = data_bytes
-            ivar = IVar(self.dev_id, var_id, 8)
-            bg = time.time()
-            asyncio.run(self.can_driver.write(ivar, payload))
-            diff = bg - time.time()
-            # Command/config write: only config, no data
-            payload_cmd = bytearray([
-                0,  # exec status (dummy)
-                self.port_to_use,
-                0x10,  # FCode for write
-                request.slave_id,
-                request.address & 0xFF,
-                (request.address >> 8) & 0xFF,
-                len(request.registers) & 0xFF,
-                (len(request.registers) >> 8) & 0xFF,
-            ])
-            ivar = IVar(self.dev_id, var_id, 0)
-            bg = time.time()
-            asyncio.run(self.can_driver.write(ivar, payload_cmd))
-            diff = time.time() - bg
-            return {"status": "success"}
-        else:
-            return {"error": "Unsupported request type"}
+        # Runs on the worker's own loop, created once in run()
+        try:
+            return self.loop.run_until_complete(
+                MBCAN_transact(self.can_driver, self.dev_id, self.port_to_use, request, self.exec_timeout, self.exec_state))
+        except Exception as e:
+            return {"error": str(e)}
+
+
+class AsyncMBOverCANWorker(AsyncOMCommInterface):
+    """
+    Modbus-over-CAN link awaiting the USB_CAN_Driver coroutines directly on the caller's event loop.
+    """
+    def __init__(self, can_driver, dev_id=4, port_to_use=0, exec_timeout=MBCAN_EXEC_TIMEOUT):
+        self.can_driver = can_driver
+        self.dev_id = dev_id
+        self.port_to_use = port_to_use
+        self.exec_timeout = exec_timeout
+        self.exec_state = {}
+        self.lock = None
+        self.metrics = CommMetrics()
+
+    async def start(self):
+        self.lock = asyncio.Lock()
+        return True
+
+    async def stop(self):
+        self.metrics.stop_log()
+
+    async def handle_request(self, request, silent=False):
+        return await MBCAN_transact(self.can_driver, self.dev_id, self.port_to_use, request, self.exec_timeout, self.exec_state)
+
+    async def send_request(self, request, timeout=5, silent=False):
+        submitted = time.perf_counter()
+        try:
+            async with asyncio.timeout(timeout):
+                async with self.lock:
+                    return await self._handle_measured(request, silent=silent, queue_wait=time.perf_counter() - submitted)
+        except TimeoutError:
+            self.metrics.record_timeout(request)
+            return {"error": "Timeout"}
+        except Exception as e:
+            return {"error": str(e)}
+
+    async def send_batch(self, requests, timeout=5, silent=False, stop_on_error=True):
+        submitted = time.perf_counter()
+        responses = []
+        try:
+            async with asyncio.timeout(timeout):
+                async with self.lock:
+                    queue_wait = time.perf_counter() - submitted
+                    for request in requests:
+                        if stop_on_error and responses and "error" in responses[-1]:
+                            responses.append({"error": "Not executed"})
+                            continue
+                        responses.append(await self._handle_measured(request, silent=silent, queue_wait=queue_wait))
+        except TimeoutError:
+            for request in requests[len(responses):]:
+                self.metrics.record_timeout(request)
+            responses.extend({"error": "Timeout"} for _ in range(len(requests) - len(responses)))
+        except Exception as e:
+            responses.extend({"error": str(e)} for _ in range(len(requests) - len(responses)))
+        return responses
         
 
 async def main(dev):
@@ -143,6 +246,7 @@ async def write_mb_over_can(dev):
 
 if __name__ == '__main__':
     # Simple example to read dev=4, var=5, off=0, len=128 
+    from usb_can_driver.usb_can import USB_CAN_Driver
     driver = USB_CAN_Driver()
     driver.connect("COM5")
     asyncio.run(main(driver))
\ No newline at end of file
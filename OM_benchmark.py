@@ -0,0 +1,233 @@
+"""
+Throughput benchmark of OM_Interface over the simulated OM (OM_simulator).
+
+Runs the image readers, telemetry polling and FW upload over ModbusWorker and MBOverCANWorker,
+reports frames/s, samples/s, bytes/s and p50/p99 per-transaction latency, saves everything as JSON.
+The "crc" entries time the FW CRC helpers against the reference CRC_lib.crc32_stm.
+
+    python OM_benchmark.py --out bench.json
+    python OM_benchmark.py --out new.json --compare bench.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+import numpy as np
+from loguru import logger
+from OM_simulator import *
+from OM_worker_base import OM_Interface
+from CRC_lib import crc32_stm, crc32_stm_fast
+from blt_logic import find_crc_and_size
+
+
+OM_BENCH_LATENCY    = 0.0005
+OM_BENCH_BAUDRATE   = 500000
+OM_BENCH_SLAVE_ID   = 1
+
+
+class LatencyProbe:
+    """Times every handle_request() of a worker: shadows the bound method on the instance."""
+    def __init__(self, worker):
+        self.worker = worker
+        self.samples = []
+        self._handle = worker.handle_request
+        worker.handle_request = self._timed
+
+    def _timed(self, request, silent=False):
+        t0 = time.perf_counter()
+        response = self._handle(request, silent=silent)
+        self.samples.append(time.perf_counter() - t0)
+        return response
+
+    def reset(self):
+        self.samples = []
+
+    def stats(self):
+        if not self.samples:
+            return {"transactions": 0, "p50_ms": None, "p99_ms": None}
+        lat = np.asarray(self.samples) * 1000
+        return {"transactions": len(lat), "p50_ms": round(float(np.percentile(lat, 50)), 3),
+                "p99_ms": round(float(np.percentile(lat, 99)), 3)}
+
+
+def OM_bench_make_worker(kind: str, latency=OM_BENCH_LATENCY, baudrate=OM_BENCH_BAUDRATE):
+    """Fresh simulated OM behind a worker of the given kind ("modbus" or "can"). Returns (bus, worker)."""
+    bus = OMSimBus([OMSimDevice(slave_id=OM_BENCH_SLAVE_ID, erase_time=0.0)], latency=latency, baudrate=baudrate)
+    if kind == "modbus":
+        return bus, SimModbusWorker(bus)
+    if kind == "can":
+        from MB_over_CAN_worker import MBOverCANWorker
+        return bus, MBOverCANWorker(SimUSBCANDriver(bus))
+    raise ValueError(f"Unknown worker kind: {kind}")
+
+
+def _run(name, probe, func, repeat, units: str):
+    """Runs func repeat times; func returns the number of bytes moved (or None on failure)."""
+    probe.reset()
+    moved = 0
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        n = func()
+        if n is None:
+            return {"name": name, "error": "failed"}
+        moved += n
+    duration = time.perf_counter() - t0
+    ret = {"name": name, "repeat": repeat, "duration_s": round(duration, 4),
+           f"{units}_per_s": round(repeat / duration, 3), "bytes_per_s": round(moved / duration, 1)}
+    ret.update(probe.stats())
+    return ret
+
+
+def OM_bench_worker(kind: str, repeat=1, samples=200, lines=48, fw_size=8192, latency=OM_BENCH_LATENCY, baudrate=OM_BENCH_BAUDRATE):
+    """Runs the benchmark set on one worker kind. Returns the list of result dicts."""
+    bus, worker = OM_bench_make_worker(kind, latency=latency, baudrate=baudrate)
+    probe = LatencyProbe(worker)
+    worker.start()
+    om = OM_Interface(worker, slave_id=OM_BENCH_SLAVE_ID)
+
+    def raw_len(response):
+        return len(response["raw"]) if "raw" in response else None
+
+    def poll(getter, regs):
+        def run():
+            ok = ["data" in getter() for _ in range(samples)]
+            return samples * regs * 2 if all(ok) else None
+        return run
+
+    fw_path = os.path.join(tempfile.mkdtemp(prefix="om_bench_"), "bench_fw.bin")
+    with open(fw_path, "wb") as f:
+        f.write(OM_sim_build_fw(fw_size))
+
+    def upload():
+        response = om.Blt_UploadFW(1, fw_path)
+        return os.path.getsize(fw_path) if response.get("status") == "success" else None
+
+    results = []
+    try:
+        results.append(_run("Read_SS_Grayscale_Photo", probe, lambda: raw_len(om.Read_SS_Grayscale_Photo()), repeat, "frames"))
+        results.append(_run("Read_SS_Grayscale_Lines", probe, lambda: raw_len(om.Read_SS_Grayscale_Lines(0, lines)), repeat, "frames"))
+        results.append(_run("Read_Thermal_Photo", probe, lambda: raw_len(om.Read_Thermal_Photo()), repeat * 10, "frames"))
+        results.append(_run("Read_Thermal_Cluster_Photo", probe, lambda: raw_len(om.Read_Thermal_Cluster_Photo()), repeat * 10, "frames"))
+        for name, getter, regs in (("Data_GetSS", om.Data_GetSS, OM_SS_DATA_LEN), ("Data_GetGAM", om.Data_GetGAM, OM_GAM_DATA_LEN)):
+            result = _run(name, probe, poll(getter, regs), 1, "runs")
+            if "duration_s" in result:
+                result["samples_per_s"] = round(samples / result["duration_s"], 1)
+            results.append(result)
+        result = _run("Blt_Exec", probe, lambda: OM_CAN_STR_LEN * 2 if om.Blt_Exec(OM_build_BltCheckImgValid(0), silent=True).error is None else None,
+                      samples, "ops")
+        results.append(result)
+        result = _run("Blt_UploadFW", probe, upload, 1, "runs")
+        if "bytes_per_s" in result:
+            result["KB_per_s"] = round(result["bytes_per_s"] / 1024, 3)
+        results.append(result)
+    finally:
+        worker.stop()
+        os.remove(fw_path)
+        os.rmdir(os.path.dirname(fw_path))
+
+    for result in results:
+        result["worker"] = kind
+    return results
+
+
+def _find_crc_and_size_ref(file_content):
+    """find_crc_and_size as it was before the single-pass scan: reference crc32_stm per word."""
+    addr, prev_crc, crc, crc_match, size_match = 0, 0, 0xFFFFFFFF, False, False
+    for addr in range(0, len(file_content) - 4, 4):
+        if crc == 0:
+            crc_match = True
+            size_match = addr == int.from_bytes(file_content[addr:addr + 4], "little") * 4
+            break
+        prev_crc = crc
+        crc = crc32_stm(file_content[addr:addr + 4], crc=crc)
+    return {"file_size": len(file_content), "FW_size": addr, "CRC": prev_crc, "crc_match": crc_match, "size_match": size_match}
+
+
+def OM_bench_crc(fw_size=512 * 1024, repeat=3):
+    """Reference vs fast CRC over a synthetic FW image. Raises if any result differs."""
+    image = OM_sim_build_fw(fw_size)
+    body = image[:fw_size]
+    pairs = (("crc32_stm", lambda: crc32_stm(body), lambda: crc32_stm_fast(body)),
+             ("find_crc_and_size", lambda: _find_crc_and_size_ref(image), lambda: find_crc_and_size(image)))
+    results = []
+    for name, ref, fast in pairs:
+        timings = {}
+        for label, func in (("ref", ref), ("fast", fast)):
+            t0 = time.perf_counter()
+            for _ in range(repeat):
+                value = func()
+            timings[label] = ((time.perf_counter() - t0) / repeat, value)
+        if timings["ref"][1] != timings["fast"][1]:
+            raise AssertionError(f"{name}: {timings['fast'][1]} != reference {timings['ref'][1]}")
+        results.append({"worker": "crc", "name": name, "repeat": repeat, "bytes": len(image),
+                        "ref_s": round(timings["ref"][0], 5), "fast_s": round(timings["fast"][0], 5),
+                        "bytes_per_s": round(len(image) / timings["fast"][0], 1),
+                        "speedup": round(timings["ref"][0] / timings["fast"][0], 1)})
+    return results
+
+
+def _git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def OM_bench_compare(new: dict, old: dict):
+    """Prints the new/old ratio of every throughput and latency figure present in both runs."""
+    old_by_key = {(r["worker"], r["name"]): r for r in old["results"]}
+    for result in new["results"]:
+        prev = old_by_key.get((result["worker"], result["name"]))
+        if prev is None:
+            continue
+        for key, value in result.items():
+            if (key.endswith("_per_s") or key.endswith("_ms")) and prev.get(key) and value is not None:
+                print(f"{result['worker']:7} {result['name']:28} {key:16} {prev[key]:>12} -> {value:>12}  x{value / prev[key]:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OM_Interface benchmark over the simulated OM")
+    parser.add_argument("--workers", nargs="+", default=["modbus", "can"], choices=["modbus", "can"])
+    parser.add_argument("--repeat", type=int, default=1, help="Full SS frames per reader (thermal runs 10x)")
+    parser.add_argument("--samples", type=int, default=200, help="Telemetry polls per getter")
+    parser.add_argument("--lines", type=int, default=48, help="Lines for Read_SS_Grayscale_Lines")
+    parser.add_argument("--fw-size", type=int, default=8192, help="Synthetic FW body size, bytes")
+    parser.add_argument("--latency", type=float, default=OM_BENCH_LATENCY, help="Per-transaction turnaround, s")
+    parser.add_argument("--baudrate", type=int, default=OM_BENCH_BAUDRATE, help="Modelled line speed, 0 to disable")
+    parser.add_argument("--crc-size", type=int, default=512 * 1024, help="FW body size for the CRC benchmark, 0 to skip")
+    parser.add_argument("--out", default="om_bench.json")
+    parser.add_argument("--compare", default=None, help="Previous JSON result to compare against")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    run = {
+        "meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "git": _git_rev(), "python": platform.python_version(),
+                 "platform": platform.platform(), "args": vars(args)},
+        "results": [],
+    }
+    for kind in args.workers:
+        run["results"].extend(OM_bench_worker(kind, repeat=args.repeat, samples=args.samples, lines=args.lines,
+                                              fw_size=args.fw_size, latency=args.latency, baudrate=args.baudrate or None))
+    if args.crc_size:
+        run["results"].extend(OM_bench_crc(args.crc_size))
+
+    for result in run["results"]:
+        print(json.dumps(result))
+    with open(args.out, "w") as f:
+        json.dump(run, f, indent=2)
+    print(f"Saved to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            OM_bench_compare(run, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
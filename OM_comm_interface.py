@@ -1,10 +1,47 @@
 from abc import ABC, abstractmethod
 from enum import Enum
+import itertools
+import threading
+import time
+from loguru import logger
 
 class OMCommInterface(ABC):
-    @abstractmethod
+    """
+    Threaded worker: submissions go through self.request_queue and self.pending (PendingRequests),
+    the worker thread hands every dequeued item to _process_pending.
+    """
     def send_request(self, request, blocking=True, timeout=5, silent=False):
-        pass
+        """
+        Queues the request for the worker thread.
+        Blocking call returns the response of this very request, non-blocking one returns its PendingRequest handle.
+        """
+        pending = self.pending.register(request, silent=silent)
+        self.request_queue.put(pending)
+        if not blocking:
+            return pending
+        response = self.pending.wait(pending, timeout)
+        if response is None:
+            logger.warning(f"Request {pending.id} timed out after {timeout} seconds")
+            self._record_timeout(pending)
+            return {"error": "Timeout"}
+        return response
+
+    def send_batch(self, requests, blocking=True, timeout=5, silent=False, stop_on_error=True):
+        """
+        Runs the requests back-to-back on the worker thread.
+        Returns the list of responses, one per request, in one completion (the PendingRequest handle if not blocking).
+        """
+        batch = ModbusBatch(requests, stop_on_error=stop_on_error)
+        pending = self.pending.register(batch, silent=silent)
+        self.request_queue.put(pending)
+        if not blocking:
+            return pending
+        responses = self.pending.wait(pending, timeout)
+        if responses is None:
+            logger.warning(f"Batch {pending.id} of {len(batch.requests)} requests timed out after {timeout} seconds")
+            self._record_timeout(pending)
+            return [{"error": "Timeout"} for _ in batch.requests]
+        return responses
 
     @abstractmethod
     def start(self):
@@ -14,12 +51,91 @@ class OMCommInterface(ABC):
     def stop(self):
         pass
 
+    def wait_response(self, pending, timeout=5):
+        """
+        Waits for the handle returned by a non-blocking send_request/send_batch.
+        Returns the response, or None on timeout - the request is then cancelled.
+        """
+        response = self.pending.wait(pending, timeout)
+        if response is None:
+            self._record_timeout(pending)
+        return response
+
+    def cancel(self, pending):
+        """Withdraws a submitted request: the worker skips it, or drops its response if it already runs."""
+        self.pending.cancel(pending)
+
+    def _handle_measured(self, request, silent=False, queue_wait=0.0):
+        """handle_request() with the transaction recorded in self.metrics."""
+        t0 = time.perf_counter()
+        response = self.handle_request(request, silent=silent)
+        self.metrics.record(request, response, queue_wait=queue_wait, wire=time.perf_counter() - t0)
+        return response
+
+    def _execute_pending(self, pending):
+        """Runs a dequeued request or batch on the worker thread and returns its response."""
+        queue_wait = time.perf_counter() - pending.queued_at
+        if isinstance(pending.request, ModbusBatch):
+            return pending.request.execute(
+                lambda request, silent=False: self._handle_measured(request, silent=silent, queue_wait=queue_wait),
+                silent=pending.silent)
+        return self._handle_measured(pending.request, silent=pending.silent, queue_wait=queue_wait)
+
+    def _record_timeout(self, pending):
+        for request in getattr(pending.request, "requests", [pending.request]):
+            self.metrics.record_timeout(request)
+
+    def _process_pending(self, pending):
+        """Worker thread side of one queue item: skips withdrawn submissions, runs the rest and completes them."""
+        if not self.pending.is_pending(pending):
+            logger.warning(f"Skipping request {pending.id}: caller no longer waits for it (timed out or cancelled)")
+            return
+        is_batch = isinstance(pending.request, ModbusBatch)
+        if not pending.silent and not is_batch:
+            logger.debug(f"Processing request: {pending.request.__dict__}")
+        response = self._execute_pending(pending)
+        if not pending.silent and not is_batch:
+            logger.debug(f"Received response: {response}")
+        if not self.pending.complete(pending, response):
+            logger.warning(f"Dropping late response to {'batch' if is_batch else 'request'} {pending.id}")
+            for request in getattr(pending.request, "requests", [pending.request]):
+                self.metrics.record_dropped(request)
+
+
+class AsyncOMCommInterface(ABC):
+    """
+    asyncio counterpart of OMCommInterface: no worker thread, the link is driven by the caller's event loop.
+    """
+    @abstractmethod
+    async def send_request(self, request, timeout=5, silent=False):
+        pass
+
+    @abstractmethod
+    async def send_batch(self, requests, timeout=5, silent=False, stop_on_error=True):
+        pass
+
+    @abstractmethod
+    async def start(self):
+        pass
+
+    @abstractmethod
+    async def stop(self):
+        pass
+
+    async def _handle_measured(self, request, silent=False, queue_wait=0.0):
+        t0 = time.perf_counter()
+        response = await self.handle_request(request, silent=silent)
+        self.metrics.record(request, response, queue_wait=queue_wait, wire=time.perf_counter() - t0)
+        return response
+
 
 class ModbusRequestType(Enum):
     READ = 1
     WRITE_SINGLE = 2
     WRITE_MULTY = 3
 
+_request_ids = itertools.count(1)
+
 class ModbusRequest:
     def __init__(self, type: ModbusRequestType, address: int, count: int = 0, registers: list =[], slave_id: int = 1):
         self.type = type
@@ -27,4 +143,94 @@ class ModbusRequest:
         self.count = count
         self.registers = registers
         self.slave_id = slave_id
+        self.id = next(_request_ids)
+
+
+class ModbusBatch:
+    """List of requests executed back-to-back by a worker as one queue item."""
+    def __init__(self, requests: list, stop_on_error: bool = True):
+        self.requests = list(requests)
+        self.stop_on_error = stop_on_error
+        self.id = next(_request_ids)
+
+    def execute(self, handle, silent=False):
+        """
+        Runs the requests with the worker's handle(request, silent) function.
+        Once a request fails with stop_on_error set, the rest are not sent and get a "Not executed" error.
+        """
+        responses = []
+        for request in self.requests:
+            if self.stop_on_error and responses and "error" in responses[-1]:
+                responses.append({"error": "Not executed"})
+                continue
+            responses.append(handle(request, silent=silent))
+        return responses
+
+
+class PendingRequest:
+    """
+    Completion handle of one submission of a request.
+    The worker thread fills the response and sets the event; the caller waits on it.
+    id identifies the submission, so a request object sent again gets a handle of its own.
+    """
+    def __init__(self, request, id: int, silent=False):
+        self.request = request
+        self.id = id
+        self.silent = silent
+        self.response = None
+        self.event = threading.Event()
+        self.queued_at = time.perf_counter()
+
+    def done(self):
+        return self.event.is_set()
+
+    def set_response(self, response):
+        self.response = response
+        self.event.set()
+
+    def wait(self, timeout=None):
+        if not self.event.wait(timeout):
+            return None
+        return self.response
+
+
+class PendingRequests:
+    """
+    Registry of requests waiting for their responses, keyed by a submission ID assigned on register.
+    Responses for IDs that are no longer registered (timed out) are dropped.
+    """
+    def __init__(self):
+        self._pending: dict[int, PendingRequest] = {}
+        self._lock = threading.Lock()
+
+    def register(self, request, silent=False):
+        pending = PendingRequest(request, next(_request_ids), silent=silent)
+        with self._lock:
+            self._pending[pending.id] = pending
+        return pending
+
+    def is_pending(self, pending: PendingRequest):
+        with self._lock:
+            return pending.id in self._pending
+
+    def cancel(self, pending: PendingRequest):
+        with self._lock:
+            self._pending.pop(pending.id, None)
+
+    def complete(self, pending: PendingRequest, response):
+        """Returns False if the request was cancelled and the response got dropped."""
+        with self._lock:
+            registered = self._pending.pop(pending.id, None)
+        if registered is None:
+            return False
+        registered.set_response(response)
+        return True
 
+    def wait(self, pending: PendingRequest, timeout):
+        response = pending.wait(timeout)
+        if response is None:
+            self.cancel(pending)
+            # The worker may have completed the request right between the wait and the cancel
+            if pending.done():
+                return pending.response
+        return response
@@ -1,10 +1,12 @@
 import struct
 import ctypes
 from enum import Enum
+import numpy as np
 from OM_registers import *
 
 
 OM_CMD_SET_DEV_ID   = 0x13
+OM_CMD_SET_MNF_ID   = 0x1F
 OM_CMD_REBOOT       = 0xFE
 
 OM_CMD_TAKE_SS      = 0x21
@@ -22,6 +24,22 @@ OM_HS_PHOTO_WDTH    = 32
 OM_HS_PHOTO_HGHT    = 24
 OM_HS_PX_SIZE       = 4
 
+# Command status window (OM_STATUS_OFF): last command (U16) and its state (U16).
+# The state values are an assumption the simulator implements, not taken from the device documentation;
+# firmware without the window leaves it at 0 (see OM_Interface.wait_for_completion).
+OM_CMD_STATE_IDLE       = 0x00
+OM_CMD_STATE_BUSY       = 0x01
+OM_CMD_STATE_DONE       = 0x02
+OM_CMD_STATE_ERR_MASK   = 0x80
+
+OM_CMD_KNOWN            = (OM_CMD_SET_DEV_ID, OM_CMD_SET_MNF_ID, OM_CMD_REBOOT, OM_CMD_TAKE_SS, OM_CMD_TAKE_HS, OM_CMD_TAKE_GAM)
+
+
+def OM_cmd_state_known(status: dict) -> bool:
+    """True if a parsed status window ({"Cmd", "State"}) has the layout above: a known command and state."""
+    state = status["State"]
+    return status["Cmd"] in OM_CMD_KNOWN and (state & OM_CMD_STATE_ERR_MASK or state in (OM_CMD_STATE_IDLE, OM_CMD_STATE_BUSY, OM_CMD_STATE_DONE))
+
 
 
 
@@ -192,6 +210,126 @@ def OM_SS_parse_Temperature(registers: list = []):
     return {"MCU": temp[0], "MGM": temp[1], "GA": temp[2]}
 
 
+def OM_parse_CurRegion(registers: list = []):
+    if len(registers) != OM_CUR_REGION_LEN:
+        return None
+
+    return {"Current sector": struct.pack(">H", registers[0])[0]}
+
+def OM_parse_MnfID(registers: list = []):
+    if len(registers) != OM_MNF_ID_LEN:
+        return None
+
+    hex_array = bytearray()
+    for i in range(0, OM_MNF_ID_LEN):
+        hex_array.extend(struct.pack(">H", registers[i]))
+
+    return {"MnfID": OM_MnfID(hex_array)}
+
+def OM_parse_GitHash(registers: list = []):
+    if len(registers) != OM_GIT_HASH_LEN:
+        return None
+
+    hex_array = bytearray()
+    for i in range(0, OM_GIT_HASH_LEN):
+        hex_array.extend(struct.pack(">H", registers[i]))
+
+    return {"GitHash": f"{int.from_bytes(hex_array, 'little'):016x}"}
+
+
+def OM_parse_CmdState(registers: list = []):
+    if len(registers) < OM_CMD_STATE_LEN:
+        return None
+    hex_array = bytearray()
+    for reg in registers[:OM_CMD_STATE_LEN]:
+        hex_array.extend(struct.pack(">H", reg))
+    cmd, state = struct.unpack("<HH", hex_array)
+    return {"Cmd": cmd, "State": state}
+
+
+def OM_img_buffer(lines: int, width: int, dtype: str):
+    """
+    Frame buffer filled straight from the Modbus registers.
+    Returns:
+        tuple: (raw bytearray, big-endian register view, [lines][width] image view of dtype) - all over the same memory
+    """
+    raw = bytearray(lines * width * np.dtype(dtype).itemsize)
+    regs = np.frombuffer(raw, dtype=">u2")
+    image = np.frombuffer(raw, dtype=dtype).reshape(lines, width)
+    return raw, regs, image
+
+class OMSSFrame:
+    """
+    Grayscale frame being read part by part: shared buffer plus a [line][part] bitmap of the parts already in it.
+    Pass it back to the reader to fetch only what is still missing.
+    """
+    def __init__(self):
+        self.raw, self.regs, self.image = OM_img_buffer(OM_SS_PHOTO_HGHT, OM_SS_PHOTO_WDTH, "<u2")
+        self.done = np.zeros((OM_SS_PHOTO_HGHT, OM_SS_LINE_PARTS), dtype=bool)
+
+    def put(self, line: int, part: int, registers: list):
+        pos = line * OM_SS_PHOTO_WDTH + part * OM_SS_PX_PER_PT
+        self.regs[pos:pos + OM_SS_PX_PER_PT] = registers
+        self.done[line, part] = True
+
+    def missing_parts(self):
+        """(line, part) pairs not read yet, in readout order."""
+        return [(int(line), int(part)) for line, part in np.argwhere(~self.done)]
+
+    def invalid_lines(self):
+        return [int(line) for line in np.flatnonzero(~self.done.all(axis=1))]
+
+    @property
+    def complete(self):
+        return bool(self.done.all())
+
+    def preview(self):
+        """Copy of the image with every incomplete line replaced by the nearest complete line above it (below for the top ones)."""
+        complete = self.done.all(axis=1)
+        if not complete.any():
+            return self.image.copy()
+        src = np.where(complete, np.arange(OM_SS_PHOTO_HGHT), 0)
+        src = np.maximum.accumulate(src)
+        src[:np.argmax(complete)] = np.argmax(complete)
+        return self.image[src]
+
+
+class OMSSRetries:
+    """
+    Retry bookkeeping of one grayscale readout: a failed part gets up to part_retries more tries,
+    budget caps the retries of the whole readout.
+    """
+    def __init__(self, part_retries: int, budget: int):
+        self.part_retries = part_retries
+        self.budget = budget
+        self.failures = {}
+        self.last_error = None
+
+    def failed(self, line: int, part: int, error):
+        """Counts a failed part, True if it is to be read again."""
+        self.last_error = error
+        self.failures[(line, part)] = self.failures.get((line, part), 0) + 1
+        if self.failures[(line, part)] <= self.part_retries and self.budget > 0:
+            self.budget -= 1
+            return True
+        return False
+
+
+def OM_interlace_order(step: int):
+    """
+    Line offsets of the interlaced passes for the given step, coarse to fine:
+    8 -> [0, 4, 2, 6, 1, 5, 3, 7] so each pass halves the gap between the lines already read.
+    """
+    order = [0]
+    gap = step
+    while gap > 1:
+        half = gap // 2
+        order += [offset + half for offset in order if offset + half < step]
+        gap = half
+    order += [offset for offset in range(step) if offset not in order]
+    return order
+
+
 def OM_SS_ImgLinePartAddr(line: int, part: int):
     return (OM_SS_DIRECT_ADDR | ((line & 0x01FF) << 2) | (part & 0x03))
 
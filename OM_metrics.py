@@ -0,0 +1,181 @@
+"""
+Counters and latency histograms of the comm workers.
+
+Every worker owns a CommMetrics (worker.metrics). Transactions are broken down by request type,
+register block (0x1000/0x2000/0x3000/0x4000/0xF000) and slave ID. Times recorded:
+    queue_wait  - submit to start of execution (lock wait for the asyncio workers)
+    wire        - handle_request(): bus transaction incl. pymodbus/gateway framing
+    decode      - OM_Interface turning the registers into data (image readers, field reads)
+"""
+import time
+import threading
+from loguru import logger
+from OM_registers import *
+
+# Histogram bucket upper bounds, seconds: 50 us .. ~13 s, doubling
+OM_METRICS_BUCKETS  = [0.00005 * 2 ** i for i in range(19)]
+
+
+def OM_block_of(address: int):
+    """Register block of an address; direct-addressed image reads count to their block."""
+    if (address & 0xF000) == OM_BOOT_REG_ADDR:
+        return OM_BOOT_REG_ADDR
+    return address & 0x7000
+
+
+class Histogram:
+    """Fixed-bucket latency histogram, percentiles are bucket upper bounds."""
+    def __init__(self, bounds: list = OM_METRICS_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value: float):
+        idx = 0
+        while idx < len(self.bounds) and value > self.bounds[idx]:
+            idx += 1
+        self.counts[idx] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, q: float):
+        if self.count == 0:
+            return None
+        target = q / 100 * self.count
+        seen = 0
+        for idx, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return self.bounds[idx] if idx < len(self.bounds) else self.max
+        return self.max
+
+    def summary(self):
+        if self.count == 0:
+            return {"count": 0}
+        return {"count": self.count, "mean_ms": round(self.total / self.count * 1000, 3),
+                "min_ms": round(self.min * 1000, 3), "max_ms": round(self.max * 1000, 3),
+                "p50_ms": round(self.percentile(50) * 1000, 3), "p99_ms": round(self.percentile(99) * 1000, 3)}
+
+
+class _KeyStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.dropped = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.queue_wait = Histogram()
+        self.wire = Histogram()
+        self.decode = Histogram()
+
+    def as_dict(self):
+        return {"requests": self.requests, "errors": self.errors, "timeouts": self.timeouts, "dropped": self.dropped,
+                "bytes_read": self.bytes_read, "bytes_written": self.bytes_written,
+                "queue_wait": self.queue_wait.summary(), "wire": self.wire.summary(), "decode": self.decode.summary()}
+
+
+class CommMetrics:
+    """Thread-safe metrics registry of one comm worker."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: dict[tuple, _KeyStats] = {}
+        self._since = time.monotonic()
+        self._log_stop = None
+        self._log_thread = None
+
+    def _key_stats(self, request_type: str, address: int, slave_id: int):
+        key = (request_type, OM_block_of(address), slave_id)
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = _KeyStats()
+        return stats
+
+    def record(self, request, response: dict, queue_wait: float, wire: float):
+        """One executed transaction."""
+        with self._lock:
+            stats = self._key_stats(request.type.name, request.address, request.slave_id)
+            stats.requests += 1
+            stats.queue_wait.add(queue_wait)
+            stats.wire.add(wire)
+            if "error" in response:
+                stats.errors += 1
+            elif "data" in response:
+                stats.bytes_read += 2 * len(response["data"])
+            else:
+                stats.bytes_written += 2 * len(request.registers)
+
+    def record_timeout(self, request):
+        """The caller gave up waiting for the request."""
+        with self._lock:
+            self._key_stats(request.type.name, request.address, request.slave_id).timeouts += 1
+
+    def record_dropped(self, request):
+        """The response arrived after the caller had timed out."""
+        with self._lock:
+            self._key_stats(request.type.name, request.address, request.slave_id).dropped += 1
+
+    def record_decode(self, address: int, slave_id: int, seconds: float):
+        with self._lock:
+            self._key_stats("DECODE", address, slave_id).decode.add(seconds)
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+            self._since = time.monotonic()
+
+    def snapshot(self, reset=False):
+        """
+        Returns:
+            dict: {"interval_s", "totals": {...}, "by_key": [{"type", "block", "slave_id", counters, histograms}]}
+        """
+        with self._lock:
+            by_key = []
+            totals = {"requests": 0, "errors": 0, "timeouts": 0, "dropped": 0, "bytes_read": 0, "bytes_written": 0}
+            for (request_type, block, slave_id), stats in sorted(self._stats.items()):
+                entry = {"type": request_type, "block": f"0x{block:04X}", "slave_id": slave_id}
+                entry.update(stats.as_dict())
+                by_key.append(entry)
+                for name in totals:
+                    totals[name] += getattr(stats, name)
+            interval = time.monotonic() - self._since
+            if reset:
+                self._stats = {}
+                self._since = time.monotonic()
+        return {"interval_s": round(interval, 3), "totals": totals, "by_key": by_key}
+
+    def log_line(self, reset=True):
+        snap = self.snapshot(reset=reset)
+        totals, interval = snap["totals"], max(snap["interval_s"], 1e-9)
+        worst = max((entry for entry in snap["by_key"] if entry["wire"]["count"]), default=None,
+                    key=lambda entry: entry["wire"]["p99_ms"])
+        line = (f"Comm: {totals['requests']} req ({totals['requests'] / interval:.1f}/s), "
+                f"{totals['errors']} err, {totals['timeouts']} timeouts, {totals['dropped']} dropped, "
+                f"rd {totals['bytes_read'] / interval / 1024:.1f} KB/s, wr {totals['bytes_written'] / interval / 1024:.1f} KB/s")
+        if worst is not None:
+            line += (f", slowest {worst['type']} {worst['block']}@{worst['slave_id']}: "
+                     f"wire p99 {worst['wire']['p99_ms']} ms, queue p99 {worst['queue_wait']['p99_ms']} ms")
+        logger.info(line)
+        return snap
+
+    def start_log(self, interval: float = 10.0):
+        """Logs a summary line (and resets the counters) every interval seconds."""
+        self.stop_log()
+        self._log_stop = threading.Event()
+        self._log_thread = threading.Thread(target=self._log_loop, args=(interval, self._log_stop), daemon=True)
+        self._log_thread.start()
+
+    def stop_log(self):
+        if self._log_thread is not None:
+            self._log_stop.set()
+            self._log_thread.join()
+            self._log_thread = None
+
+    def _log_loop(self, interval: float, stop: threading.Event):
+        while not stop.wait(interval):
+            self.log_line(reset=True)
@@ -0,0 +1,84 @@
+from OM_registers import *
+from OM_data import *
+
+# Gap (in registers) still worth reading through to merge two fields into one transaction
+OM_PLAN_MAX_GAP     = 16
+
+
+class OMField:
+    def __init__(self, name: str, block: int, offset: int, length: int, parser=None):
+        self.name = name
+        self.block = block
+        self.offset = offset
+        self.length = length
+        self.parser = parser
+
+
+class OMReadSpan:
+    """One Modbus read covering several fields of the same register block."""
+    def __init__(self, block: int, offset: int, count: int, fields: list):
+        self.block = block
+        self.offset = offset
+        self.count = count
+        self.fields = fields
+
+    @property
+    def address(self):
+        return self.block + self.offset
+
+
+OM_FIELDS = {field.name: field for field in [
+    OMField("Status",       OM_CMD_REG_ADDR, OM_STATUS_OFF,      OM_STATUS_LEN),
+    OMField("FWVer",        OM_CMD_REG_ADDR, OM_FW_VER_OFF,      OM_FW_VER_LEN,      OM_parse_FWVer),
+    OMField("CurRegion",    OM_CMD_REG_ADDR, OM_CUR_REGION_OFF,  OM_CUR_REGION_LEN,  OM_parse_CurRegion),
+    OMField("MnfID",        OM_CMD_REG_ADDR, OM_MNF_ID_OFF,      OM_MNF_ID_LEN,      OM_parse_MnfID),
+    OMField("Temperature",  OM_CMD_REG_ADDR, OM_TEMP_OFF,        OM_TEMP_LEN,        OM_SS_parse_Temperature),
+    OMField("DevID",        OM_CMD_REG_ADDR, OM_DEV_ID_OFF,      OM_DEV_ID_LEN,      OM_parse_DevID),
+    OMField("GitHash",      OM_CMD_REG_ADDR, OM_GIT_HASH_OFF,    OM_GIT_HASH_LEN,    OM_parse_GitHash),
+    OMField("SS",           OM_SS_REG_ADDR,  OM_SS_DATA_OFF,     OM_SS_DATA_LEN,     OM_SS_parse),
+    OMField("SSMtxSet",     OM_SS_REG_ADDR,  OM_SS_MTX_SET_OFF,  OM_SS_MTX_SET_LEN,  OM_SS_parse_MtxSet),
+    OMField("SSAlgoSet",    OM_SS_REG_ADDR,  OM_SS_ALGO_SET_OFF, OM_SS_ALGO_SET_LEN, OM_SS_parse_AlgoSet),
+    OMField("GAM",          OM_GAM_REG_ADDR, OM_GAM_DATA_OFF,    OM_GAM_DATA_LEN,    OM_GAM_parse),
+]}
+
+OM_IDENTITY_FIELDS = ["FWVer", "CurRegion", "MnfID", "Temperature", "DevID", "GitHash"]
+
+
+def OM_plan_reads(names: list, max_gap: int = OM_PLAN_MAX_GAP, max_regs: int = OM_MODBUS_MAX_READ):
+    """
+    Merges the wanted fields into the fewest reads.
+    Fields of one block are merged while the gap between them is at most max_gap registers
+    and the read stays within max_regs.
+
+    Returns:
+        list[OMReadSpan]
+    """
+    fields = sorted({OM_FIELDS[name] for name in names}, key=lambda f: (f.block, f.offset))
+    spans = []
+    for field in fields:
+        if spans:
+            span = spans[-1]
+            span_end = span.offset + span.count
+            new_end = max(span_end, field.offset + field.length)
+            if (field.block == span.block and field.offset - span_end <= max_gap
+                    and new_end - span.offset <= max_regs):
+                span.count = new_end - span.offset
+                span.fields.append(field)
+                continue
+        spans.append(OMReadSpan(field.block, field.offset, field.length, [field]))
+    return spans
+
+
+def OM_slice_fields(span: OMReadSpan, registers: list):
+    """Cuts the registers of one span back into its fields and runs each field's parser."""
+    ret = {}
+    for field in span.fields:
+        start = field.offset - span.offset
+        regs = registers[start:start + field.length]
+        ret[field.name] = field.parser(regs) if field.parser is not None else regs
+    return ret
+
+
+if __name__ == "__main__":
+    for span in OM_plan_reads(OM_IDENTITY_FIELDS + ["SSMtxSet", "SSAlgoSet"]):
+        print(f"{hex(span.address)} count {span.count}: {[field.name for field in span.fields]}")
@@ -5,6 +5,9 @@
 # Direct cmd
 OM_ADDR_DIRECT_CMD_FLAG = 0x8000
 
+# Max registers per Modbus read (FC 0x03)
+OM_MODBUS_MAX_READ  = 125
+
 # Comand and status registers
 OM_CMD_REG_ADDR     = 0x1000
 
@@ -12,6 +15,8 @@ OM_CMD_OFF          = 0
 
 OM_STATUS_OFF       = 10
 OM_STATUS_LEN       = 8
+# Head of the status window: last command and its state
+OM_CMD_STATE_LEN    = 2
 
 OM_FW_VER_OFF       = 20
 OM_FW_VER_LEN       = 3
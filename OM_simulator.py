@@ -0,0 +1,660 @@
+"""
+Local OM simulator.
+
+OMSimDevice emulates one OM from the register layout of OM_registers/OM_data: command and status
+registers, SS/HS/GAM data blocks, direct-addressed SS line parts, HS lines and cluster lines and the
+CAN-wrapped bootloader at 0xF000 (control block and two flash images).
+
+OMSimBus puts several devices on one line and models per-transaction latency and baud rate.
+It can be reached three ways:
+    SimModbusWorker     - in-process drop-in for ModbusWorker (same queue/batch code, no serial port)
+    OMSimPtyServer      - Modbus RTU slave on a pty, for the real ModbusWorker
+    SimUSBCANDriver     - USB_CAN_Driver look-alike emulating the var 9 Modbus-over-CAN gateway
+
+Device memory is kept as little-endian bytes, each register is the big-endian view of two bytes -
+the same convention RegistersToPack/PackToRegisters use on the host side.
+"""
+import os
+import time
+import struct
+import select
+import asyncio
+import threading
+import numpy as np
+from loguru import logger
+from OM_registers import *
+from OM_data import *
+from blt_logic import *
+from CRC_lib import crc32_stm_fast
+from OM_comm_interface import *
+from modbus_worker import ModbusWorker
+
+
+OM_SIM_CMD_BLOCK_LEN    = 64
+OM_SIM_SS_BLOCK_LEN     = 128
+OM_SIM_HS_BLOCK_LEN     = 256
+OM_SIM_GAM_BLOCK_LEN    = 128
+
+OM_SIM_IMG_SIZE         = FLASH_IMG_SIZE
+OM_SIM_SECTORS          = FLASH_SECTORS
+
+# Modbus RTU framing
+MB_FC_READ_HOLDING      = 0x03
+MB_FC_WRITE_MULTIPLE    = 0x10
+MB_EX_ILLEGAL_FUNCTION  = 0x01
+MB_EX_ILLEGAL_ADDRESS   = 0x02
+
+
+def SIM_crc16_modbus(frame: bytes) -> int:
+    crc = 0xFFFF
+    for byte in frame:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 0x01 else crc >> 1
+    return crc
+
+def SIM_bytes_to_registers(data: bytes):
+    return np.frombuffer(bytes(data), dtype=">u2").tolist()
+
+def SIM_registers_to_bytes(registers: list):
+    return np.asarray(registers, dtype=">u2").tobytes()
+
+
+class OMSimDevice:
+    """
+    One simulated OM. Thread-safe: the bus, the pty server and the CAN gateway may access it concurrently.
+
+    Args:
+        slave_id (int): Modbus address the device answers on.
+        take_time (dict): Measurement duration per take command, seconds.
+        erase_time (float): Time the device stays silent while erasing an image.
+        restart_time (float): Time the device stays silent after reboot/restart.
+        status_window (bool): Report commands in the command status window; False leaves it as written, like firmware without it.
+        flash_error_rate (float): Probability of a data write that fails without programming (transient, a rewrite succeeds).
+        fw_image (bytes): Optional content of the running image (image 0).
+    """
+    def __init__(self, slave_id=1, fw_ver=(2, 10, 21), mnf_id=0x00010100, git_hash=0x1234abcd5678ef90,
+                 take_time=None, erase_time=0.5, restart_time=0.3, img_size=OM_SIM_IMG_SIZE, fw_image=None, seed=0,
+                 status_window=True, flash_error_rate=0.0):
+        self.slave_id = slave_id
+        self.take_time = {OM_CMD_TAKE_SS: 0.05, OM_CMD_TAKE_HS: 0.1, OM_CMD_TAKE_GAM: 0.01}
+        if take_time:
+            self.take_time.update(take_time)
+        self.erase_time = erase_time
+        self.restart_time = restart_time
+        self.status_window = status_window
+        self.flash_error_rate = flash_error_rate
+        self.img_size = img_size
+        self.rng = np.random.default_rng(seed)
+        self.lock = threading.RLock()
+
+        self.cmd_block = bytearray(OM_SIM_CMD_BLOCK_LEN * 2)
+        self.ss_block = bytearray(OM_SIM_SS_BLOCK_LEN * 2)
+        self.hs_block = bytearray(OM_SIM_HS_BLOCK_LEN * 2)
+        self.gam_block = bytearray(OM_SIM_GAM_BLOCK_LEN * 2)
+        self.ss_image = bytes(OM_SS_PHOTO_HGHT * OM_SS_PHOTO_WDTH * OM_SS_PX_SIZE)
+        self.hs_image = bytes(OM_HS_PHOTO_HGHT * OM_HS_PHOTO_WDTH * OM_HS_PX_SIZE)
+        self.hs_clusters = bytes(OM_HS_PHOTO_HGHT * OM_HS_PHOTO_WDTH)
+        self.sun = [240.0, 240.0]
+
+        self.flash = bytearray(b'\xFF' * (2 * img_size))
+        if fw_image is not None:
+            self.flash[0:len(fw_image)] = fw_image
+        self.valid = [fw_image is not None, False]
+        self.current_block = 0
+        self.pref_block = 0
+        self.reset_src = 0
+        self.flash_status = FLASH_STAT_LOAD_OK
+        self.write_failed = False
+        self.can_frame = bytearray(OM_CAN_STR_LEN * 2)
+
+        self.silent_until = 0.0
+        self.pending_cmd = None
+        self.pending_done_at = 0.0
+        self.pending_reboot = False
+
+        self._write_u16(self.cmd_block, OM_FW_VER_OFF * 2, fw_ver[2])
+        self._write_u16(self.cmd_block, OM_FW_VER_OFF * 2 + 2, fw_ver[1])
+        self._write_u16(self.cmd_block, OM_FW_VER_OFF * 2 + 4, fw_ver[0])
+        struct.pack_into("<I", self.cmd_block, OM_MNF_ID_OFF * 2, mnf_id)
+        struct.pack_into("<hhh", self.cmd_block, OM_TEMP_OFF * 2, 31, 29, 30)
+        self._write_u16(self.cmd_block, OM_DEV_ID_OFF * 2, slave_id)
+        struct.pack_into("<Q", self.cmd_block, OM_GIT_HASH_OFF * 2, git_hash)
+        struct.pack_into("<14H", self.ss_block, OM_SS_MTX_SET_OFF * 2, *range(1, 15))
+        struct.pack_into("<11fHH", self.ss_block, OM_SS_ALGO_SET_OFF * 2, *[0.5 * i for i in range(11)], 7, 9)
+        self._update_region()
+        self._take_ss()
+        self._take_hs()
+        self._take_gam()
+
+    @staticmethod
+    def _write_u16(block: bytearray, pos: int, value: int):
+        struct.pack_into("<H", block, pos, value & 0xFFFF)
+
+    def _update_region(self):
+        self.cmd_block[OM_CUR_REGION_OFF * 2] = self.current_block
+
+    def _set_cmd_state(self, cmd: int, state: int):
+        if self.status_window:
+            struct.pack_into("<HH", self.cmd_block, OM_STATUS_OFF * 2, cmd, state)
+
+    # Measurements
+
+    def _take_ss(self):
+        # Sun spot drifting around the matrix centre, gaussian on a noisy background
+        self.sun[0] = float(np.clip(self.sun[0] + self.rng.normal(0, 3), 40, OM_SS_PHOTO_WDTH - 40))
+        self.sun[1] = float(np.clip(self.sun[1] + self.rng.normal(0, 3), 40, OM_SS_PHOTO_HGHT - 40))
+        yy, xx = np.mgrid[0:OM_SS_PHOTO_HGHT, 0:OM_SS_PHOTO_WDTH]
+        spot = 3000.0 * np.exp(-((xx - self.sun[0]) ** 2 + (yy - self.sun[1]) ** 2) / (2 * 6.0 ** 2))
+        image = 60.0 + spot + self.rng.normal(0, 4, spot.shape)
+        self.ss_image = np.clip(image, 0, 4095).astype("<u2").tobytes()
+
+        x = (self.sun[0] - OM_SS_PHOTO_WDTH / 2) / 400.0
+        y = (self.sun[1] - OM_SS_PHOTO_HGHT / 2) / 400.0
+        z = float(np.sqrt(max(0.0, 1.0 - x * x - y * y)))
+        zen = float(np.degrees(np.arccos(z)))
+        azt = float(np.degrees(np.arctan2(y, x)))
+        struct.pack_into("<7fHH", self.ss_block, OM_SS_DATA_OFF * 2, x, y, z, self.sun[0], self.sun[1], zen, azt, 0x0001, 0)
+
+    def _take_hs(self):
+        yy, xx = np.mgrid[0:OM_HS_PHOTO_HGHT, 0:OM_HS_PHOTO_WDTH]
+        image = 20.0 + 0.2 * yy + self.rng.normal(0, 0.1, yy.shape)
+        image[yy > OM_HS_PHOTO_HGHT // 2] -= 40.0
+        self.hs_image = image.astype("<f4").tobytes()
+        self.hs_clusters = (yy > OM_HS_PHOTO_HGHT // 2).astype(np.int8).tobytes()
+        data = self.rng.integers(0, 0xFFFF, OM_HS_DATA_LEN, dtype=np.uint16)
+        self.hs_block[OM_HS_DATA_OFF * 2:(OM_HS_DATA_OFF + OM_HS_DATA_LEN) * 2] = data.astype("<u2").tobytes()
+
+    def _take_gam(self):
+        gyro = self.rng.normal(0, 0.05, 3)
+        accel = np.array([0.0, 0.0, 1.0]) + self.rng.normal(0, 0.01, 3)
+        mag = np.array([20.0, -5.0, 40.0]) + self.rng.normal(0, 0.2, 3)
+        struct.pack_into("<6fHh", self.gam_block, OM_GA_DATA_OFF * 2, *gyro, *accel, 30, 0)
+        struct.pack_into("<3fHh", self.gam_block, OM_MAG_DATA_OFF * 2, *mag, 29, 0)
+
+    def _tick(self, now: float):
+        if self.pending_cmd is not None and now >= self.pending_done_at:
+            cmd = self.pending_cmd
+            self.pending_cmd = None
+            if cmd == OM_CMD_TAKE_SS:
+                self._take_ss()
+            elif cmd == OM_CMD_TAKE_HS:
+                self._take_hs()
+            elif cmd == OM_CMD_TAKE_GAM:
+                self._take_gam()
+            self._set_cmd_state(cmd, OM_CMD_STATE_DONE)
+        if self.pending_reboot and now >= self.silent_until:
+            self.pending_reboot = False
+            self.slave_id = struct.unpack_from("<H", self.cmd_block, OM_DEV_ID_OFF * 2)[0]
+
+    def is_silent(self, now: float = None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            self._tick(now)
+            return now < self.silent_until
+
+    # Command block
+
+    def _exec_cmd(self, now: float):
+        cmd, dlen = struct.unpack_from("<HH", self.cmd_block, OM_CMD_OFF * 2)
+        data = self.cmd_block[OM_CMD_OFF * 2 + 4:OM_CMD_OFF * 2 + 4 + dlen * 4]
+        if cmd in self.take_time:
+            self.pending_cmd = cmd
+            self.pending_done_at = now + self.take_time[cmd]
+            self._set_cmd_state(cmd, OM_CMD_STATE_BUSY)
+        elif cmd == OM_CMD_SET_DEV_ID:
+            self._write_u16(self.cmd_block, OM_DEV_ID_OFF * 2, data[0])
+            self._set_cmd_state(cmd, OM_CMD_STATE_DONE)
+        elif cmd == OM_CMD_SET_MNF_ID:
+            self.cmd_block[OM_MNF_ID_OFF * 2:OM_MNF_ID_OFF * 2 + 4] = data[0:4]
+            self._set_cmd_state(cmd, OM_CMD_STATE_DONE)
+        elif cmd == OM_CMD_REBOOT:
+            self._reboot(now)
+            self._set_cmd_state(cmd, OM_CMD_STATE_DONE)
+        else:
+            self._set_cmd_state(cmd, OM_CMD_STATE_ERR_MASK)
+
+    def _reboot(self, now: float):
+        self.silent_until = now + self.restart_time
+        self.pending_reboot = True
+        self.pending_cmd = None
+
+    # CAN-wrapped bootloader
+
+    def image(self, n: int):
+        """Flash image n (0 or 1) as a writable view, for preloading or inspecting the flash."""
+        return memoryview(self.flash)[n * self.img_size:(n + 1) * self.img_size]
+
+    def _exec_can_frame(self, now: float):
+        frame = self.can_frame
+        type_id = struct.unpack_from("<I", frame, 2)[0]
+        offset = (type_id >> 3) & ((1 << 21) - 1)
+        rtr = (type_id >> 1) & 0x01
+        data = frame[8:16]
+        target = self.image(1 - self.current_block)
+
+        if offset == FLASH_CB_OFFSET:
+            if rtr:
+                frame[8:16] = bytes([self.flash_status, self.current_block, self.pref_block, self.reset_src, 0, 0, 0, 0])
+            else:
+                self._exec_flash_cmd(bytes(data), now)
+        elif offset + 8 <= self.img_size:
+            if rtr:
+                frame[8:16] = target[offset:offset + 8]
+            elif self.flash_error_rate and self.rng.random() < self.flash_error_rate:
+                self._flash_write_error(FLASH_STAT_MASK_ERR | 0x01)
+            else:
+                # NOR flash programming can only clear bits
+                programmed = bytes(a & b for a, b in zip(target[offset:offset + 8], data))
+                target[offset:offset + 8] = programmed
+                if programmed != bytes(data):
+                    self._flash_write_error(FLASH_STAT_MASK_ERR | 0x01)
+                elif not self.write_failed:
+                    self.flash_status = FLASH_STAT_LOAD_OK
+        else:
+            self._flash_write_error(FLASH_STAT_MASK_ERR | 0x02)
+        struct.pack_into("<H", frame, 6, 8)
+
+    def _flash_write_error(self, status: int):
+        """The first failed data write stays in the control block status until the next command replaces it."""
+        if not self.write_failed:
+            self.flash_status = status
+            self.write_failed = True
+
+    def _exec_flash_cmd(self, data: bytes, now: float):
+        size = data[0] | (data[1] << 8) | (data[2] << 16)
+        cmd = data[3]
+        crc = struct.unpack_from("<I", data, 4)[0]
+        status = FLASH_STAT_LOAD_OK
+        if cmd == FLASH_CMD_ERASE_SECTORS_2:
+            self.image(1 - self.current_block)[:] = b'\xFF' * self.img_size
+            self.valid[1 - self.current_block] = False
+            self.silent_until = now + self.erase_time
+        elif cmd == FLASH_CMD_ERASE_ONE_SECTOR:
+            sect_off, sect_len = OM_SIM_SECTORS[size % len(OM_SIM_SECTORS)]
+            self.flash[sect_off:sect_off + sect_len] = b'\xFF' * sect_len
+            self.valid[sect_off // self.img_size] = False
+            self.silent_until = now + self.erase_time * sect_len / self.img_size
+        elif cmd & 0xFE == FLASH_CMD_CHECK_CRC_IMAGE_N:
+            img = cmd & 0x01
+            ok = size <= self.img_size and crc32_stm_fast(bytes(self.image(img)[0:size])) == crc
+            self.valid[img] = self.valid[img] or ok
+            status = FLASH_STAT_LOAD_OK if ok else (FLASH_STAT_MASK_ERR | cmd)
+        elif cmd & 0xFE == FLASH_CMD_CHECK_VALID_IMAGE_N:
+            status = FLASH_STAT_LOAD_OK if self.valid[cmd & 0x01] else (FLASH_STAT_MASK_ERR | cmd)
+        elif cmd & 0xFE == FLASH_CMD_FIX_VALID_IMAGE_N:
+            self.valid[cmd & 0x01] = True
+        elif cmd & 0xFE == FLASH_CMD_SET_PREF_BLOCK_N:
+            self.pref_block = cmd & 0x01
+        elif cmd == FLASH_CMD_DO_COPY_AND_GO:
+            other = 1 - self.current_block
+            if size > self.img_size or crc32_stm_fast(bytes(self.image(other)[0:size - 4])) != crc:
+                status = FLASH_STAT_MASK_ERR | cmd
+            else:
+                self.image(0)[:] = self.image(other)
+                self.valid[0] = True
+                self.pref_block = 0
+                self._bootloader_restart(now)
+        elif cmd == FLASH_CMD_RESTART:
+            self._bootloader_restart(now)
+        else:
+            status = FLASH_STAT_MASK_ERR | cmd
+        self.flash_status = status
+        self.write_failed = False
+
+    def _bootloader_restart(self, now: float):
+        if self.valid[self.pref_block]:
+            self.current_block = self.pref_block
+        elif self.valid[1 - self.pref_block]:
+            self.current_block = 1 - self.pref_block
+        self.reset_src = 0x01
+        self._update_region()
+        self._reboot(now)
+
+    # Register access
+
+    def _block(self, address: int):
+        for base, block in ((OM_CMD_REG_ADDR, self.cmd_block), (OM_SS_REG_ADDR, self.ss_block),
+                            (OM_HS_REG_ADDR, self.hs_block), (OM_GAM_REG_ADDR, self.gam_block),
+                            (OM_BOOT_REG_ADDR, self.can_frame)):
+            if base <= address < base + len(block) // 2:
+                return base, block
+        return None, None
+
+    def read_registers(self, address: int, count: int):
+        """Returns the registers or None for an illegal address."""
+        with self.lock:
+            self._tick(time.monotonic())
+            base, block = self._block(address)
+            if block is None and address & OM_ADDR_DIRECT_CMD_FLAG:
+                return self._read_direct(address, count)
+            if block is None or (address - base + count) * 2 > len(block):
+                return None
+            start = (address - base) * 2
+            return SIM_bytes_to_registers(block[start:start + count * 2])
+
+    def _read_direct(self, address: int, count: int):
+        if (address & 0x7000) == OM_SS_REG_ADDR:
+            line, part = (address >> 2) & 0x01FF, address & 0x03
+            if line >= OM_SS_PHOTO_HGHT or count != OM_SS_PX_PER_PT:
+                return None
+            start = (line * OM_SS_PHOTO_WDTH + part * OM_SS_PX_PER_PT) * OM_SS_PX_SIZE
+            return SIM_bytes_to_registers(self.ss_image[start:start + count * 2])
+        if (address & 0x7000) == OM_HS_REG_ADDR:
+            line = address & 0x3F
+            if line >= OM_HS_PHOTO_HGHT:
+                return None
+            if address & 0x40:
+                if count != OM_HS_PHOTO_WDTH // 2:
+                    return None
+                start = line * OM_HS_PHOTO_WDTH
+                return SIM_bytes_to_registers(self.hs_clusters[start:start + count * 2])
+            if count != OM_HS_PHOTO_WDTH * 2:
+                return None
+            start = line * OM_HS_PHOTO_WDTH * OM_HS_PX_SIZE
+            return SIM_bytes_to_registers(self.hs_image[start:start + count * 2])
+        return None
+
+    def write_registers(self, address: int, registers: list):
+        """Returns False for an illegal address."""
+        with self.lock:
+            now = time.monotonic()
+            self._tick(now)
+            base, block = self._block(address)
+            if block is None or (address - base + len(registers)) * 2 > len(block):
+                return False
+            start = (address - base) * 2
+            block[start:start + len(registers) * 2] = SIM_registers_to_bytes(registers)
+            if block is self.cmd_block and address == OM_CMD_REG_ADDR + OM_CMD_OFF:
+                # Unused tail of the command area must not leak into the next command
+                block[start + len(registers) * 2:OM_STATUS_OFF * 2] = bytes(OM_STATUS_OFF * 2 - start - len(registers) * 2)
+                self._exec_cmd(now)
+            elif block is self.can_frame:
+                self._exec_can_frame(now)
+            return True
+
+
+class OMSimBus:
+    """
+    Simulated RS-485 line with OM devices on it.
+
+    Args:
+        devices (list[OMSimDevice]): Devices on the line.
+        latency (float): Fixed per-transaction turnaround (device processing, gaps), seconds.
+        baudrate (int): Line speed used for on-wire time of RTU frames; None disables it.
+        no_response_time (float): Time spent before reporting a silent device.
+        error_rate (float): Share of unicast transactions lost on the line (noisy RS-485), answered as "No response".
+    """
+    def __init__(self, devices: list, latency=0.0, baudrate=None, no_response_time=0.05, error_rate=0.0, seed=0):
+        self.devices = list(devices)
+        self.latency = latency
+        self.baudrate = baudrate
+        self.no_response_time = no_response_time
+        self.error_rate = error_rate
+        self.rng = np.random.default_rng(seed)
+        self.transactions = 0
+
+    def _device(self, slave_id: int):
+        now = time.monotonic()
+        # Silence check first: a device finishing its reboot may come back on a new address
+        awake = [device for device in self.devices if not device.is_silent(now)]
+        for device in awake:
+            if device.slave_id == slave_id:
+                return device
+        return None
+
+    def wire_time(self, request_len: int, response_len: int):
+        """Time on the line for the request and response frames (11 bits per byte)."""
+        t = self.latency
+        if self.baudrate:
+            t += (request_len + response_len) * 11 / self.baudrate
+        return t
+
+    def execute(self, request):
+        """
+        Runs the request on the device without delays.
+        Returns:
+            tuple: (response dict as the workers return it, on-wire time)
+        """
+        self.transactions += 1
+        if request.slave_id == 0:
+            # Broadcast: every device executes, nobody answers
+            for device in self.devices:
+                if request.type == ModbusRequestType.WRITE_MULTY and not device.is_silent():
+                    device.write_registers(request.address, request.registers)
+            return {"status": "success"}, self.wire_time(9 + 2 * len(request.registers), 0)
+
+        device = self._device(request.slave_id)
+        if device is None or (self.error_rate and self.rng.random() < self.error_rate):
+            return {"error": "Modbus Error: [Input/Output] No response received from the remote unit"}, self.no_response_time
+        if request.type == ModbusRequestType.READ:
+            registers = device.read_registers(request.address, request.count)
+            if registers is None:
+                return {"error": "Exception Response(131, 3, IllegalAddress)"}, self.wire_time(8, 5)
+            return {"data": registers}, self.wire_time(8, 5 + 2 * request.count)
+        if request.type == ModbusRequestType.WRITE_MULTY:
+            if not device.write_registers(request.address, request.registers):
+                return {"error": "Exception Response(144, 16, IllegalAddress)"}, self.wire_time(9 + 2 * len(request.registers), 5)
+            return {"status": "success"}, self.wire_time(9 + 2 * len(request.registers), 8)
+        return {"error": "Unsupported"}, 0.0
+
+    def transact(self, request):
+        response, duration = self.execute(request)
+        if duration > 0:
+            time.sleep(duration)
+        return response
+
+    def handle_frame(self, frame: bytes):
+        """RTU frame in, RTU frame (or None for no answer) out. Applies the latency model."""
+        slave_id, fc = frame[0], frame[1]
+        if fc == MB_FC_READ_HOLDING:
+            address, count = struct.unpack(">HH", frame[2:6])
+            request = ModbusRequest(ModbusRequestType.READ, address, count=count, slave_id=slave_id)
+        elif fc == MB_FC_WRITE_MULTIPLE:
+            address, count = struct.unpack(">HH", frame[2:6])
+            registers = SIM_bytes_to_registers(frame[7:7 + count * 2])
+            request = ModbusRequest(ModbusRequestType.WRITE_MULTY, address, registers=registers, slave_id=slave_id)
+        else:
+            return self._rtu(bytes([slave_id, fc | 0x80, MB_EX_ILLEGAL_FUNCTION]))
+
+        response = self.transact(request)
+        if slave_id == 0 or "No response" in response.get("error", ""):
+            return None
+        if "error" in response:
+            return self._rtu(bytes([slave_id, fc | 0x80, MB_EX_ILLEGAL_ADDRESS]))
+        if fc == MB_FC_READ_HOLDING:
+            payload = SIM_registers_to_bytes(response["data"])
+            return self._rtu(bytes([slave_id, fc, len(payload)]) + payload)
+        return self._rtu(bytes(frame[0:6]))
+
+    @staticmethod
+    def _rtu(pdu: bytes):
+        return pdu + struct.pack("<H", SIM_crc16_modbus(pdu))
+
+
+class SimModbusWorker(ModbusWorker):
+    """
+    ModbusWorker talking to an OMSimBus in-process: same queueing, batching and completion
+    handling as the serial worker, only the transport is replaced.
+    """
+    def __init__(self, bus: OMSimBus, timeout=1):
+        super().__init__(port="sim", baudrate=bus.baudrate or 115200, stopbits=1, parity="N", bytesize=8, timeout=timeout)
+        self.bus = bus
+
+    def connect(self):
+        logger.info("Connected to simulated OM bus")
+        return True
+
+    def disconnect(self):
+        logger.info("Disconnected from simulated OM bus")
+
+    def handle_request(self, request, silent=False):
+        if request.type not in (ModbusRequestType.READ, ModbusRequestType.WRITE_MULTY):
+            return {"error": "Unsupported"}
+        return self.bus.transact(request)
+
+
+class OMSimPtyServer:
+    """
+    Modbus RTU slave served on a pseudo-terminal. Point ModbusWorker(port=server.port, ...) at it.
+    Linux/macOS only.
+    """
+    def __init__(self, bus: OMSimBus):
+        self.bus = bus
+        self.port = None
+        self.running = False
+        self._thread = None
+        self._master = None
+        self._slave = None
+
+    def start(self):
+        import tty
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._master)
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self.running = True
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        logger.info(f"OM simulator listening on {self.port}")
+        return self.port
+
+    def stop(self):
+        self.running = False
+        if self._thread:
+            self._thread.join()
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                os.close(fd)
+        self._master = self._slave = None
+
+    @staticmethod
+    def _frame_len(buf: bytearray):
+        """Length of the request frame at the start of buf, 0 if incomplete, -1 if unknown."""
+        if len(buf) < 2:
+            return 0
+        if buf[1] == MB_FC_READ_HOLDING:
+            return 8
+        if buf[1] == MB_FC_WRITE_MULTIPLE:
+            return 0 if len(buf) < 7 else 9 + buf[6]
+        return -1
+
+    def _serve(self):
+        buf = bytearray()
+        while self.running:
+            ready, _, _ = select.select([self._master], [], [], 0.1)
+            if not ready:
+                # Inter-frame silence: drop garbage
+                buf.clear()
+                continue
+            buf.extend(os.read(self._master, 4096))
+            while True:
+                length = self._frame_len(buf)
+                if length < 0:
+                    buf.clear()
+                    break
+                if length == 0 or len(buf) < length:
+                    break
+                frame = bytes(buf[:length])
+                del buf[:length]
+                if SIM_crc16_modbus(frame[:-2]) != struct.unpack("<H", frame[-2:])[0]:
+                    buf.clear()
+                    break
+                response = self.bus.handle_frame(frame)
+                if response is not None:
+                    os.write(self._master, response)
+
+
+def _ivar_offset(ivar):
+    for name in ("off", "offset", "Off", "Offset"):
+        if hasattr(ivar, name):
+            return getattr(ivar, name)
+    return ivar[2]
+
+
+class SimUSBCANDriver:
+    """
+    Stand-in for USB_CAN_Driver with the var 9 Modbus-over-CAN gateway of the CAN adapter in front of an OMSimBus.
+    Only what MBOverCANWorker uses is emulated: read/write of var 9 at a byte offset.
+
+    Args:
+        bus (OMSimBus): Modbus line behind the gateway.
+        frame_time (float): Time of one 8-byte CAN frame.
+    """
+    def __init__(self, bus: OMSimBus, frame_time=0.00025):
+        self.bus = bus
+        self.frame_time = frame_time
+        self.var9 = bytearray(8 + 2 * OM_MODBUS_MAX_READ)
+        self.done_at = 0.0
+        self.result = None
+
+    async def _transfer(self, length: int):
+        frames = max(1, (length + 7) // 8)
+        await asyncio.sleep(frames * self.frame_time)
+
+    async def write(self, ivar, payload):
+        offset = _ivar_offset(ivar)
+        await self._transfer(len(payload))
+        self.var9[offset:offset + len(payload)] = payload
+        if offset == 0:
+            self._start_exec()
+        return True
+
+    async def read(self, ivar, d_len):
+        offset = _ivar_offset(ivar)
+        await self._transfer(d_len)
+        if time.monotonic() >= self.done_at and self.result is not None:
+            self._finish_exec()
+        return bytes(self.var9[offset:offset + d_len])
+
+    def _start_exec(self):
+        port, fcode, slave_id = self.var9[1], self.var9[2], self.var9[3]
+        address = self.var9[4] | (self.var9[5] << 8)
+        count = self.var9[6] | (self.var9[7] << 8)
+        if fcode == MB_FC_READ_HOLDING:
+            request = ModbusRequest(ModbusRequestType.READ, address, count=count, slave_id=slave_id)
+        else:
+            registers = [int.from_bytes(self.var9[8 + 2 * i:10 + 2 * i], "big") for i in range(count)]
+            request = ModbusRequest(ModbusRequestType.WRITE_MULTY, address, registers=registers, slave_id=slave_id)
+        self.var9[0] = 0
+        self.result, duration = self.bus.execute(request)
+        self.done_at = time.monotonic() + duration
+
+    def _finish_exec(self):
+        result, self.result = self.result, None
+        if "error" in result:
+            self.var9[0] = 0x81
+        elif "data" in result:
+            data = b''.join(reg.to_bytes(2, "big") for reg in result["data"])
+            self.var9[8:8 + len(data)] = data
+            self.var9[0] = 0x01
+        else:
+            self.var9[0] = 0x01
+
+
+def OM_sim_build_fw(size: int, seed: int = 0, pad_to: int = 8):
+    """
+    Synthetic firmware image the way the build tools lay it out: body, CRC word (CRC over body+CRC is 0),
+    size word (in words, CRC included), at least one 0xFE padding word, padded to a multiple of pad_to.
+    """
+    body = np.random.default_rng(seed).integers(0, 256, size & ~0x03, dtype=np.uint8).tobytes()
+    image = body + crc32_stm_fast(body).to_bytes(4, "little")
+    image += (len(image) // 4).to_bytes(4, "little") + b'\xFE' * 4
+    return image + b'\xFE' * (-len(image) % pad_to)
+
+
+def OM_sim_ModbusWorker(slave_ids=(1,), latency=0.0, baudrate=None, **device_kwargs):
+    """Shortcut: bus with one simulated OM per slave ID and an in-process worker for it (not started)."""
+    bus = OMSimBus([OMSimDevice(slave_id=sid, **device_kwargs) for sid in slave_ids], latency=latency, baudrate=baudrate)
+    return bus, SimModbusWorker(bus)
+
+
+if __name__ == "__main__":
+    bus = OMSimBus([OMSimDevice(slave_id=1)], latency=0.001, baudrate=500000)
+    server = OMSimPtyServer(bus)
+    print(f"Simulated OM (slave 1) on {server.start()}, Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
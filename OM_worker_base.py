@@ -1,19 +1,92 @@
 import time
+import threading
 import struct
+from collections import deque
 from loguru import logger
 from OM_registers import *
 from OM_data import *
 from blt_logic import *
+from OM_read_planner import *
 from PIL import Image
 import numpy as np
 from tqdm import tqdm  # Add this import at the top of your file
+from concurrent.futures import ThreadPoolExecutor
+import os
 from OM_comm_interface import *
 from modbus_worker import *
+from blt_flash import *
+from blt_cmd import *
+
+# Lines of the SS image read per batch: 4 part reads per line
+OM_SS_BATCH_LINES   = 8
+# Retries of failed SS line part reads: per part and per readout call
+OM_SS_PART_RETRIES  = 3
+OM_SS_RETRY_BUDGET  = 192
+# Line step of the first progressive SS pass (coarse preview)
+OM_SS_PREVIEW_STEP  = 8
+# Command completion polling: interval grows from min to max, timeout per command
+OM_CMD_POLL_MIN     = 0.005
+OM_CMD_POLL_MAX     = 0.05
+OM_CMD_TIMEOUT      = 2.0
+# Completion assumed after this delay when the status window reports nothing (the fixed wait used before it existed)
+OM_CMD_SETTLE       = 0.3
+# Lines of the HS image per batch in the streaming reader
+OM_HS_BATCH_LINES   = 4
+# Batches the streaming readers keep queued ahead of the one being consumed
+OM_STREAM_PREFETCH  = 1
+# Per-transaction share of the batch timeout
+OM_BATCH_TXN_TIMEOUT = 0.5
+# Bootloader status polling: interval doubles from min to max; timeouts per operation, seconds
+OM_BLT_POLL_MIN     = 0.01
+OM_BLT_POLL_MAX     = 0.5
+OM_BLT_CMD_TIMEOUT  = 2.0
+OM_BLT_ERASE_TIMEOUT = 15.0
+OM_BLT_RESTART_TIMEOUT = 5.0
+
+# Seconds a static field (see OM_FIELDS) stays cached. Entries also get dropped
+# by the commands that change them: SetDevID, SetMnfID, reboot and any Blt_* command.
+OM_STATIC_TTL = {
+    "FWVer"     : 300,
+    "MnfID"     : 3600,
+    "DevID"     : 300,
+    "GitHash"   : 300,
+    "SSMtxSet"  : 60,
+    "SSAlgoSet" : 60,
+}
+
+def OM_resp_FWVer(registers: list):
+    return {"FW version": OM_FWVer_parse(RegistersToPack(registers))}
+
+def OM_resp_MnfID(registers: list):
+    return {"MnfID": OM_MnfID(RegistersToPack(registers))}
+
+def OM_resp_CurSector(registers: list):
+    return {"Current sector": RegistersToPack(registers)[0]}
+
+
+def OM_burst_process_frame(kind: str, index: int, result: dict, save_dir: str = None):
+    """
+    Default host-side processing of a burst frame: 8-bit normalisation, optional PNG save, basic statistics.
+    Runs on the burst's background worker.
+    """
+    image = np.asarray(result["data"], dtype=np.float32)
+    lo, hi = float(image.min()), float(image.max())
+    img8 = ((image - lo) / (hi - lo if hi > lo else 1.0) * 255).astype(np.uint8)
+    ret = {"frame": index, "min": lo, "max": hi, "mean": float(image.mean())}
+    if save_dir:
+        os.makedirs(save_dir, exist_ok=True)
+        path = os.path.join(save_dir, f"{kind}_{index:04d}.png")
+        Image.fromarray(img8, mode="L").save(path)
+        ret["path"] = path
+    return ret
+
 
 class OM_Interface:
     def __init__(self, comm_worker, slave_id=1):
         self.modbus_worker = comm_worker
         self.slave_id = slave_id
+        self._static_cache = {}
+        self._static_cache_lock = threading.Lock()
         logger.info(f"Initialized OM Interface with slave ID: {slave_id}")
 
     def _build_command(self, request_type, address, count=0, registers:list = [], reversed_registers:bool=True):
@@ -31,37 +104,118 @@ class OM_Interface:
             logger.error(f"Unknown request type: {request_type}")
             raise ValueError("Unknown request type")
 
+    def _cmd_command(self, pack: list):
+        return self._build_command(ModbusRequestType.WRITE_MULTY, OM_CMD_REG_ADDR+OM_CMD_OFF, registers=PackToRegisters(pack))
+
+    def _field_command(self, field: str):
+        info = OM_FIELDS[field]
+        return self._build_command(ModbusRequestType.READ, info.block + info.offset, count=info.length)
+
     def send_modbus(self, command, blocking=True, timeout=5, silent=False):
         return self.modbus_worker.send_request(command, blocking=blocking, timeout=timeout, silent=silent)
 
+    def send_modbus_batch(self, commands: list, timeout=None, silent=False, stop_on_error=True, blocking=True):
+        """
+        Runs the commands as one batch. Non-blocking call returns the pending handle, see wait_modbus_batch.
+        """
+        if timeout is None:
+            timeout = 1 + OM_BATCH_TXN_TIMEOUT * len(commands)
+        return self.modbus_worker.send_batch(commands, blocking=blocking, timeout=timeout, silent=silent, stop_on_error=stop_on_error)
+
+    def wait_modbus_batch(self, pending, timeout=None):
+        """Responses of a batch sent with blocking=False, a "Timeout" error for each command on timeout."""
+        requests = pending.request.requests
+        if timeout is None:
+            timeout = 1 + OM_BATCH_TXN_TIMEOUT * len(requests)
+        responses = self.modbus_worker.wait_response(pending, timeout)
+        if responses is None:
+            logger.warning(f"Batch {pending.id} of {len(requests)} requests timed out after {timeout} seconds")
+            return [{"error": "Timeout"} for _ in requests]
+        return responses
+
+    def _record_decode(self, address: int, t0: float):
+        """Adds the time since t0 to the worker's decode histogram, if the worker keeps metrics."""
+        metrics = getattr(self.modbus_worker, "metrics", None)
+        if metrics is not None:
+            metrics.record_decode(address, self.slave_id, time.perf_counter() - t0)
+
+    def Cache_Invalidate(self, fields: list = None, slave_id: int = None):
+        """
+        Drops cached static fields of the slave (current one by default). All fields if none given.
+        """
+        slave_id = self.slave_id if slave_id is None else slave_id
+        with self._static_cache_lock:
+            for key in list(self._static_cache):
+                if key[0] == slave_id and (fields is None or key[1] in fields):
+                    del self._static_cache[key]
+
+    def _cache_drop_ids(self, new_id: int):
+        """After SetDevID: drops the entries of the old and the new ID, everything after a broadcast (slave ID 0)."""
+        if self.slave_id == 0:
+            with self._static_cache_lock:
+                self._static_cache.clear()
+            return
+        self.Cache_Invalidate()
+        self.Cache_Invalidate(slave_id=new_id)
+
+    def _cache_get(self, field: str):
+        with self._static_cache_lock:
+            entry = self._static_cache.get((self.slave_id, field))
+        if entry is None:
+            return None
+        stamp, registers = entry
+        if time.monotonic() - stamp > OM_STATIC_TTL[field]:
+            return None
+        return list(registers)
+
+    def _cache_put(self, field: str, registers: list):
+        if field not in OM_STATIC_TTL:
+            return
+        with self._static_cache_lock:
+            self._static_cache[(self.slave_id, field)] = (time.monotonic(), list(registers))
+
+    def _read_static(self, field: str, refresh=False, timeout=1):
+        """
+        Raw registers of a static field: from the cache if it is fresh, from the bus otherwise.
+        """
+        if not refresh:
+            registers = self._cache_get(field)
+            if registers is not None:
+                return {"data": registers}
+        command = self._field_command(field)
+        response = self.modbus_worker.send_request(command, blocking=True, timeout=timeout)
+        logger.debug(f"Reading {field}: {command.__dict__}")
+        if "data" in response:
+            self._cache_put(field, response["data"])
+        return response
+
     def Cmd_ForceReboot(self):
+        self.Cache_Invalidate()
         pack = OM_BuildCmd_Reboot()
-        registers = PackToRegisters(pack)
-        command = self._build_command(ModbusRequestType.WRITE_MULTY, OM_CMD_REG_ADDR+OM_CMD_OFF, registers=registers)
+        command = self._cmd_command(pack)
         logger.debug(f"Sending reboot command: {command.__dict__}")
         response = self.modbus_worker.send_request(command)
         return response
 
     def Cmd_SetDevID(self, ID : int):
         pack = OM_build_set_DevID(ID)
-        registers = PackToRegisters(pack)
-        command = self._build_command(ModbusRequestType.WRITE_MULTY, OM_CMD_REG_ADDR+OM_CMD_OFF, registers=registers)
+        command = self._cmd_command(pack)
         logger.debug(f"Sending SetDevID command: {command.__dict__}")
         response = self.modbus_worker.send_request(command)
+        # Also on error: a write that timed out may still have been applied
+        self._cache_drop_ids(ID)
         return response
 
     def Cmd_SSTake(self):
         pack = OM_build_cmd_SS_take()
-        registers = PackToRegisters(pack)
-        command = self._build_command(ModbusRequestType.WRITE_MULTY, OM_CMD_REG_ADDR+OM_CMD_OFF, registers=registers)
+        command = self._cmd_command(pack)
         logger.debug(f"Sending SSTake command: {command.__dict__}")
         response = self.modbus_worker.send_request(command)
         return response
 
     def Cmd_HSTake(self):
         pack = OM_build_cmd_HS_take()
-        registers = PackToRegisters(pack)
-        command = self._build_command(ModbusRequestType.WRITE_MULTY, OM_CMD_REG_ADDR+OM_CMD_OFF, registers=registers)
+        command = self._cmd_command(pack)
         logger.debug(f"Sending HSTake command: {command.__dict__}")
         response = self.modbus_worker.send_request(command)
         return response
@@ -69,104 +223,172 @@ class OM_Interface:
 
     def Cmd_GAMTake(self):
         pack = OM_build_cmd_GAM_take()
-        registers = PackToRegisters(pack)
-        command = self._build_command(ModbusRequestType.WRITE_MULTY, OM_CMD_REG_ADDR+OM_CMD_OFF, registers=registers)
+        command = self._cmd_command(pack)
         logger.debug(f"Sending SSTake command: {command.__dict__}")
         response = self.modbus_worker.send_request(command)
         return response
 
     def _Cmd_SetMnfID(self, ID: int):
+        self.Cache_Invalidate()
         pack = [0x1F, 0x00, 0x02, 0x00, ((ID >> 0) & 0xFF), ((ID >> 8) & 0xFF), ((ID >> 16) & 0xFF), ((ID >> 24) & 0xFF)]
         # pack = [0x1F, 0x00, 0x02, 0x00, 0x10, 0x00, 0x01, 0x00]
-        registers = PackToRegisters(pack=pack)
-        command = self._build_command(ModbusRequestType.WRITE_MULTY, OM_CMD_REG_ADDR+OM_CMD_OFF, registers=registers)
+        command = self._cmd_command(pack)
         logger.debug(f"Sending SSTake command: {command.__dict__}")
         response = self.modbus_worker.send_request(command)
         return response
 
 
-    def Data_GetFWVer(self):
-        command = self._build_command(ModbusRequestType.READ, OM_CMD_REG_ADDR+OM_FW_VER_OFF, count=OM_FW_VER_LEN)
-        response = self.modbus_worker.send_request(command, timeout=1)
-        logger.debug(f"Getting FW version data: {command.__dict__}")
-        
+    def Data_GetFWVer(self, refresh=False):
+        response = self._read_static("FWVer", refresh=refresh)
         if "data" in response:
-            data = RegistersToPack(response["data"])
-            response["data"] = {"FW version": OM_FWVer_parse(data)}
+            response["data"] = OM_resp_FWVer(response["data"])
         return response
 
-    def Data_GetMnfID(self):
-        command = self._build_command(ModbusRequestType.READ, OM_CMD_REG_ADDR+OM_MNF_ID_OFF, count=OM_MNF_ID_LEN)
-        response = self.modbus_worker.send_request(command, timeout=1)
-        logger.debug(f"Getting  mnf ID data: {command.__dict__}")
-        
+    def Data_GetMnfID(self, refresh=False):
+        response = self._read_static("MnfID", refresh=refresh)
         if "data" in response:
-            data = RegistersToPack(response["data"])
-            response["data"] = {"MnfID": OM_MnfID(data)}
+            response["data"] = OM_resp_MnfID(response["data"])
         return response
 
     def Data_GetNonCanCurrBlock(self):
-        command = self._build_command(ModbusRequestType.READ, OM_CMD_REG_ADDR+OM_CUR_REGION_OFF, count=OM_CUR_REGION_LEN)
+        command = self._field_command("CurRegion")
         response = self.modbus_worker.send_request(command, timeout=1)
         logger.debug(f"Getting CurSect data: {command.__dict__}")
-        
         if "data" in response:
-            data = RegistersToPack(response["data"])
-            response["data"] = {"Current sector": data[0]}
+            response["data"] = OM_resp_CurSector(response["data"])
         return response
 
 
     def Data_GetSS(self, blocking=True, timeout=1):
-        command = self._build_command(ModbusRequestType.READ, OM_SS_REG_ADDR+OM_SS_DATA_OFF, count=OM_SS_DATA_LEN)
+        command = self._field_command("SS")
         response = self.modbus_worker.send_request(command, blocking=blocking, timeout=timeout)
         logger.debug(f"Getting SS data: {command.__dict__}")
+        if not blocking:
+            return response
         if "data" in response:
             response["data"] = OM_SS_parse(response["data"])
         return response
 
 
-    def Data_GetDevID(self, blocking=True, timeout=1):
-        command = self._build_command(ModbusRequestType.READ, OM_CMD_REG_ADDR+OM_DEV_ID_OFF, count=OM_DEV_ID_LEN)
-        response = self.modbus_worker.send_request(command, blocking=blocking, timeout=timeout)
+    def Data_GetDevID(self, blocking=True, timeout=1, refresh=False):
+        if blocking:
+            response = self._read_static("DevID", refresh=refresh, timeout=timeout)
+            if "data" in response:
+                response["data"] = OM_parse_DevID(response["data"])
+            return response
+        command = self._field_command("DevID")
+        response = self.modbus_worker.send_request(command, blocking=False, timeout=timeout)
         logger.debug(f"Sending SS_read_data: {command.__dict__}")
-        if "data" in response:
-            response["data"] = OM_parse_DevID(response["data"])
         return response
 
-    def Data_GetFW_ID(self):
-        command = self._build_command(ModbusRequestType.READ, OM_CMD_REG_ADDR+OM_FW_VER_OFF, count=OM_FW_VER_LEN)
-        response = self.modbus_worker.send_request(command, blocking=True, timeout=1)
-        logger.debug(f"Sending FW_read_data: {command.__dict__}")
+    def Data_GetFW_ID(self, refresh=False):
+        response = self._read_static("FWVer", refresh=refresh)
         if "data" in response:
             response["data"] = OM_parse_FWVer(response["data"])
         return response        
 
     def Data_GetGAM(self):
-        command = self._build_command(ModbusRequestType.READ, OM_GAM_REG_ADDR+OM_GAM_DATA_OFF, count=OM_GAM_DATA_LEN)
+        command = self._field_command("GAM")
         response = self.modbus_worker.send_request(command, blocking=True, timeout=1)
         logger.debug(f"Getting GAM data: {command.__dict__}")
         if "data" in response:
             response["data"] = OM_GAM_parse(response["data"])
         return response
 
-    def Data_GetSSMtxSet(self):
-        command = self._build_command(ModbusRequestType.READ, OM_SS_REG_ADDR+OM_SS_MTX_SET_OFF, count=OM_SS_MTX_SET_LEN)
-        response = self.modbus_worker.send_request(command, blocking=True, timeout=1)
-        logger.debug(f"Getting SS matrix set data: {command.__dict__}")
+    def Data_GetSSMtxSet(self, refresh=False):
+        response = self._read_static("SSMtxSet", refresh=refresh)
         if "data" in response:
             response["data"] = OM_SS_parse_MtxSet(response["data"])
         return response
 
     def Data_GetCmdStatus(self):
-        command = self._build_command(ModbusRequestType.READ, OM_CMD_REG_ADDR+OM_STATUS_OFF, count=OM_STATUS_LEN)
+        command = self._field_command("Status")
         response = self.modbus_worker.send_request(command, blocking=True, timeout=1)
         logger.debug(f"Getting command status data: {command.__dict__}")
         return response
 
-    def Data_GetSSAlgoSet(self):
-        command = self._build_command(ModbusRequestType.READ, OM_SS_REG_ADDR+OM_SS_ALGO_SET_OFF, count=OM_SS_ALGO_SET_LEN)
-        response = self.modbus_worker.send_request(command, blocking=True, timeout=1)
-        logger.debug(f"Getting SS algo set data: {command.__dict__}")
+    def _cmd_state(self):
+        """Head of the command status window ({"Cmd", "State"}), None if it could not be read."""
+        response = self.modbus_worker.send_request(self._field_command("Status"), blocking=True, timeout=1, silent=True)
+        return OM_parse_CmdState(response["data"]) if "data" in response else None
+
+    def wait_for_completion(self, cmd: int, timeout: float = OM_CMD_TIMEOUT, before: dict = None, settle: float = OM_CMD_SETTLE):
+        """
+        Polls the command status window until cmd is reported done.
+        before is the window read before cmd was issued (see Exec_And_Wait): a DONE of cmd counts only once the
+        window has changed from it or shown BUSY, so the state left by the previous run of cmd is not taken for this one
+        (without before only BUSY counts).
+        A window that shows nothing new or does not have the expected layout (OM_cmd_state_known) after settle seconds
+        (firmware without the status window, or a command done before the first poll) is taken as done, as the fixed
+        delay used to be.
+        The poll interval starts at OM_CMD_POLL_MIN and doubles up to OM_CMD_POLL_MAX; a missed status read counts as busy.
+        Returns:
+            dict: { "data": {"Cmd", "State", "elapsed_s"}, "error": on command error or timeout }
+        """
+        t_start = time.perf_counter()
+        interval = OM_CMD_POLL_MIN
+        status = None
+        started = False
+        while True:
+            status = self._cmd_state()
+            elapsed = time.perf_counter() - t_start
+            known = status is not None and OM_cmd_state_known(status)
+            if known and status["Cmd"] == cmd:
+                started = started or status["State"] == OM_CMD_STATE_BUSY or (before is not None and status != before)
+                if started or elapsed >= settle:
+                    if status["State"] & OM_CMD_STATE_ERR_MASK:
+                        logger.error(f"Command 0x{cmd:02X} failed, state 0x{status['State']:02X}")
+                        return {"error": f"Command 0x{cmd:02X} failed, state 0x{status['State']:02X}"}
+                    if status["State"] == OM_CMD_STATE_DONE:
+                        status["elapsed_s"] = elapsed
+                        logger.debug(f"Command 0x{cmd:02X} done in {elapsed:.3f} s")
+                        return {"data": status}
+            elif not started and elapsed >= settle and (not known or status == before):
+                logger.debug(f"Command 0x{cmd:02X} not reported after {settle} s, status window unused: {status}")
+                return {"data": {"Cmd": cmd, "State": None, "elapsed_s": elapsed}}
+            if elapsed + interval > timeout:
+                logger.warning(f"Command 0x{cmd:02X} not done after {timeout} s, last status: {status}")
+                return {"error": "Completion timeout"}
+            if not started and elapsed < settle:
+                interval = min(interval, settle - elapsed)
+            time.sleep(interval)
+            interval = min(interval * 2, OM_CMD_POLL_MAX)
+
+    def Exec_And_Wait(self, issue, cmd: int, timeout: float = OM_CMD_TIMEOUT):
+        """
+        Reads the command status window, issues the command (issue() returns the write response) and waits for it.
+        Returns:
+            dict: the write error or the wait_for_completion result.
+        """
+        before = self._cmd_state()
+        response = issue()
+        if "error" in response:
+            return response
+        return self.wait_for_completion(cmd, timeout=timeout, before=before)
+
+    def Take_And_Read_SS(self, timeout: float = OM_CMD_TIMEOUT):
+        """Sun sensor measurement: take, wait for completion, read the SS data."""
+        response = self.Exec_And_Wait(self.Cmd_SSTake, OM_CMD_TAKE_SS, timeout=timeout)
+        if "error" in response:
+            return response
+        return self.Data_GetSS()
+
+    def Take_And_Read_GAM(self, timeout: float = OM_CMD_TIMEOUT):
+        """Gyro/accelerometer/magnetometer measurement: take, wait for completion, read the GAM data."""
+        response = self.Exec_And_Wait(self.Cmd_GAMTake, OM_CMD_TAKE_GAM, timeout=timeout)
+        if "error" in response:
+            return response
+        return self.Data_GetGAM()
+
+    def Take_And_Read_Thermal(self, timeout: float = OM_CMD_TIMEOUT, as_list=False):
+        """Horizon sensor measurement: take, wait for completion, read the thermal image."""
+        response = self.Exec_And_Wait(self.Cmd_HSTake, OM_CMD_TAKE_HS, timeout=timeout)
+        if "error" in response:
+            return response
+        return self.Read_Thermal_Photo(as_list=as_list)
+
+    def Data_GetSSAlgoSet(self, refresh=False):
+        response = self._read_static("SSAlgoSet", refresh=refresh)
         if "data" in response:
             response["data"] = OM_SS_parse_AlgoSet(response["data"])
         return response
@@ -184,27 +406,68 @@ class OM_Interface:
             response["data"] = OM_SS_parse_Temperature(response["data"])
         return response
 
+    def Data_GetFields(self, names: list, timeout=None, refresh=False):
+        """
+        Reads several fields of OM_FIELDS with the fewest transactions (see OM_plan_reads).
+        Static fields are served from the cache unless refresh is set.
+        Returns:
+            dict: { "data": {field name: parsed value}, "error": ... }
+        """
+        data = {}
+        to_read = []
+        for name in names:
+            registers = None if refresh or name not in OM_STATIC_TTL else self._cache_get(name)
+            if registers is None:
+                to_read.append(name)
+            else:
+                parser = OM_FIELDS[name].parser
+                data[name] = parser(registers) if parser is not None else registers
+        if not to_read:
+            return {"data": data}
+
+        spans = OM_plan_reads(to_read)
+        commands = [self._build_command(ModbusRequestType.READ, span.address, count=span.count) for span in spans]
+        logger.debug(f"Reading fields {to_read} in {len(spans)} transaction(s)")
+        responses = self.send_modbus_batch(commands, timeout=timeout)
+
+        for span, response in zip(spans, responses):
+            if "error" in response:
+                return {"error": response["error"]}
+            t0 = time.perf_counter()
+            for field in span.fields:
+                start = field.offset - span.offset
+                self._cache_put(field.name, response["data"][start:start + field.length])
+            data.update(OM_slice_fields(span, response["data"]))
+            self._record_decode(span.address, t0)
+        return {"data": {name: data[name] for name in names}}
+
+    def Data_GetIdentity(self, refresh=False):
+        """
+        Reads FW version, current region, MnfID, temperature, DevID and git hash in a single transaction.
+        """
+        return self.Data_GetFields(OM_IDENTITY_FIELDS, refresh=refresh)
 
-    def _CANWrp_ExecCmd(self, VarID: int = 14, Offset : int = 0, RTR: int = 1, data: list = [], DLen: int = 0, silent=False):
-        pack = OM_build_CANWrp_WriteWrappedCmd(VarID=VarID, Offset=Offset, RTR=RTR, data=data, DLen=DLen)
-        registers = PackToRegisters(pack=pack)
 
-        command = self._build_command(ModbusRequestType.WRITE_MULTY, OM_BOOT_REG_ADDR+OM_CAN_STR_OFF, registers=registers)
-        if not silent:
-            logger.debug(f"Sending CANEm command: {command.__dict__}")
-        response = self.modbus_worker.send_request(command, silent=silent)
-        if "error" in response:
-            return {"error": response["error"]}
+    def _CANWrp_commands(self, VarID: int = 14, Offset : int = 0, RTR: int = 1, data: list = [], DLen: int = 0):
+        """Wrapper frame write and the read of its answer: sent as one batch so no other request gets between them."""
+        pack = OM_build_CANWrp_WriteWrappedCmd(VarID=VarID, Offset=Offset, RTR=RTR, data=data, DLen=DLen)
+        return [self._build_command(ModbusRequestType.WRITE_MULTY, OM_BOOT_REG_ADDR+OM_CAN_STR_OFF, registers=PackToRegisters(pack=pack)),
+                self._build_command(ModbusRequestType.READ, OM_BOOT_REG_ADDR+OM_CAN_STR_OFF, count=OM_CAN_STR_LEN)]
+
+    @staticmethod
+    def _CANWrp_parse(responses: list):
+        for response in responses:
+            if "error" in response:
+                return {"error": response["error"]}
+        resp_pack = RegistersToPack(responses[-1]["data"])
+        CANNum, TypeID, DLen, data_resp = OM_Parse_CANEmWrap(resp_pack)
+        return {"data": {"CANNum" : CANNum, "TypeID" : TypeID, "DLen" : DLen, "data" : data_resp}}
 
-        command = self._build_command(ModbusRequestType.READ, OM_BOOT_REG_ADDR+OM_CAN_STR_OFF, count=OM_CAN_STR_LEN)
-        response = self.modbus_worker.send_request(command, timeout=1, silent=silent)
+    def _CANWrp_ExecCmd(self, VarID: int = 14, Offset : int = 0, RTR: int = 1, data: list = [], DLen: int = 0, silent=False):
+        commands = self._CANWrp_commands(VarID=VarID, Offset=Offset, RTR=RTR, data=data, DLen=DLen)
         if not silent:
-            logger.debug(f"Reading CANEm status: {command.__dict__}")
-        if "data" in response:        
-            resp_pack = RegistersToPack(response["data"])
-            CANNum, TypeID, DLen, data_resp = OM_Parse_CANEmWrap(resp_pack)
-            response["data"] = {"CANNum" : CANNum, "TypeID" : TypeID, "DLen" : DLen, "data" : data_resp}
-        return response
+            logger.debug(f"Sending CANEm command: {commands[0].__dict__}")
+        return self._CANWrp_parse(self.send_modbus_batch(commands, silent=silent))
 
     
     def CANWrp_ReadFlashFrag(self, offset=0):
@@ -216,212 +479,213 @@ class OM_Interface:
         return response
 
     def CANWrp_ReadCB(self, silent=False):
-        response = self._CANWrp_ExecCmd(Offset = 0x00080000, RTR = 1, silent=silent)
-        if "data" in response:
-            CANNum, TypeID, DLen, data_resp = response["data"].values()
-            parsed_data = OM_ParseFlashStruct(data=data_resp, type=FlashCB_Type.INFO)
-            response["data"] = parsed_data
-        return response
-
+        return self.Blt_Exec(None, silent=silent).to_response()
+
+
+    def _Blt_commands(self, int_pack: list = None, readback: bool = True):
+        commands = []
+        if int_pack is not None:
+            commands.append(self._build_command(ModbusRequestType.WRITE_MULTY, BLT_CMD_ADDR, registers=OM_blt_frame(int_pack),
+                                                reversed_registers=False))
+        if readback or int_pack is None:
+            commands.append(self._build_command(ModbusRequestType.WRITE_MULTY, BLT_CMD_ADDR, registers=BLT_FRAME_STATUS,
+                                                reversed_registers=False))
+            commands.append(self._build_command(ModbusRequestType.READ, BLT_CMD_ADDR, count=OM_CAN_STR_LEN))
+        return commands
+
+    @staticmethod
+    def _Blt_result(int_pack: list, responses: list, elapsed: float, silent=False):
+        cmd = int_pack[3] if int_pack is not None else None
+        for response in responses:
+            if "error" in response:
+                result = BltStatus(cmd=cmd, elapsed_s=elapsed, error=response["error"])
+                break
+        else:
+            if len(responses) > 1:
+                result = BltStatus.from_registers(responses[-1]["data"], cmd=cmd, elapsed_s=elapsed)
+            else:
+                result = BltStatus(cmd=cmd, elapsed_s=elapsed)
+        if not silent:
+            logger.debug(f"Bootloader {result}")
+        return result
 
+    def Blt_ExecSend(self, int_pack: list = None, readback: bool = True):
+        """
+        Queues a control block command (int_pack from the OM_build_Blt* builders) and, with readback, the status RTR
+        and read behind it, as one non-blocking batch. No int_pack: status read only. See Blt_ExecWait.
+        """
+        commands = self._Blt_commands(int_pack, readback=readback)
+        return int_pack, time.perf_counter(), self.send_modbus_batch(commands, silent=True, blocking=False)
 
-    def Blt_SetPref(self, pref: int = 0):
-        int_pack = OM_build_BltSetPref(pref)
-        pack = OM_build_CANWrp_WriteWrappedCmd(VarID=14, Offset=0x00080000, RTR=0, data=int_pack, DLen=len(int_pack))
-        registers = PackToRegisters(pack=pack)
+    def Blt_ExecWait(self, sent, silent=False):
+        """BltStatus of a command queued by Blt_ExecSend; without readback only error and timing are filled."""
+        int_pack, t_start, pending = sent
+        responses = self.wait_modbus_batch(pending)
+        return self._Blt_result(int_pack, responses, time.perf_counter() - t_start, silent=silent)
 
-        command = self._build_command(ModbusRequestType.WRITE_MULTY, OM_BOOT_REG_ADDR+OM_CAN_STR_OFF, registers=registers)
-        logger.debug(f"Sending CANEm command: {command.__dict__}")
-        response = self.modbus_worker.send_request(command)
-        if "error" in response:
-            return {"error": response["error"]}
-
-        response = self._CANWrp_ExecCmd(Offset = 0x00080000, RTR = 1)
-        if "data" in response:
-            CANNum, TypeID, DLen, data_resp = response["data"].values()
-            parsed_data = OM_ParseFlashStruct(data=data_resp, type=FlashCB_Type.INFO)
-            if not "error" in response:
-                if (int.from_bytes(parsed_data["Status"], "little") & 0x80) != 0x00:
-                    response["Status"] = "Error"
-                else:
-                    response["Status"] = "Ok"
+    def Blt_Exec(self, int_pack: list = None, readback: bool = True, silent=False):
+        """
+        Runs a control block command and reads its status back in a single batch.
+        Returns:
+            BltStatus: status fields, ok/busy, elapsed_s; error set if any of the transactions failed
+        """
+        return self.Blt_ExecWait(self.Blt_ExecSend(int_pack, readback=readback), silent=silent)
 
-            response["data"] = parsed_data
-        return response
+    def Blt_SetPref(self, pref: int = 0):
+        self.Cache_Invalidate()
+        return self.Blt_Exec(OM_build_BltSetPref(pref)).to_response()
 
     def Blt_CheckImgValid(self, part = 0):
-        int_pack = OM_build_BltCheckImgValid(part)
-        pack = OM_build_CANWrp_WriteWrappedCmd(VarID=14, Offset=0x00080000, RTR=0, data=int_pack, DLen=len(int_pack))
-        registers = PackToRegisters(pack=pack)
-
-        command = self._build_command(ModbusRequestType.WRITE_MULTY, OM_BOOT_REG_ADDR+OM_CAN_STR_OFF, registers=registers)
-        logger.debug(f"Sending CANEm command: {command.__dict__}")
-        response = self.modbus_worker.send_request(command)
-        if "error" in response:
-            return {"error": response["error"]}
-
-        response = self._CANWrp_ExecCmd(Offset = 0x00080000, RTR = 1)
-        if "data" in response:
-            CANNum, TypeID, DLen, data_resp = response["data"].values()
-            parsed_data = OM_ParseFlashStruct(data=data_resp, type=FlashCB_Type.INFO)
-            if not "error" in response:
-                if (int.from_bytes(parsed_data["Status"], "little") & 0x80) != 0x00:
-                    response["Status"] = "Error"
-                else:
-                    response["Status"] = "Ok"
+        self.Cache_Invalidate()
+        return self.Blt_Exec(OM_build_BltCheckImgValid(part)).to_response()
 
-            response["data"] = parsed_data
-        return response
+    def _Blt_erase(self, int_pack: list):
+        self.Cache_Invalidate()
+        before = self.Blt_Exec(None, silent=True)
+        result = self.Blt_Exec(int_pack, readback=False)
+        if result.error is not None:
+            return {"error": result.error}
+        return self.Blt_WaitStatus(timeout=OM_BLT_ERASE_TIMEOUT, before=before)
 
     def Blt_EraseSector(self, sector = 7):
-        int_pack = OM_build_BltEraseSector(sector)
-        pack = OM_build_CANWrp_WriteWrappedCmd(VarID=14, Offset=0x00080000, RTR=0, data=int_pack, DLen=len(int_pack))
-        registers = PackToRegisters(pack=pack)
-
-        command = self._build_command(ModbusRequestType.WRITE_MULTY, OM_BOOT_REG_ADDR+OM_CAN_STR_OFF, registers=registers)
-        logger.debug(f"Sending CANEm command: {command.__dict__}")
-        response = self.modbus_worker.send_request(command)
-        if "error" in response:
-            return {"error": response["error"]}
-
-        time.sleep(5)
-
-        response = self._CANWrp_ExecCmd(Offset = 0x00080000, RTR = 1)
-        if "data" in response:
-            CANNum, TypeID, DLen, data_resp = response["data"].values()
-            parsed_data = OM_ParseFlashStruct(data=data_resp, type=FlashCB_Type.INFO)
-            if not "error" in response:
-                if (int.from_bytes(parsed_data["Status"], "little") & 0x80) != 0x00:
-                    response["Status"] = "Error"
-                else:
-                    response["Status"] = "Ok"
-
-            response["data"] = parsed_data
-        return response
+        return self._Blt_erase(OM_build_BltEraseSector(sector))
     
 
     def Blt_EraseHalf(self):
-        int_pack = OM_build_BltEraseSecondPart()
-        pack = OM_build_CANWrp_WriteWrappedCmd(VarID=14, Offset=0x00080000, RTR=0, data=int_pack, DLen=len(int_pack))
-        registers = PackToRegisters(pack=pack)
-
-        command = self._build_command(ModbusRequestType.WRITE_MULTY, OM_BOOT_REG_ADDR+OM_CAN_STR_OFF, registers=registers)
-        logger.debug(f"Sending CANEm command: {command.__dict__}")
-        response = self.modbus_worker.send_request(command)
-        if "error" in response:
-            return {"error": response["error"]}
-
-        time.sleep(5)
-
-        response = self._CANWrp_ExecCmd(Offset = 0x00080000, RTR = 1)
-        if "data" in response:
-            CANNum, TypeID, DLen, data_resp = response["data"].values()
-            parsed_data = OM_ParseFlashStruct(data=data_resp, type=FlashCB_Type.INFO)
-            if not "error" in response:
-                if (int.from_bytes(parsed_data["Status"], "little") & 0x80) != 0x00:
-                    response["Status"] = "Error"
-                else:
-                    response["Status"] = "Ok"
-
-            response["data"] = parsed_data
-        return response
+        return self._Blt_erase(OM_build_BltEraseSecondPart())
     
 
     def Blt_CheckCRC(self, img:int = 0, file_path=''):
+        self.Cache_Invalidate()
         int_pack = OM_build_BltCheckCRC(img=img, FW_path=file_path)
         if int_pack is None:
             return {'error': 'File error'}
-
-        pack = OM_build_CANWrp_WriteWrappedCmd(VarID=14, Offset=0x00080000, RTR=0, data=int_pack, DLen=len(int_pack))
-        registers = PackToRegisters(pack=pack)
-
-        command = self._build_command(ModbusRequestType.WRITE_MULTY, OM_BOOT_REG_ADDR+OM_CAN_STR_OFF, registers=registers)
-        logger.debug(f"Sending CANEm command: {command.__dict__}")
-        response = self.modbus_worker.send_request(command)
-        if "error" in response:
-            return {"error": response["error"]}
-
-        response = self._CANWrp_ExecCmd(Offset = 0x00080000, RTR = 1)
-        if "data" in response:
-            CANNum, TypeID, DLen, data_resp = response["data"].values()
-            parsed_data = OM_ParseFlashStruct(data=data_resp, type=FlashCB_Type.INFO)
-            if not "error" in response:
-                if (int.from_bytes(parsed_data["Status"], "little") & 0x80) != 0x00:
-                    response["Status"] = "Error"
-                else:
-                    response["Status"] = "Ok"
-
-            response["data"] = parsed_data
-        return response
+        return self.Blt_Exec(int_pack).to_response()
     
 
     def Blt_FixValid(self, img:int = 0):
-        int_pack = OM_build_BltFixValidImg(img=img)
-        if int_pack is None:
-            return {'error': 'File error'}
-
-        pack = OM_build_CANWrp_WriteWrappedCmd(VarID=14, Offset=0x00080000, RTR=0, data=int_pack, DLen=len(int_pack))
-        registers = PackToRegisters(pack=pack)
-
-        command = self._build_command(ModbusRequestType.WRITE_MULTY, OM_BOOT_REG_ADDR+OM_CAN_STR_OFF, registers=registers)
-        logger.debug(f"Sending CANEm command: {command.__dict__}")
-        response = self.modbus_worker.send_request(command)
-        if "error" in response:
-            return {"error": response["error"]}
-
-        response = self._CANWrp_ExecCmd(Offset = 0x00080000, RTR = 1)
-        if "data" in response:
-            CANNum, TypeID, DLen, data_resp = response["data"].values()
-            parsed_data = OM_ParseFlashStruct(data=data_resp, type=FlashCB_Type.INFO)
-            if not "error" in response:
-                if (int.from_bytes(parsed_data["Status"], "little") & 0x80) != 0x00:
-                    response["Status"] = "Error"
-                else:
-                    response["Status"] = "Ok"
-
-            response["data"] = parsed_data
-        return response
+        self.Cache_Invalidate()
+        return self.Blt_Exec(OM_build_BltFixValidImg(img=img)).to_response()
     
-    def Blt_Restart(self):
-        int_pack = OM_build_BltRestart()
-        if int_pack is None:
-            return {'error': 'File error'}
-
-        pack = OM_build_CANWrp_WriteWrappedCmd(VarID=14, Offset=0x00080000, RTR=0, data=int_pack, DLen=len(int_pack))
-        registers = PackToRegisters(pack=pack)
+    def Blt_WaitStatus(self, timeout: float = OM_BLT_CMD_TIMEOUT, poll_min: float = OM_BLT_POLL_MIN, poll_max: float = OM_BLT_POLL_MAX,
+                       before: BltStatus = None):
+        """
+        Polls the bootloader control block, interval doubling from poll_min to poll_max, until the command is seen to be over.
+        The bootloader reports no busy state, so the end is taken only from what can be observed: the control block
+        answering again after a silent period (it does not answer while erasing), or differing from before (the control
+        block read before the command was sent). A command that shows neither is reported as not observed at timeout.
 
-        command = self._build_command(ModbusRequestType.WRITE_MULTY, OM_BOOT_REG_ADDR+OM_CAN_STR_OFF, registers=registers)
-        logger.debug(f"Sending CANEm command: {command.__dict__}")
-        response = self.modbus_worker.send_request(command)
-        if "error" in response:
-            return {"error": response["error"]}
-        
-        return {'data': 'Cmd writen'}
+        Returns:
+            dict: { "data": parsed CB, "Status": "Ok"/"Error", "elapsed_s", "polls", "error": on timeout }
+        """
+        t_start = time.perf_counter()
+        interval = poll_min
+        polls = 0
+        last = None
+        was_silent = False
+        before_cb = before.cb_dict() if before is not None and before.error is None else None
+        while True:
+            polls += 1
+            result = self.Blt_Exec(None, silent=True)
+            elapsed = time.perf_counter() - t_start
+            if result.error is not None:
+                was_silent = True
+            else:
+                last = result.cb_dict()
+                if was_silent or (before_cb is not None and last != before_cb):
+                    ret = result.to_response()
+                    ret.update({"elapsed_s": elapsed, "polls": polls})
+                    logger.debug(f"Bootloader status 0x{result.status:02X} after {elapsed:.3f} s, {polls} polls")
+                    return ret
+            if elapsed + interval > timeout:
+                logger.warning(f"Bootloader command end not observed after {timeout} s, last CB: {last}")
+                return {"error": "Bootloader command end not observed", "data": last, "elapsed_s": elapsed, "polls": polls}
+            time.sleep(interval)
+            interval = min(interval * 2, poll_max)
+
+    def Blt_WaitRestart(self, timeout: float = OM_BLT_RESTART_TIMEOUT, before: BltStatus = None):
+        """
+        Waits for a bootloader restart: the control block stops answering and answers again, or answers differing from
+        before (the control block read before the restarting command, for a restart quicker than the polls).
+        A restart not seen within timeout is an error.
 
-    def Blt_CopyAndGo(self, file_path=''):
+        Returns:
+            dict: { "data": parsed CB, "Status", "restarted", "down_s": time unreachable, "elapsed_s", "error": on timeout }
+        """
+        t_start = time.perf_counter()
+        t_down = None
+        last = None
+        before_cb = before.cb_dict() if before is not None and before.error is None else None
+        interval = OM_BLT_POLL_MIN
+        while True:
+            result = self.Blt_Exec(None, silent=True)
+            now = time.perf_counter()
+            if result.error is not None:
+                if t_down is None:
+                    t_down = now
+            else:
+                last = result.cb_dict()
+                if t_down is not None or (before_cb is not None and last != before_cb):
+                    ret = result.to_response()
+                    ret.update({"restarted": True, "down_s": now - t_down if t_down is not None else 0.0,
+                                "elapsed_s": now - t_start})
+                    logger.info(f"Bootloader back after {ret['down_s']:.3f} s down, {ret['elapsed_s']:.3f} s total")
+                    return ret
+            if now - t_start > timeout:
+                logger.error(f"Bootloader restart not observed within {timeout} s, last CB: {last}")
+                return {"error": "Restart not observed", "restarted": False, "data": last, "elapsed_s": now - t_start}
+            time.sleep(interval)
+            # Fast polls until the bootloader goes down, so a short restart is not missed
+            interval = min(interval * 2, OM_BLT_POLL_MAX if t_down is not None else OM_BLT_POLL_MIN * 4)
+
+    def _Blt_restart_wait(self, int_pack: list, wait: bool):
+        """
+        Writes a restarting command without readback. The bootloader may restart before it acks the write,
+        so with wait a failed write still waits for the restart ("ack_error" then notes it).
+        """
+        before = self.Blt_Exec(None, silent=True) if wait else None
+        result = self.Blt_Exec(int_pack, readback=False)
+        if result.error is not None and not wait:
+            return {"error": result.error}
+        if not wait:
+            return {'data': 'Cmd writen'}
+        if result.error is not None:
+            logger.warning(f"Command 0x{result.cmd:02X} not acknowledged ({result.error}), waiting for a restart anyway")
+        ret = self.Blt_WaitRestart(before=before)
+        if result.error is not None:
+            ret["ack_error"] = result.error
+        return ret
+
+    def Blt_Restart(self, wait: bool = False):
+        """Restarts the bootloader; with wait, returns once it is seen back (see Blt_WaitRestart)."""
+        self.Cache_Invalidate()
+        return self._Blt_restart_wait(OM_build_BltRestart(), wait)
+
+    def Blt_CopyAndGo(self, file_path='', wait: bool = False):
+        """Copies the image from the reserve block and restarts; with wait, returns once the bootloader is seen back."""
+        self.Cache_Invalidate()
         int_pack = OM_build_CopyAndGo(FW_path=file_path)
         if int_pack is None:
             return {'error': 'File error'}
 
-        pack = OM_build_CANWrp_WriteWrappedCmd(VarID=14, Offset=0x00080000, RTR=0, data=int_pack, DLen=len(int_pack))
-        registers = PackToRegisters(pack=pack)
-
-        command = self._build_command(ModbusRequestType.WRITE_MULTY, OM_BOOT_REG_ADDR+OM_CAN_STR_OFF, registers=registers)
-        logger.debug(f"Sending CANEm command: {command.__dict__}")
-        response = self.modbus_worker.send_request(command)
-        return response
+        return self._Blt_restart_wait(int_pack, wait)
 
-    def Blt_UploadFW(self, image: int, file: str):
+    def Blt_UploadFW(self, image: int, file: str, sparse: bool = False, retries: int = BLT_UPLOAD_RETRIES):
         """
         Uploads firmware to the device.
 
         Args:
             image (int): 0 for main, 1 for reserve.
             file (str): Path to the firmware binary file.
+            sparse (bool): Skip the chunks an erased target already holds (see OM_sparse_frames), the device CRC check still runs.
+                           Only for a target erased right before (Blt_EraseHalf); the retries after an erase always use it.
+            retries (int): Full erase + upload attempts when the upload could not repair a window in place
+                           (e.g. a target that was not erased) or the CRC check failed.
 
         Returns:
             dict: Result of the upload process.
         """
+        self.Cache_Invalidate()
         # 1. Open file, extract CRC and data
         try:
             file_info, file_content = analyze_bin_file(file)
@@ -450,191 +714,682 @@ class OM_Interface:
         # 3. Set starting address as 0x00 cause Blt takes current FW addr and maps second FW to 0x00 addr.
         start_addr = 0x00
 
-        # 4. Iterate over file bytes, make a command to write 8 bytes of file data.
-        # 5. On each 128-byte written: read control block and check status. If status is incorrect - retry writing last 128 byte block
+        # 4. Write the file as pipelined 128-byte windows of 8-byte CAN-wrapped writes.
+        # 5. Read the control block status every few windows, rewrite the frames that differ after an error status.
         chunk_size = 8
-        block_size = 128
         total_len = len(fw_data)
         if(total_len % chunk_size) != 0:
             return {"error": "File size is not a multiple of 8 bytes"}
         if(total_len != file_size):
             return {"error": "File size does not match the expected size"}
-        offset = 0
-        retry_limit = 3
-
-        logger.info(f"Starting firmware upload: {file}, size: {total_len} bytes")
-        with tqdm(total=total_len, desc="FW upload", unit="B") as pbar:
-            while offset < total_len:
-                block = fw_data[offset:offset + block_size]
-                block_offset = 0
-                retries = 0
-                while block_offset < len(block):
-                    chunk = block[block_offset:block_offset + chunk_size]
-                    # Pad chunk if less than 8 bytes
-                    if len(chunk) < chunk_size:
-                        logger.debug(f"Padding chunk at offset {offset + block_offset}: {chunk}")
-                        chunk = chunk + b'\xFE' * (chunk_size - len(chunk))
-                    # Prepare CAN wrapped command
-                    pack = OM_build_CANWrp_WriteWrappedCmd(
-                        VarID=14,
-                        Offset=start_addr + offset + block_offset,
-                        RTR=0,
-                        data=list(chunk),
-                        DLen=len(chunk)
-                    )
-                    registers = PackToRegisters(pack=pack)
-                    command = self._build_command(
-                        ModbusRequestType.WRITE_MULTY,
-                        OM_BOOT_REG_ADDR + OM_CAN_STR_OFF,
-                        registers=registers
-                    )
-                    response = self.modbus_worker.send_request(command, silent=True)
-                    if "error" in response:
-                        logger.error(f"Write error at offset {offset + block_offset}: {response['error']}")
-                        return {"error": f"Write error at offset {offset + block_offset}: {response['error']}"}
-                    block_offset += chunk_size
-                    pbar.update(chunk_size)
-                time.sleep(0.1)
-                # After each 128 bytes, check control block status
-                for _ in range(retry_limit):
-                    cb_resp = self.CANWrp_ReadCB(silent=True)
-                    if "data" in cb_resp:
-                        status = cb_resp["data"].get("Status", 0)
-                        # 0x80 is error, 0x10 is OK
-                        if (int.from_bytes(status) & 0x80) == 0:
-                            break  # OK
-                    retries += 1
-                    if retries >= retry_limit:
-                        logger.error(f"Write failed at offset {offset}, status: {cb_resp}")
-                        return {"error": f"Write failed at offset {offset}, status: {cb_resp}"}
-                    time.sleep(0.2)
-                offset += block_size
-
-        logger.info("Firmware upload complete, verifying CRC and validity...")
-        # 6. Once file content is loaded - check FW CRC and Valid.
-        check_crc = self.Blt_CheckCRC(img=image, file_path=file)
-        if 'Error' in check_crc:
-            logger.error(f"CRC check failed: {check_crc['error']}")
-            return {"error": f"CRC check failed: {check_crc['error']}"}
-        # check_valid = self.Blt_CheckImgValid(part=image)
-        # if 'Error' in check_valid:
-        #     logger.error(f"Valid check failed: {check_valid['error']}")
-        #     return {"error": f"Valid check failed: {check_valid['error']}"}
-
-        logger.info("Firmware upload successful!")
-        return {
-            "status": "success",
-            "CRC_check": check_crc
-        }
+
+        frames, skipped = OM_sparse_frames(file_info, total_len) if sparse else ({}, 0)
+        logger.info(f"Starting firmware upload: {file}, size: {total_len} bytes, {skipped} of {total_len // chunk_size} chunks skipped")
+        for attempt in range(retries + 1):
+            if attempt:
+                # A rewritten chunk cannot set bits back: start over from an erased image
+                logger.warning(f"Erasing the image and uploading again, attempt {attempt} of {retries}")
+                erase = self.Blt_EraseHalf()
+                if "error" in erase:
+                    return {"error": f"Erase failed: {erase['error']}"}
+                frames, skipped = OM_sparse_frames(file_info, total_len)
+            upload = OMFlashUploader(self).upload(fw_data, start_addr=start_addr, frames=frames)
+            if "error" in upload:
+                error = upload["error"]
+                continue
+            upload["data"]["skipped_chunks"] = skipped
+
+            logger.info("Firmware upload complete, verifying CRC and validity...")
+            # 6. Once file content is loaded - check FW CRC and Valid.
+            check_crc = self.Blt_CheckCRC(img=image, file_path=file)
+            if check_crc.get("Status") != "Ok":
+                logger.error(f"CRC check failed: {check_crc}")
+                error = f"CRC check failed: {check_crc.get('error', check_crc.get('data'))}"
+                continue
+            # check_valid = self.Blt_CheckImgValid(part=image)
+            # if 'Error' in check_valid:
+            #     logger.error(f"Valid check failed: {check_valid['error']}")
+            #     return {"error": f"Valid check failed: {check_valid['error']}"}
+
+            logger.info("Firmware upload successful!")
+            return {
+                "status": "success",
+                "CRC_check": check_crc,
+                "upload": upload["data"]
+            }
+        return {"error": error}
     
-    def Read_SS_Grayscale_Photo(self):
+    def _Blt_diff_sectors(self, fw_data, length: int, image: int):
+        """
+        Reads back the target image sector by sector, up to the first window that differs from fw_data.
+        Returns:
+            list: OM_image_sectors entries that differ
+        """
+        readback = OMFlashReadback(self)
+        differ = []
+        for sector in OM_image_sectors(image, length):
+            _, sect_start, sect_len = sector
+            windows = readback.iter_windows(range(sect_start, sect_start + sect_len, BLT_WINDOW_SIZE), sect_start + sect_len)
+            try:
+                for offset, block in windows:
+                    if block != bytes(fw_data[offset:offset + len(block)]):
+                        differ.append(sector)
+                        break
+            finally:
+                windows.close()
+        return differ
+
+    def Blt_UpdateFW_Diff(self, image: int, file: str):
+        """
+        Update that rewrites only the flash sectors that differ from the file.
+        A device CRC check (Blt_CheckCRC) first: an image that already holds the file is left as it is. Otherwise
+        the image is read back sector by sector (OM_image_sectors) up to the first window that differs, only the
+        differing sectors are erased (Blt_EraseSector) and uploaded, and the CRC is checked again.
+        Only the firmware, its CRC and size words are compared, the padding after them is not checked by the bootloader.
+        A failed readback, erase or check falls back to the full erase and upload.
+
+        Returns:
+            dict: as Blt_UploadFW plus "mode" ("same", "diff" or "erase+full") and "sectors" (erased sector numbers).
+        """
+        self.Cache_Invalidate()
+        file_info, fw_data = analyze_bin_file(file)
+        if file_info is None or fw_data is None:
+            return {"error": "File error or CRC/size not found"}
+        if file_info.get("FW_size", 0) == 0:
+            return {"error": "FW size is zero"}
+
+        cb_resp = self.CANWrp_ReadCB()
+        if "data" not in cb_resp:
+            return {"error": "Failed to read control block"}
+        if int.from_bytes(cb_resp["data"].get("CurrentBlock")) == image:
+            return {"error": "Cannot upload to currently running image"}
+
+        check_crc = self.Blt_CheckCRC(img=image, file_path=file)
+        if check_crc.get("Status") == "Ok":
+            logger.info("Target image already holds the firmware, nothing to upload")
+            return {"status": "success", "mode": "same", "sectors": [], "CRC_check": check_crc}
+
+        # FW, CRC and size words, rounded up to whole frames
+        length = min(len(fw_data), file_info["FW_size"] + 4 + (-(file_info["FW_size"] + 4)) % BLT_CHUNK_SIZE)
+        try:
+            differ = self._Blt_diff_sectors(fw_data, length, image)
+        except IOError as e:
+            logger.warning(f"Readback failed ({e}), uploading the full image")
+            differ = None
+        if differ is not None:
+            logger.info(f"Sectors {[sector for sector, _, _ in differ]} differ, erasing and uploading them")
+            response = self._Blt_diff_upload(image, file, file_info, fw_data, differ)
+            if "error" not in response:
+                return response
+            logger.warning(f"Differential update failed ({response['error']}), uploading the full image")
+
+        erase = self.Blt_EraseHalf()
+        if "error" in erase:
+            return {"error": f"Erase failed: {erase['error']}"}
+        response = self.Blt_UploadFW(image, file, sparse=True)
+        if "error" not in response:
+            response["mode"] = "erase+full"
+            response["sectors"] = [sector for sector, _, _ in OM_image_sectors(image, FLASH_IMG_SIZE)]
+        return response
+
+    def _Blt_diff_upload(self, image: int, file: str, file_info: dict, fw_data, differ: list):
+        """Erases the differing sectors and uploads their part of fw_data onto them, then checks the image CRC."""
+        for sector, _, _ in differ:
+            erase = self.Blt_EraseSector(sector)
+            if "error" in erase:
+                return {"error": f"Sector {sector} erase failed: {erase['error']}"}
+        windows = [offset for _, sect_start, sect_len in differ
+                   for offset in range(sect_start, min(sect_start + sect_len, len(fw_data)), BLT_WINDOW_SIZE)]
+        frames, skipped = OM_sparse_frames(file_info, len(fw_data))
+        upload = OMFlashUploader(self).upload(fw_data, windows=windows, frames=frames)
+        if "error" in upload:
+            return upload
+        check_crc = self.Blt_CheckCRC(img=image, file_path=file)
+        if check_crc.get("Status") != "Ok":
+            return {"error": f"CRC check failed: {check_crc.get('error', check_crc.get('data'))}"}
+        upload["data"]["skipped_chunks"] = skipped
+        return {"status": "success", "mode": "diff", "sectors": [sector for sector, _, _ in differ],
+                "CRC_check": check_crc, "upload": upload["data"]}
+
+    def Blt_DumpFlash(self, start: int = 0, length: int = 0, out=None, path: str = None, dump: OMFlashDump = None,
+                      expected_crc: int = None, progress: bool = True):
+        """
+        Reads the flash range [start, start + length) of the CAN-wrapper image map into out, a memory-mapped file
+        at path or a new buffer, as pipelined batches of wrapped reads.
+        Pass the returned dump back (or the same path) to read only what is still missing after errors.
+
+        Returns:
+            dict: { "data": buffer (memoryview), "dump": OMFlashDump, "CRC": STM32 CRC of the range (when complete),
+                    "crc_match": vs expected_crc, "missing": [(address, length)], "KB_per_s", "error": if incomplete }
+        """
+        if dump is None:
+            dump = OMFlashDump(start, length, out=out, path=path)
+        todo = dump.missing_windows()
+        t_start = time.perf_counter()
+        read_bytes = 0
+        readback = OMFlashReadback(self).iter_windows(todo, dump.span, start_addr=dump.base, skip_errors=True)
+        try:
+            with tqdm(total=len(todo), desc="Flash dump", unit="win", disable=not progress) as pbar:
+                for count, (offset, data) in enumerate(readback, 1):
+                    if data is not None:
+                        dump.put(offset, data)
+                        read_bytes += len(data)
+                    if count % 256 == 0:
+                        dump.save_progress()
+                    pbar.update(1)
+        finally:
+            readback.close()
+            dump.save_progress()
+        duration = time.perf_counter() - t_start
+        ret = {"data": dump.buffer, "dump": dump, "missing": dump.missing_ranges(),
+               "KB_per_s": read_bytes / 1024 / duration if duration > 0 else 0.0}
+        if not dump.complete:
+            ret["error"] = f"{len(ret['missing'])} ranges not read, pass the dump back to resume"
+            logger.warning(f"Flash dump incomplete, missing: {ret['missing']}")
+            return ret
+        ret["CRC"] = dump.crc()
+        if expected_crc is not None:
+            ret["crc_match"] = ret["CRC"] == expected_crc
+        logger.info(f"Flash dump of {dump.length} bytes at 0x{dump.start:06X}: {ret['KB_per_s']:.2f} KB/s, CRC {ret['CRC']}")
+        return ret
+
+    def _ss_part_commands(self, parts):
+        """Reads of the (line, part) pairs of the grayscale image."""
+        return [self._build_command(ModbusRequestType.READ, OM_SS_ImgLinePartAddr(line=line, part=part), count=OM_SS_PX_PER_PT)
+                for line, part in parts]
+
+    def _hs_line_commands(self, lines=range(OM_HS_PHOTO_HGHT), cluster=False):
+        """Reads of the thermal image lines (float32 pixels, or the int8 cluster map)."""
+        if cluster:
+            return [self._build_command(ModbusRequestType.READ, OM_HS_ImgClustLineAddr(line), count=OM_HS_PHOTO_WDTH // 2) for line in lines]
+        return [self._build_command(ModbusRequestType.READ, OM_HS_ImgLineAddr(line), count=OM_HS_PHOTO_WDTH * 2) for line in lines]
+
+    def _hs_decode(self, responses: list, cluster=False, as_list=False):
+        """Full thermal image from the responses of _hs_line_commands()."""
+        regs_per_line = OM_HS_PHOTO_WDTH // 2 if cluster else OM_HS_PHOTO_WDTH * 2
+        raw, regs, result = OM_img_buffer(OM_HS_PHOTO_HGHT, OM_HS_PHOTO_WDTH, "i1" if cluster else "<f4")
+        t0 = time.perf_counter()
+        for line, resp in enumerate(responses):
+            if "error" in resp:
+                logger.error(f"Error reading thermal photo at line {line}: {resp['error']}")
+                return {"error": resp["error"]}
+            regs[line * regs_per_line:(line + 1) * regs_per_line] = resp["data"]
+        self._record_decode(OM_HS_DIRECT_ADDR, t0)
+        if as_list:
+            return {"data": result.astype(np.float32).tolist() if cluster else result.tolist(), "raw": raw}
+        return {"data": result, "raw": raw}
+
+    def _ss_store(self, frame: OMSSFrame, parts: list, responses: list, retries: OMSSRetries):
+        """
+        Puts one batch of line parts into frame, failed parts are counted in retries.
+        Returns:
+            tuple: (number of parts read, parts to read again)
+        """
+        t0 = time.perf_counter()
+        read = 0
+        retry = []
+        for (line, part), resp in zip(parts, responses):
+            if "error" in resp:
+                if retries.failed(line, part, resp["error"]):
+                    retry.append((line, part))
+                continue
+            frame.put(line, part, resp["data"])
+            read += 1
+        self._record_decode(OM_SS_DIRECT_ADDR, t0)
+        return read, retry
+
+    def _ss_result(self, frame: OMSSFrame, as_list: bool, last_error):
+        invalid_lines = frame.invalid_lines()
+        ret = {"data": frame.image.tolist() if as_list else frame.image, "raw": frame.raw, "frame": frame, "invalid_lines": invalid_lines}
+        if invalid_lines:
+            logger.error(f"Grayscale photo incomplete: {len(invalid_lines)} invalid lines")
+            ret["error"] = f"{len(invalid_lines)} lines incomplete, last error: {last_error}"
+        return ret
+
+    def Read_SS_Grayscale_Photo(self, as_list=False, frame: OMSSFrame = None, retry_budget=OM_SS_RETRY_BUDGET, part_retries=OM_SS_PART_RETRIES):
         """
         Reads the full 480x480x2 grayscale image from the device.
+        A failed line part is retried up to part_retries times, retry_budget caps the retries of the whole call.
+        Parts already marked done in frame are not read again (see Resume_SS_Grayscale_Photo).
         Returns:
-            dict: { "data": 2D list [480][480] of uint16, "raw": bytes, "error": ... }
+            dict: { "data": ndarray [480][480] of uint16 (2D list if as_list), "raw": bytearray, "frame": OMSSFrame,
+                    "invalid_lines": lines still incomplete, "error": set while any line is incomplete }
+            "data" is a view of "raw", no copy is made.
         """
-        logger.info("Starting grayscale photo readout...")
-        lines = OM_SS_PHOTO_HGHT
-        parts_per_line = OM_SS_LINE_PARTS
-        image = np.zeros((OM_SS_PHOTO_HGHT, OM_SS_PHOTO_WDTH), dtype=np.uint16)
-        raw_bytes = bytearray()
-        for line in tqdm(range(lines), desc="Grayscale photo", unit="line"):
-            line_bytes = bytearray()
-            for part in range(parts_per_line):
-                addr = OM_SS_ImgLinePartAddr(line=line, part=part)
-                command = self._build_command(ModbusRequestType.READ, addr, count=OM_SS_PX_PER_PT)
-                resp = self.send_modbus(command, timeout=2, silent=True)
-                if "error" in resp:
-                    logger.error(f"Error reading grayscale photo at line {line}, part {part}: {resp['error']}")
-                    return {"error": resp["error"]}
-                regs = resp["data"]
-                part_bytes_data = RegistersToPack(regs)
-                line_bytes.extend(part_bytes_data)
-            for px in range(480):
-                val = int.from_bytes(line_bytes[px*2:px*2+2], "little")
-                image[line, px] = val
-            raw_bytes.extend(line_bytes)
-        return {"data": image.tolist(), "raw": bytes(raw_bytes)}
+        frame = OMSSFrame() if frame is None else frame
+        todo = frame.missing_parts()
+        logger.info(f"Starting grayscale photo readout: {len(todo)} line parts to read...")
+        batch_len = OM_SS_BATCH_LINES * OM_SS_LINE_PARTS
+        retries = OMSSRetries(part_retries, retry_budget)
+        with tqdm(total=len(todo), desc="Grayscale photo", unit="part") as pbar:
+            while todo:
+                retry = []
+                for first in range(0, len(todo), batch_len):
+                    parts = todo[first:first + batch_len]
+                    responses = self.send_modbus_batch(self._ss_part_commands(parts), silent=True, stop_on_error=False)
+                    read, failed = self._ss_store(frame, parts, responses, retries)
+                    retry += failed
+                    pbar.update(read)
+                    if read == 0:
+                        # Nothing of the whole batch came back: the link or the device is down, keep the rest for a resume
+                        logger.error(f"Grayscale photo readout stalled at line {parts[0][0]}: {retries.last_error}")
+                        retry = []
+                        break
+                if retry:
+                    logger.warning(f"Retrying {len(retry)} grayscale line parts, retry budget left: {retries.budget}")
+                todo = retry
+        return self._ss_result(frame, as_list, retries.last_error)
+
+    def Resume_SS_Grayscale_Photo(self, frame: OMSSFrame, as_list=False, retry_budget=OM_SS_RETRY_BUDGET, part_retries=OM_SS_PART_RETRIES):
+        """
+        Reads only the line parts still missing in frame (from a previous Read_SS_Grayscale_Photo) into the same buffer.
+        """
+        return self.Read_SS_Grayscale_Photo(as_list=as_list, frame=frame, retry_budget=retry_budget, part_retries=part_retries)
 
-    def Read_SS_Grayscale_Lines(self, start_line: int, end_line: int):
+    def Read_SS_Grayscale_Lines(self, start_line: int, end_line: int, as_list=False):
         """
         Reads lines [start_line, end_line) (0-based, end exclusive) of the grayscale image.
         Returns:
-            dict: { "data": 2D list, "raw": bytes, "error": ... }
+            dict: { "data": ndarray of uint16 (2D list if as_list), "raw": bytearray, "error": ... }
         """
         logger.info(f"Starting grayscale lines readout: {start_line} to {end_line}...")
         if start_line < 0 or end_line > OM_SS_PHOTO_HGHT or start_line >= end_line:
             return {"error": "Invalid line range"}
         parts_per_line = OM_SS_LINE_PARTS
-        result = np.zeros((end_line - start_line, OM_SS_PHOTO_WDTH), dtype=np.uint16)
-        raw_bytes = bytearray()
-        for idx, line in tqdm(enumerate(range(start_line, end_line)), total=(end_line - start_line), desc="Grayscale lines", unit="line"):
-            line_bytes = bytearray()
-            for part in range(parts_per_line):
-                addr = OM_SS_ImgLinePartAddr(line=line, part=part)
-                command = self._build_command(ModbusRequestType.READ, addr, count=OM_SS_PX_PER_PT)
-                resp = self.send_modbus(command, timeout=2, silent=True)
-                if "error" in resp:
-                    logger.error(f"Error reading grayscale line {line}, part {part}: {resp['error']}")
-                    return {"error": resp["error"]}
-                regs = resp["data"]
-                part_bytes_data = RegistersToPack(regs)
-                line_bytes.extend(part_bytes_data)
-            for px in range(480):
-                val = int.from_bytes(line_bytes[px*2:px*2+2], "little")
-                result[idx, px] = val
-            raw_bytes.extend(line_bytes)
+        raw, regs, result = OM_img_buffer(end_line - start_line, OM_SS_PHOTO_WDTH, "<u2")
+        with tqdm(total=(end_line - start_line), desc="Grayscale lines", unit="line") as pbar:
+            for first_line in range(start_line, end_line, OM_SS_BATCH_LINES):
+                batch_lines = range(first_line, min(first_line + OM_SS_BATCH_LINES, end_line))
+                commands = self._ss_part_commands((line, part) for line in batch_lines for part in range(parts_per_line))
+                responses = self.send_modbus_batch(commands, silent=True)
+                for idx, resp in enumerate(responses):
+                    if "error" in resp:
+                        line, part = first_line + idx // parts_per_line, idx % parts_per_line
+                        logger.error(f"Error reading grayscale line {line}, part {part}: {resp['error']}")
+                        return {"error": resp["error"]}
+                t0 = time.perf_counter()
+                pos = (first_line - start_line) * OM_SS_PHOTO_WDTH
+                for resp in responses:
+                    regs[pos:pos + OM_SS_PX_PER_PT] = resp["data"]
+                    pos += OM_SS_PX_PER_PT
+                self._record_decode(OM_SS_DIRECT_ADDR, t0)
+                pbar.update(len(batch_lines))
         logger.info("Grayscale lines readout complete.")
-        return {"data": result.tolist(), "raw": bytes(raw_bytes)}
+        return {"data": result.tolist() if as_list else result, "raw": raw}
 
-    def Read_Thermal_Photo(self):
+    def Read_SS_ROI(self, x0: int, y0: int, x1: int, y1: int, center_on_sun=False):
+        """
+        Reads the rectangle [x0, x1) x [y0, y1) of the grayscale image: only the line parts covering it are transferred.
+        With center_on_sun the rectangle keeps its size but is moved onto the last X_pt/Y_pt of Data_GetSS (clipped to the frame).
+        Returns:
+            dict: { "data": ndarray [y1-y0][x1-x0] of uint16, "raw": bytearray of the covering parts,
+                    "x0", "y0", "x1", "y1": the rectangle actually read, "error": ... }
+        """
+        width, height = x1 - x0, y1 - y0
+        if width <= 0 or height <= 0 or width > OM_SS_PHOTO_WDTH or height > OM_SS_PHOTO_HGHT:
+            return {"error": "Invalid ROI"}
+        if center_on_sun:
+            ss = self.Data_GetSS()
+            if "error" in ss:
+                return {"error": ss["error"]}
+            x0 = int(round(ss["data"]["X_pt"] - width / 2))
+            y0 = int(round(ss["data"]["Y_pt"] - height / 2))
+            x0 = min(max(x0, 0), OM_SS_PHOTO_WDTH - width)
+            y0 = min(max(y0, 0), OM_SS_PHOTO_HGHT - height)
+            x1, y1 = x0 + width, y0 + height
+        if x0 < 0 or y0 < 0 or x1 > OM_SS_PHOTO_WDTH or y1 > OM_SS_PHOTO_HGHT:
+            return {"error": "Invalid ROI"}
+
+        first_part, last_part = x0 // OM_SS_PX_PER_PT, (x1 - 1) // OM_SS_PX_PER_PT
+        parts = range(first_part, last_part + 1)
+        raw, regs, image = OM_img_buffer(height, len(parts) * OM_SS_PX_PER_PT, "<u2")
+        logger.info(f"Starting grayscale ROI readout: x {x0}..{x1}, y {y0}..{y1}, {height * len(parts)} line parts")
+        for first_line in range(y0, y1, OM_SS_BATCH_LINES):
+            batch_lines = range(first_line, min(first_line + OM_SS_BATCH_LINES, y1))
+            commands = self._ss_part_commands((line, part) for line in batch_lines for part in parts)
+            responses = self.send_modbus_batch(commands, silent=True)
+            for idx, resp in enumerate(responses):
+                if "error" in resp:
+                    line, part = first_line + idx // len(parts), parts[idx % len(parts)]
+                    logger.error(f"Error reading grayscale ROI at line {line}, part {part}: {resp['error']}")
+                    return {"error": resp["error"]}
+            t0 = time.perf_counter()
+            pos = (first_line - y0) * len(parts) * OM_SS_PX_PER_PT
+            for resp in responses:
+                regs[pos:pos + OM_SS_PX_PER_PT] = resp["data"]
+                pos += OM_SS_PX_PER_PT
+            self._record_decode(OM_SS_DIRECT_ADDR, t0)
+        offset = first_part * OM_SS_PX_PER_PT
+        return {"data": image[:, x0 - offset:x1 - offset], "raw": raw, "x0": x0, "y0": y0, "x1": x1, "y1": y1}
+
+    def Iter_SS_Grayscale_Progressive(self, step: int = OM_SS_PREVIEW_STEP, frame: OMSSFrame = None, prefetch: int = OM_STREAM_PREFETCH,
+                                      retry_budget=OM_SS_RETRY_BUDGET, part_retries=OM_SS_PART_RETRIES):
+        """
+        Interlaced readout: the first pass reads every step-th line, the following passes fill the lines in between
+        (see OM_interlace_order) into the same frame. Yields a progress dict after each pass:
+            { "pass", "passes", "lines_done", "progress" (0..1), "elapsed_s", "frame": OMSSFrame }
+        frame.preview() gives the image with unread lines filled from the nearest line above.
+        Failed parts are retried within their pass as in Read_SS_Grayscale_Photo. A batch with no part read stops
+        the readout: the last progress dict then carries "error" and Resume_SS_Grayscale_Photo(frame) fetches the rest.
+        """
+        frame = OMSSFrame() if frame is None else frame
+        order = OM_interlace_order(step)
+        batch_len = OM_SS_BATCH_LINES * OM_SS_LINE_PARTS
+        retries = OMSSRetries(part_retries, retry_budget)
+        t_start = time.perf_counter()
+        for pass_idx, offset in enumerate(order):
+            todo = [(line, part) for line in range(offset, OM_SS_PHOTO_HGHT, step)
+                    for part in range(OM_SS_LINE_PARTS) if not frame.done[line, part]]
+            stalled = False
+            while todo and not stalled:
+                chunks = [todo[i:i + batch_len] for i in range(0, len(todo), batch_len)]
+                batches = self._iter_batches([self._ss_part_commands(chunk) for chunk in chunks], prefetch, stop_on_error=False)
+                retry = []
+                for chunk, responses in zip(chunks, batches):
+                    read, failed = self._ss_store(frame, chunk, responses, retries)
+                    retry += failed
+                    if read == 0:
+                        logger.error(f"Grayscale photo readout stalled at line {chunk[0][0]}: {retries.last_error}")
+                        stalled = True
+                        break
+                batches.close()
+                if retry and not stalled:
+                    logger.warning(f"Retrying {len(retry)} grayscale line parts, retry budget left: {retries.budget}")
+                todo = retry
+            lines_done = int(frame.done.all(axis=1).sum())
+            progress = {"pass": pass_idx + 1, "passes": len(order), "lines_done": lines_done,
+                        "progress": lines_done / OM_SS_PHOTO_HGHT, "elapsed_s": time.perf_counter() - t_start, "frame": frame}
+            if stalled:
+                progress["error"] = f"Readout stalled: {retries.last_error}"
+                yield progress
+                return
+            yield progress
+
+    def Read_SS_Grayscale_Progressive(self, step: int = OM_SS_PREVIEW_STEP, callback=None, as_list=False):
+        """
+        Runs Iter_SS_Grayscale_Progressive to the end, calling callback(progress dict) after each pass,
+        then retries whatever is still missing unless the readout stalled.
+        Returns:
+            dict: same as Read_SS_Grayscale_Photo.
+        """
+        frame = OMSSFrame()
+        for progress in self.Iter_SS_Grayscale_Progressive(step=step, frame=frame):
+            logger.info(f"Grayscale pass {progress['pass']}/{progress['passes']}: {progress['lines_done']} lines, {progress['elapsed_s']:.2f} s")
+            if callback is not None:
+                callback(progress)
+            if "error" in progress:
+                return self._ss_result(frame, as_list, progress["error"])
+        return self.Resume_SS_Grayscale_Photo(frame, as_list=as_list)
+
+    def Read_Thermal_Photo(self, as_list=False):
         """
         Reads the full 32x24 float thermal image from the device.
         Returns:
-            dict: { "data": 2D list [24][32] of float, "raw": bytes, "error": ... }
+            dict: { "data": ndarray [24][32] of float32 (2D list if as_list), "raw": bytearray, "error": ... }
         """
         logger.info("Starting thermal photo readout...")
-        lines = OM_HS_PHOTO_HGHT
-        pixels_per_line = OM_HS_PHOTO_WDTH
-        result = np.zeros((OM_HS_PHOTO_HGHT, OM_HS_PHOTO_WDTH), dtype=np.float32)
-        raw_bytes = bytearray()
-        for line in tqdm(range(lines), desc="Thermal photo", unit="line"):
-            addr = OM_HS_ImgLineAddr(line)
-            command = self._build_command(ModbusRequestType.READ, addr, count=OM_HS_PHOTO_WDTH*2)
-            resp = self.send_modbus(command, timeout=2, silent=True)
-            if "error" in resp:
-                logger.error(f"Error reading thermal photo at line {line}: {resp['error']}")
-                return {"error": resp["error"]}
-            regs = resp["data"]
-            line_bytes = bytearray(RegistersToPack(regs))
-            floats = [struct.unpack("<f", line_bytes[i*4:i*4+4])[0] for i in range(pixels_per_line)]
-            result[line, :] = floats
-            raw_bytes.extend(line_bytes)
-        logger.info("Thermal photo readout complete.")
-        return {"data": result.tolist(), "raw": bytes(raw_bytes)}
+        ret = self._hs_decode(self.send_modbus_batch(self._hs_line_commands(), silent=True), as_list=as_list)
+        if "error" not in ret:
+            logger.info("Thermal photo readout complete.")
+        return ret
 
-    def Read_Thermal_Cluster_Photo(self):
+    def Read_Thermal_Cluster_Photo(self, as_list=False):
         """
-        Reads the full 32x24 float thermal image from the device.
+        Reads the full 32x24 cluster map (int8 per pixel) from the device.
         Returns:
-            dict: { "data": 2D list [24][32] of float, "raw": bytes, "error": ... }
+            dict: { "data": ndarray [24][32] of int8 (2D list of float if as_list), "raw": bytearray, "error": ... }
         """
         logger.info("Starting clustered readout...")
-        lines = OM_HS_PHOTO_HGHT
-        pixels_per_line = OM_HS_PHOTO_WDTH
-        result = np.zeros((OM_HS_PHOTO_HGHT, OM_HS_PHOTO_WDTH), dtype=np.float32)
-        raw_bytes = bytearray()
-        for line in tqdm(range(lines), desc="Thermal photo", unit="line"):
-            addr = OM_HS_ImgClustLineAddr(line)
-            command = self._build_command(ModbusRequestType.READ, addr, count=int(OM_HS_PHOTO_WDTH/2))
-            resp = self.send_modbus(command, timeout=2, silent=True)
-            if "error" in resp:
-                logger.error(f"Error reading thermal photo at line {line}: {resp['error']}")
-                return {"error": resp["error"]}
-            regs = resp["data"]
-            line_bytes = bytearray(RegistersToPack(regs))
-            pixels = [struct.unpack("<b", line_bytes[i:i+1])[0] for i in range(pixels_per_line)]
-            result[line, :] = pixels
-            raw_bytes.extend(line_bytes)
-        logger.info("Thermal photo readout complete.")
-        return {"data": result.tolist(), "raw": bytes(raw_bytes)}
\ No newline at end of file
+        ret = self._hs_decode(self.send_modbus_batch(self._hs_line_commands(cluster=True), silent=True), cluster=True, as_list=as_list)
+        if "error" not in ret:
+            logger.info("Thermal photo readout complete.")
+        return ret
+
+    def _iter_batches(self, batches: list, prefetch: int, stop_on_error=True):
+        """
+        Sends the batches (lists of commands) keeping up to prefetch+1 of them queued at the worker,
+        yields the responses of each batch in order. Unconsumed batches are cancelled when the generator is closed.
+        """
+        inflight = deque()
+        next_batch = 0
+        try:
+            while next_batch < len(batches) or inflight:
+                while next_batch < len(batches) and len(inflight) <= prefetch:
+                    inflight.append(self.send_modbus_batch(batches[next_batch], silent=True, blocking=False, stop_on_error=stop_on_error))
+                    next_batch += 1
+                yield self.wait_modbus_batch(inflight.popleft())
+        finally:
+            for pending in inflight:
+                self.modbus_worker.cancel(pending)
+
+    def Iter_SS_Grayscale_Lines(self, start_line: int = 0, end_line: int = OM_SS_PHOTO_HGHT, prefetch: int = OM_STREAM_PREFETCH):
+        """
+        Generator over lines [start_line, end_line) of the grayscale image: yields (line, ndarray [480] of uint16, raw bytearray)
+        as soon as the line's batch arrives, while the following batches are already being read.
+        Raises:
+            ValueError: invalid line range.
+            IOError: a line part could not be read.
+        """
+        if start_line < 0 or end_line > OM_SS_PHOTO_HGHT or start_line >= end_line:
+            raise ValueError("Invalid line range")
+        parts_per_line = OM_SS_LINE_PARTS
+        first_lines = range(start_line, end_line, OM_SS_BATCH_LINES)
+        batches = [self._ss_part_commands((line, part) for line in range(first_line, min(first_line + OM_SS_BATCH_LINES, end_line))
+                                          for part in range(parts_per_line))
+                   for first_line in first_lines]
+        for first_line, responses in zip(first_lines, self._iter_batches(batches, prefetch)):
+            for idx, resp in enumerate(responses):
+                if "error" in resp:
+                    line, part = first_line + idx // parts_per_line, idx % parts_per_line
+                    logger.error(f"Error reading grayscale line {line}, part {part}: {resp['error']}")
+                    raise IOError(f"Grayscale line {line}, part {part}: {resp['error']}")
+            for idx in range(len(responses) // parts_per_line):
+                t0 = time.perf_counter()
+                raw, regs, image = OM_img_buffer(1, OM_SS_PHOTO_WDTH, "<u2")
+                for part, resp in enumerate(responses[idx*parts_per_line:(idx+1)*parts_per_line]):
+                    regs[part * OM_SS_PX_PER_PT:(part + 1) * OM_SS_PX_PER_PT] = resp["data"]
+                self._record_decode(OM_SS_DIRECT_ADDR, t0)
+                yield first_line + idx, image[0], raw
+
+    def Iter_Thermal_Photo(self, prefetch: int = OM_STREAM_PREFETCH):
+        """
+        Generator over the thermal image lines: yields (line, ndarray [32] of float32, raw bytearray) per line.
+        Raises:
+            IOError: a line could not be read.
+        """
+        first_lines = range(0, OM_HS_PHOTO_HGHT, OM_HS_BATCH_LINES)
+        batches = [self._hs_line_commands(range(first_line, min(first_line + OM_HS_BATCH_LINES, OM_HS_PHOTO_HGHT)))
+                   for first_line in first_lines]
+        for first_line, responses in zip(first_lines, self._iter_batches(batches, prefetch)):
+            for idx, resp in enumerate(responses):
+                if "error" in resp:
+                    logger.error(f"Error reading thermal photo at line {first_line + idx}: {resp['error']}")
+                    raise IOError(f"Thermal line {first_line + idx}: {resp['error']}")
+                t0 = time.perf_counter()
+                raw, regs, image = OM_img_buffer(1, OM_HS_PHOTO_WDTH, "<f4")
+                regs[:] = resp["data"]
+                self._record_decode(OM_HS_DIRECT_ADDR, t0)
+                yield first_line + idx, image[0], raw
+
+    def Burst_Capture(self, kind: str = "SS", count: int = 10, process=None, save_dir: str = None, workers: int = 1, settle: float = None):
+        """
+        Captures count frames: take -> completion -> readout on the bus, while process(kind, index, result) of the previous
+        frames runs on a background pool (default OM_burst_process_frame, which also saves PNGs into save_dir).
+        Args:
+            kind (str): "SS" (480x480 grayscale) or "HS" (32x24 thermal).
+            settle (float): Fixed wait instead of wait_for_completion, for firmware that does not report command state.
+        Returns:
+            dict: { "data": list of process() results in frame order (None for failed frames),
+                    "errors": {index: error}, "capture_s": bus time, "total_s": incl. processing }
+        """
+        if kind == "SS":
+            take, cmd, read = self.Cmd_SSTake, OM_CMD_TAKE_SS, self.Read_SS_Grayscale_Photo
+        elif kind == "HS":
+            take, cmd, read = self.Cmd_HSTake, OM_CMD_TAKE_HS, self.Read_Thermal_Photo
+        else:
+            return {"error": f"Unknown burst kind: {kind}"}
+        if process is None:
+            process = lambda kind, index, result: OM_burst_process_frame(kind, index, result, save_dir=save_dir)
+
+        futures = {}
+        errors = {}
+        t_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for index in range(count):
+                if settle is None:
+                    response = self.Exec_And_Wait(take, cmd)
+                else:
+                    response = take()
+                    time.sleep(settle)
+                if "error" in response:
+                    errors[index] = response["error"]
+                    continue
+                result = read()
+                if "error" in result:
+                    errors[index] = result["error"]
+                    continue
+                futures[index] = pool.submit(process, kind, index, result)
+            capture_s = time.perf_counter() - t_start
+            data = []
+            for index in range(count):
+                if index not in futures:
+                    data.append(None)
+                    continue
+                try:
+                    data.append(futures[index].result())
+                except Exception as e:
+                    errors[index] = f"Processing failed: {e}"
+                    data.append(None)
+        total_s = time.perf_counter() - t_start
+        if errors:
+            logger.warning(f"Burst {kind}: {len(errors)} of {count} frames failed: {errors}")
+        logger.info(f"Burst {kind}: {count} frames, capture {capture_s:.2f} s, total {total_s:.2f} s")
+        return {"data": data, "errors": errors, "capture_s": capture_s, "total_s": total_s}
+
+    # asyncio API. These require an AsyncOMCommInterface worker (AsyncModbusWorker / AsyncMBOverCANWorker)
+    # and mirror the blocking methods above: same request builders and parsers, only the I/O is awaited.
+
+    async def send_modbus_async(self, command, timeout=5, silent=False):
+        return await self.modbus_worker.send_request(command, timeout=timeout, silent=silent)
+
+    async def send_modbus_batch_async(self, commands: list, timeout=None, silent=False, stop_on_error=True):
+        """Runs the commands back-to-back, holding the link for the whole batch."""
+        if timeout is None:
+            timeout = 1 + OM_BATCH_TXN_TIMEOUT * len(commands)
+        return await self.modbus_worker.send_batch(commands, timeout=timeout, silent=silent, stop_on_error=stop_on_error)
+
+    async def _cmd_write_async(self, pack: list, name: str):
+        command = self._cmd_command(pack)
+        logger.debug(f"Sending {name} command: {command.__dict__}")
+        return await self.modbus_worker.send_request(command)
+
+    async def _read_async(self, field: str, parser=None, timeout=1):
+        command = self._field_command(field)
+        response = await self.modbus_worker.send_request(command, timeout=timeout)
+        logger.debug(f"Reading {field}: {command.__dict__}")
+        if parser is not None and "data" in response:
+            response["data"] = parser(response["data"])
+        return response
+
+    async def Cmd_ForceReboot_async(self):
+        self.Cache_Invalidate()
+        return await self._cmd_write_async(OM_BuildCmd_Reboot(), "reboot")
+
+    async def Cmd_SetDevID_async(self, ID : int):
+        response = await self._cmd_write_async(OM_build_set_DevID(ID), "SetDevID")
+        self._cache_drop_ids(ID)
+        return response
+
+    async def Cmd_SSTake_async(self):
+        return await self._cmd_write_async(OM_build_cmd_SS_take(), "SSTake")
+
+    async def Cmd_HSTake_async(self):
+        return await self._cmd_write_async(OM_build_cmd_HS_take(), "HSTake")
+
+    async def Cmd_GAMTake_async(self):
+        return await self._cmd_write_async(OM_build_cmd_GAM_take(), "GAMTake")
+
+    async def Data_GetFWVer_async(self):
+        return await self._read_async("FWVer", OM_resp_FWVer)
+
+    async def Data_GetMnfID_async(self):
+        return await self._read_async("MnfID", OM_resp_MnfID)
+
+    async def Data_GetNonCanCurrBlock_async(self):
+        return await self._read_async("CurRegion", OM_resp_CurSector)
+
+    async def Data_GetSS_async(self, timeout=1):
+        return await self._read_async("SS", OM_SS_parse, timeout=timeout)
+
+    async def Data_GetDevID_async(self, timeout=1):
+        return await self._read_async("DevID", OM_parse_DevID, timeout=timeout)
+
+    async def Data_GetFW_ID_async(self):
+        return await self._read_async("FWVer", OM_parse_FWVer)
+
+    async def Data_GetGAM_async(self):
+        return await self._read_async("GAM", OM_GAM_parse)
+
+    async def Data_GetSSMtxSet_async(self):
+        return await self._read_async("SSMtxSet", OM_SS_parse_MtxSet)
+
+    async def Data_GetCmdStatus_async(self):
+        return await self._read_async("Status")
+
+    async def Data_GetSSAlgoSet_async(self):
+        return await self._read_async("SSAlgoSet", OM_SS_parse_AlgoSet)
+
+    async def Data_ReadTemperature_async(self):
+        return await self._read_async("Temperature", OM_SS_parse_Temperature)
+
+    async def _CANWrp_ExecCmd_async(self, VarID: int = 14, Offset : int = 0, RTR: int = 1, data: list = [], DLen: int = 0, silent=False):
+        commands = self._CANWrp_commands(VarID=VarID, Offset=Offset, RTR=RTR, data=data, DLen=DLen)
+        return self._CANWrp_parse(await self.send_modbus_batch_async(commands, silent=silent))
+
+    async def CANWrp_ReadFlashFrag_async(self, offset=0):
+        response = await self._CANWrp_ExecCmd_async(Offset=offset, RTR = 1)
+        if "data" in response:
+            response["data"] = response["data"]["data"]
+        return response
+
+    async def CANWrp_ReadCB_async(self, silent=False):
+        t_start = time.perf_counter()
+        responses = await self.send_modbus_batch_async(self._Blt_commands(None), silent=True)
+        return self._Blt_result(None, responses, time.perf_counter() - t_start, silent=silent).to_response()
+
+    async def Read_SS_Grayscale_Photo_async(self, as_list=False):
+        """
+        Reads the full 480x480x2 grayscale image from the device, OM_SS_BATCH_LINES lines per batch.
+        Returns:
+            dict: { "data": ndarray [480][480] of uint16 (2D list if as_list), "raw": bytearray, "error": ... }
+        """
+        frame = OMSSFrame()
+        todo = frame.missing_parts()
+        batch_len = OM_SS_BATCH_LINES * OM_SS_LINE_PARTS
+        for first in range(0, len(todo), batch_len):
+            parts = todo[first:first + batch_len]
+            responses = await self.send_modbus_batch_async(self._ss_part_commands(parts), silent=True)
+            for (line, part), resp in zip(parts, responses):
+                if "error" in resp:
+                    logger.error(f"Error reading grayscale photo at line {line}, part {part}: {resp['error']}")
+                    return {"error": resp["error"]}
+                frame.put(line, part, resp["data"])
+        return {"data": frame.image.tolist() if as_list else frame.image, "raw": frame.raw}
+
+    async def Read_Thermal_Photo_async(self, as_list=False):
+        """
+        Reads the full 32x24 float thermal image from the device.
+        Returns:
+            dict: { "data": ndarray [24][32] of float32 (2D list if as_list), "raw": bytearray, "error": ... }
+        """
+        responses = await self.send_modbus_batch_async(self._hs_line_commands(), silent=True)
+        return self._hs_decode(responses, as_list=as_list)
+
+    async def Read_Thermal_Cluster_Photo_async(self, as_list=False):
+        """
+        Reads the full 32x24 cluster map (int8 per pixel) from the device.
+        Returns:
+            dict: { "data": ndarray [24][32] of int8 (2D list of float if as_list), "raw": bytearray, "error": ... }
+        """
+        responses = await self.send_modbus_batch_async(self._hs_line_commands(cluster=True), silent=True)
+        return self._hs_decode(responses, cluster=True, as_list=as_list)
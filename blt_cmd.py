@@ -0,0 +1,93 @@
+"""
+Bootloader command engine over the CAN wrapper.
+
+A control block command is a wrapped CAN frame written to the CAN string registers; its result is read back with an
+RTR frame followed by a read of the same registers. OM_Interface.Blt_Exec sends the three as one worker batch, so a
+command and its status cost a single queue round trip instead of three separate requests, and the register frames
+of the fixed commands (SetPref, CheckValid, FixValid, erase, restart) and of the status RTR are built once at import.
+
+    status = om.Blt_Exec(OM_build_BltCheckImgValid(0))
+    if status.error is None and not status.status & FLASH_STAT_MASK_ERR: ...
+"""
+from blt_logic import *
+from modbus_worker import PackToRegisters, RegistersToPack
+
+
+BLT_CMD_ADDR        = OM_BOOT_REG_ADDR + OM_CAN_STR_OFF
+
+
+def OM_blt_build_frame(int_pack: list = None):
+    """
+    Registers of the wrapped control block frame, byte-swapped for _build_command(reversed_registers=False).
+    No int_pack: the RTR frame requesting the control block status.
+    """
+    if int_pack is None:
+        pack = OM_build_CANWrp_WriteWrappedCmd(VarID=14, Offset=FLASH_CB_OFFSET, RTR=1)
+    else:
+        pack = OM_build_CANWrp_WriteWrappedCmd(VarID=14, Offset=FLASH_CB_OFFSET, RTR=0, data=int_pack, DLen=len(int_pack))
+    return tuple(((reg & 0x00FF) << 8) | ((reg >> 8) & 0x00FF) for reg in PackToRegisters(pack=pack))
+
+
+BLT_FRAME_STATUS    = OM_blt_build_frame()
+BLT_FIXED_FRAMES    = {tuple(int_pack): OM_blt_build_frame(int_pack) for int_pack in
+                       [OM_build_BltSetPref(n) for n in range(2)] +
+                       [OM_build_BltCheckImgValid(n) for n in range(2)] +
+                       [OM_build_BltFixValidImg(n) for n in range(2)] +
+                       [OM_build_BltEraseSector(n) for n in range(8)] +
+                       [OM_build_BltEraseSecondPart(), OM_build_BltRestart()]}
+
+
+def OM_blt_frame(int_pack: list = None):
+    """Precompiled frame of a fixed command, built on the fly for the ones carrying size/CRC."""
+    if int_pack is None:
+        return BLT_FRAME_STATUS
+    frame = BLT_FIXED_FRAMES.get(tuple(int_pack))
+    return frame if frame is not None else OM_blt_build_frame(int_pack)
+
+
+class BltStatus:
+    """
+    Result of one bootloader command: the control block INFO fields as ints, the command byte and timing.
+    error is set when the transport failed; the fields are None then and for commands sent without readback.
+    """
+    def __init__(self, cmd: int = None, status: int = None, current_block: int = None, pref_block: int = None,
+                 reset_src: int = None, elapsed_s: float = 0.0, error=None):
+        self.cmd = cmd
+        self.status = status
+        self.current_block = current_block
+        self.pref_block = pref_block
+        self.reset_src = reset_src
+        self.elapsed_s = elapsed_s
+        self.error = error
+
+    @classmethod
+    def from_registers(cls, registers: list, cmd: int = None, elapsed_s: float = 0.0):
+        """Parses the CAN string registers read after the status RTR."""
+        parsed = OM_Parse_CANEmWrap(RegistersToPack(registers))
+        if not parsed:
+            return cls(cmd=cmd, elapsed_s=elapsed_s, error="CAN wrapper frame length")
+        info = OM_ParseFlashStruct_Info([byte[0] for byte in parsed[3]])
+        return cls(cmd, *info, elapsed_s=elapsed_s)
+
+    def cb_dict(self):
+        """Control block in the OM_ParseFlashStruct(INFO) form: one-byte bytes values."""
+        return {"Status": bytes([self.status]), "CurrentBlock": bytes([self.current_block]),
+                "PrefBlock": bytes([self.pref_block]), "ResetSrc": bytes([self.reset_src])}
+
+    def to_response(self):
+        """The dict the Blt_* methods return: { "data": CB, "Status": "Ok"/"Error", "elapsed_s" } or { "error" }."""
+        if self.error is not None:
+            return {"error": self.error, "elapsed_s": self.elapsed_s}
+        if self.status is None:
+            return {"data": "Cmd writen", "elapsed_s": self.elapsed_s}
+        return {"data": self.cb_dict(), "Status": "Error" if self.status & FLASH_STAT_MASK_ERR else "Ok",
+                "elapsed_s": self.elapsed_s}
+
+    def __repr__(self):
+        if self.error is not None:
+            return f"BltStatus(cmd={self.cmd}, error={self.error!r}, {self.elapsed_s * 1e3:.1f} ms)"
+        cmd = "status" if self.cmd is None else f"0x{self.cmd:02X}"
+        if self.status is None:
+            return f"BltStatus(cmd={cmd}, written, {self.elapsed_s * 1e3:.1f} ms)"
+        return (f"BltStatus(cmd={cmd}, status=0x{self.status:02X}, current={self.current_block}, "
+                f"pref={self.pref_block}, reset_src={self.reset_src}, {self.elapsed_s * 1e3:.1f} ms)")
@@ -0,0 +1,435 @@
+"""
+Pipelined firmware upload over the CAN-wrapped bootloader.
+
+The image is written in windows of 16 CAN frames (128 bytes), each window is one non-blocking worker batch and
+up to `depth` windows are queued at a time, so the bus never idles between windows. The control block status read
+(RTR frame + read) ends only every `interval` windows: the bootloader keeps the first failed write in the status
+until the next command, so one read covers every window since the previous one. The interval doubles after every
+clean check (up to check_max), halves on every window with failed writes and falls back to check_min on an error status.
+Frames whose write failed on the bus are resent on their own. An error status is repaired in place: the windows
+since the last good check are read back, the status is cleared with a harmless command and only the frames that
+differ are written again. The image CRC check (OM_Interface.Blt_UploadFW) still verifies the result.
+
+OMFlashReadback reads the target image back the same way (RTR frame + read per 8 bytes, one batch per window)
+for the repair above, the differential update and OMFlashDump.
+"""
+import os
+import json
+import mmap
+import time
+import numpy as np
+from collections import deque
+from loguru import logger
+from tqdm import tqdm
+from OM_registers import *
+from blt_logic import *
+from OM_comm_interface import ModbusRequestType
+from modbus_worker import PackToRegisters, RegistersToPack
+from CRC_lib import crc32_stm_fast
+
+
+BLT_CHUNK_SIZE      = 8
+BLT_WINDOW_SIZE     = 128
+BLT_PIPE_DEPTH      = 2
+BLT_CHECK_MIN       = 1
+BLT_CHECK_MAX       = 32
+BLT_WINDOW_RETRIES  = 3
+BLT_UPLOAD_RETRIES  = 1
+
+BLT_ERASED_VALUE    = 0xFF
+BLT_PAD_VALUE       = 0xFE
+
+
+def OM_image_sectors(image: int, length: int):
+    """
+    Flash sectors holding the first length bytes of image, as mapped for the CAN-wrapped writes (image start at 0x00).
+    Returns:
+        list: (sector number, offset in the image, length in the image) per sector
+    """
+    base = image * FLASH_IMG_SIZE
+    sectors = []
+    for sector, (sect_off, sect_len) in enumerate(FLASH_SECTORS):
+        start, end = max(sect_off, base), min(sect_off + sect_len, base + length)
+        if start < end:
+            sectors.append((sector, start - base, end - start))
+    return sectors
+
+
+def OM_sparse_frames(file_info: dict, length: int, window_size: int = BLT_WINDOW_SIZE, skip_padding: bool = True):
+    """
+    Frames to write per window when the target is erased, from the fill_runs map of analyze_bin_file:
+    0xFF chunks already hold the erased value; 0xFE padding is skipped only past the CRC and size words
+    (FW_size + 4), where neither the CRC check nor the bootloader reads it.
+
+    Returns:
+        tuple: (frames dict for OMFlashUploader.upload, number of skipped frames)
+    """
+    skip = set()
+    for start, run_len, value in file_info.get("fill_runs", []):
+        if value == BLT_PAD_VALUE:
+            if not skip_padding:
+                continue
+            pad_from = file_info["FW_size"] + 4
+            run_len -= max(0, pad_from - start)
+            start = max(start, pad_from)
+        elif value != BLT_ERASED_VALUE:
+            continue
+        skip.update(range(start // BLT_CHUNK_SIZE, (start + max(run_len, 0)) // BLT_CHUNK_SIZE))
+    frames = {}
+    for offset in range(0, length, window_size):
+        first = offset // BLT_CHUNK_SIZE
+        count = (min(window_size, length - offset) + BLT_CHUNK_SIZE - 1) // BLT_CHUNK_SIZE
+        window_frames = [frame for frame in range(count) if first + frame not in skip]
+        if len(window_frames) < count:
+            frames[offset] = window_frames
+    return frames, len(skip)
+
+
+class OMFlashUploader:
+    """Upload engine bound to one OM_Interface (its worker and slave ID)."""
+    def __init__(self, om, window_size: int = BLT_WINDOW_SIZE, depth: int = BLT_PIPE_DEPTH,
+                 check_min: int = BLT_CHECK_MIN, check_max: int = BLT_CHECK_MAX, retries: int = BLT_WINDOW_RETRIES):
+        self.om = om
+        self.window_size = window_size
+        self.depth = max(1, depth)
+        self.check_min = max(1, check_min)
+        self.check_max = max(self.check_min, check_max)
+        self.retries = retries
+
+    def _chunk(self, data, offset: int, frame: int):
+        chunk = bytes(data[offset + frame * BLT_CHUNK_SIZE:min(offset + self.window_size, offset + (frame + 1) * BLT_CHUNK_SIZE)])
+        return chunk + b'\xFE' * (BLT_CHUNK_SIZE - len(chunk))
+
+    def _window_commands(self, data, start_addr: int, offset: int, frames: list, check: bool):
+        commands = []
+        for frame in frames:
+            pack = OM_build_CANWrp_WriteWrappedCmd(VarID=14, Offset=start_addr + offset + frame * BLT_CHUNK_SIZE, RTR=0,
+                                                   data=list(self._chunk(data, offset, frame)), DLen=BLT_CHUNK_SIZE)
+            commands.append(self.om._build_command(ModbusRequestType.WRITE_MULTY, OM_BOOT_REG_ADDR + OM_CAN_STR_OFF,
+                                                   registers=PackToRegisters(pack=pack)))
+        return commands + (self.om._Blt_commands() if check else [])
+
+    def _frame_count(self, data, offset: int):
+        return (min(self.window_size, len(data) - offset) + BLT_CHUNK_SIZE - 1) // BLT_CHUNK_SIZE
+
+    def _send(self, offsets: deque, in_flight: deque, data, start_addr: int, state: dict):
+        while offsets and len(in_flight) < self.depth:
+            offset, frames = offsets.popleft()
+            if frames is None:
+                frames = list(range(self._frame_count(data, offset)))
+            state["unchecked"] += 1
+            check = state["unchecked"] >= state["interval"] or not offsets
+            if check:
+                state["unchecked"] = 0
+            commands = self._window_commands(data, start_addr, offset, frames, check)
+            in_flight.append((offset, frames, check, self.om.send_modbus_batch(commands, silent=True, stop_on_error=False, blocking=False)))
+
+    def _check_cb(self):
+        """
+        Control block status read on its own, when the read at the end of a window failed.
+        Returns:
+            BltStatus: error set if the control block could not be read
+        """
+        for _ in range(self.retries + 1):
+            status = self.om.Blt_Exec(silent=True)
+            if status.error is None:
+                return status
+        return status
+
+    def _cancel(self, in_flight: deque):
+        for _, _, _, pending in in_flight:
+            self.om.modbus_worker.cancel(pending)
+
+    def _repair(self, data, start_addr: int, unverified: list, status):
+        """
+        After an error status: reads back the unverified windows and clears the status (the preferred block set
+        again to its current value).
+        Returns:
+            tuple: ({offset: frames that differ}, error)
+        """
+        bad = {}
+        try:
+            for offset, block in OMFlashReadback(self.om, self.window_size, self.depth, self.retries).iter_windows(
+                    sorted(unverified), len(data), start_addr=start_addr):
+                frames = [frame for frame in range(self._frame_count(data, offset))
+                          if block[frame * BLT_CHUNK_SIZE:(frame + 1) * BLT_CHUNK_SIZE] != self._chunk(data, offset, frame)]
+                if frames:
+                    bad[offset] = frames
+        except IOError as e:
+            return bad, str(e)
+        clear = self.om.Blt_Exec(OM_build_BltSetPref(status.pref_block), silent=True)
+        if clear.error is not None or clear.status & FLASH_STAT_MASK_ERR:
+            return bad, f"Status not cleared: {clear}"
+        return bad, None
+
+    def upload(self, data, start_addr: int = 0x00, progress: bool = True, windows: list = None, frames: dict = None):
+        """
+        Writes data (bytes-like, multiple of 8 bytes) to the flash starting at start_addr.
+        windows limits the upload to the given window offsets (multiples of window_size), all by default;
+        frames maps a window offset to the frame indices to write in it (all frames for windows not in it).
+        Returns:
+            dict: { "data": {"bytes", "duration_s", "KB_per_s", "windows", "resent_windows", "cb_checks"},
+                    "error", "offset": window with the failed write or error status on failure }
+        """
+        if windows is None:
+            windows = range(0, len(data), self.window_size)
+        frames = frames or {}
+        windows = [offset for offset in windows if frames.get(offset, True)]
+        offsets = deque((offset, frames.get(offset)) for offset in windows)
+        total_len = sum(min(self.window_size, len(data) - offset) for offset in windows)
+        in_flight = deque()
+        unverified = []
+        write_attempts = {}
+        check_attempts = {}
+        verified = set()
+        state = {"interval": self.check_min, "unchecked": 0}
+        resent = 0
+        cb_checks = 0
+
+        t_start = time.perf_counter()
+        with tqdm(total=total_len, desc="FW upload", unit="B", disable=not progress) as pbar:
+            while offsets or in_flight:
+                self._send(offsets, in_flight, data, start_addr, state)
+                offset, window_frames, check, pending = in_flight.popleft()
+                responses = self.om.wait_modbus_batch(pending)
+                if offset not in unverified:
+                    unverified.append(offset)
+                failed = [frame for frame, response in zip(window_frames, responses) if "error" in response]
+                if failed:
+                    write_attempts[offset] = write_attempts.get(offset, 0) + 1
+                    err_offset = offset + failed[0] * BLT_CHUNK_SIZE
+                    if write_attempts[offset] > self.retries:
+                        error = next(response["error"] for response in responses if "error" in response)
+                        logger.error(f"Write error at offset {err_offset}: {error}")
+                        self._cancel(in_flight)
+                        return {"error": f"Write error at offset {err_offset}: {error}", "offset": offset}
+                    logger.debug(f"Resending {len(failed)} frames of the window at {offset}, first at {err_offset}")
+                    # The resent frames carry the check this window may have had
+                    offsets.appendleft((offset, failed))
+                    state["interval"] = max(self.check_min, state["interval"] // 2)
+                    state["unchecked"] = state["interval"]
+                    resent += 1
+                    continue
+                write_attempts.pop(offset, None)
+                if not check:
+                    continue
+
+                cb_checks += 1
+                status = self.om._Blt_result(None, responses[-2:], 0.0, silent=True)
+                if status.error is not None:
+                    status = self._check_cb()
+                if status.error is not None:
+                    logger.error(f"Control block read failed after the window at {offset}: {status.error}")
+                    self._cancel(in_flight)
+                    return {"error": f"Control block read failed: {status.error}", "offset": offset}
+                if not status.status & FLASH_STAT_MASK_ERR:
+                    pbar.update(sum(min(self.window_size, len(data) - off) for off in unverified if off not in verified))
+                    verified.update(unverified)
+                    for off in unverified:
+                        check_attempts.pop(off, None)
+                    unverified = []
+                    state["interval"] = min(state["interval"] * 2, self.check_max)
+                    continue
+
+                # The windows queued after this one are written again after the repair
+                self._cancel(in_flight)
+                offsets.extendleft((off, queued) for off, queued, _, _ in reversed(in_flight))
+                in_flight.clear()
+                logger.warning(f"Error status 0x{status.status:02X} after {len(unverified)} windows from offset "
+                               f"{unverified[0]}, reading them back")
+                bad, error = self._repair(data, start_addr, unverified, status)
+                if error is not None:
+                    logger.error(f"Repair after error status 0x{status.status:02X} failed: {error}")
+                    return {"error": f"Error status 0x{status.status:02X}, repair failed: {error}", "offset": unverified[0]}
+                for off in bad:
+                    check_attempts[off] = check_attempts.get(off, 0) + 1
+                    if check_attempts[off] > self.retries:
+                        logger.error(f"Error status 0x{status.status:02X} after the window at {off}")
+                        return {"error": f"Error status 0x{status.status:02X} after the window at {off}", "offset": off}
+                pbar.update(sum(min(self.window_size, len(data) - off) for off in unverified if off not in bad and off not in verified))
+                verified.update(off for off in unverified if off not in bad)
+                logger.debug(f"Resending {sum(len(f) for f in bad.values())} frames in {len(bad)} windows")
+                offsets.extendleft((off, bad[off]) for off in sorted(bad, reverse=True))
+                unverified = []
+                state["interval"] = self.check_min
+                state["unchecked"] = 0
+                resent += len(bad)
+
+        duration = time.perf_counter() - t_start
+        kb_per_s = total_len / 1024 / duration if duration > 0 else 0.0
+        logger.info(f"Uploaded {total_len} bytes in {duration:.2f} s ({kb_per_s:.2f} KB/s), "
+                    f"{resent} windows resent, {cb_checks} CB checks")
+        return {"data": {"bytes": total_len, "duration_s": duration, "KB_per_s": kb_per_s,
+                         "windows": len(windows),
+                         "resent_windows": resent, "cb_checks": cb_checks}}
+
+
+class OMFlashReadback:
+    """Pipelined readback of the flash image mapped at the CAN-wrapper offsets (see CANWrp_ReadFlashFrag)."""
+    def __init__(self, om, window_size: int = BLT_WINDOW_SIZE, depth: int = BLT_PIPE_DEPTH, retries: int = BLT_WINDOW_RETRIES):
+        self.om = om
+        self.window_size = window_size
+        self.depth = max(1, depth)
+        self.retries = retries
+
+    def _window_commands(self, start_addr: int, offset: int, frames: list):
+        commands = []
+        for frame in frames:
+            pack = OM_build_CANWrp_WriteWrappedCmd(VarID=14, Offset=start_addr + offset + frame * BLT_CHUNK_SIZE, RTR=1)
+            commands.append(self.om._build_command(ModbusRequestType.WRITE_MULTY, OM_BOOT_REG_ADDR + OM_CAN_STR_OFF,
+                                                   registers=PackToRegisters(pack=pack)))
+            commands.append(self.om._build_command(ModbusRequestType.READ, OM_BOOT_REG_ADDR + OM_CAN_STR_OFF,
+                                                   count=OM_CAN_STR_LEN))
+        return commands
+
+    def iter_windows(self, offsets: list, length: int, start_addr: int = 0x00, skip_errors: bool = False):
+        """
+        Yields (offset, bytes) of each window in offsets order, windows clipped to length.
+        A frame that cannot be read within the retries raises IOError, or with skip_errors yields (offset, None).
+        """
+        order = deque(offsets)
+        todo = deque()
+        missing = {}
+        buffers = {}
+        for offset in order:
+            size = min(self.window_size, length - offset)
+            buffers[offset] = bytearray(size)
+            missing[offset] = set(range((size + BLT_CHUNK_SIZE - 1) // BLT_CHUNK_SIZE))
+            todo.append((offset, sorted(missing[offset])))
+        in_flight = deque()
+        attempts = {}
+        try:
+            yield from self._run(order, todo, missing, buffers, in_flight, attempts, start_addr, skip_errors)
+        finally:
+            # Consumer stopped early: drop the windows still queued on the worker
+            for _, _, pending in in_flight:
+                self.om.modbus_worker.cancel(pending)
+
+    def _run(self, order, todo, missing, buffers, in_flight, attempts, start_addr, skip_errors):
+        while order:
+            while todo and len(in_flight) < self.depth:
+                offset, frames = todo.popleft()
+                commands = self._window_commands(start_addr, offset, frames)
+                in_flight.append((offset, frames, self.om.send_modbus_batch(commands, silent=True, stop_on_error=False, blocking=False)))
+            offset, frames, pending = in_flight.popleft()
+            responses = self.om.wait_modbus_batch(pending)
+            for idx, frame in enumerate(frames):
+                response = responses[2 * idx + 1]
+                if "error" in responses[2 * idx] or "error" in response:
+                    continue
+                _, _, _, data = OM_Parse_CANEmWrap(RegistersToPack(response["data"]))
+                chunk = b"".join(data)
+                buffers[offset][frame * BLT_CHUNK_SIZE:(frame + 1) * BLT_CHUNK_SIZE] = chunk[:len(buffers[offset]) - frame * BLT_CHUNK_SIZE]
+                missing[offset].discard(frame)
+            if missing[offset]:
+                attempts[offset] = attempts.get(offset, 0) + 1
+                if attempts[offset] <= self.retries:
+                    todo.appendleft((offset, sorted(missing[offset])))
+                elif not skip_errors:
+                    raise IOError(f"Flash read error at offset {offset + min(missing[offset]) * BLT_CHUNK_SIZE}")
+                else:
+                    logger.warning(f"Flash read error at offset {offset + min(missing[offset]) * BLT_CHUNK_SIZE}, window skipped")
+                    buffers[offset] = None
+                    missing[offset] = set()
+            while order and not missing[order[0]]:
+                done = order.popleft()
+                data = buffers.pop(done)
+                yield done, (bytes(data) if data is not None else None)
+
+
+class OMFlashDump:
+    """
+    Flash range being dumped: output buffer plus a per-window done bitmap. Pass it back to Blt_DumpFlash to read
+    only the windows still missing. With a path the output is a memory-mapped file and the bitmap is kept in
+    <path>.progress, so an interrupted dump resumes across runs; otherwise out (any writable buffer of at least
+    length bytes) or a new bytearray holds the data.
+    """
+    def __init__(self, start: int, length: int, out=None, path: str = None, window_size: int = BLT_WINDOW_SIZE):
+        self.start = start
+        self.length = length
+        self.window_size = window_size
+        # Reads go by whole 8-byte frames: the range is widened to frame boundaries and clipped on put()
+        self.base = start - start % BLT_CHUNK_SIZE
+        end = start + length
+        self.span = end + (-end) % BLT_CHUNK_SIZE - self.base
+        self.done = np.zeros((self.span + window_size - 1) // window_size, dtype=bool)
+        self.path = path
+        self._mmap = None
+        if path is not None:
+            with open(path, "a+b") as f:
+                if os.path.getsize(path) != length:
+                    f.truncate(length)
+                self._mmap = mmap.mmap(f.fileno(), length) if length else None
+            self.buffer = memoryview(self._mmap) if self._mmap is not None else memoryview(bytearray())
+            self._load_progress()
+        else:
+            buffer = memoryview(out if out is not None else bytearray(length)).cast("B")
+            if len(buffer) < length:
+                raise ValueError(f"Output buffer of {len(buffer)} bytes is shorter than {length}")
+            self.buffer = buffer[:length]
+
+    @property
+    def _progress_path(self):
+        return self.path + ".progress"
+
+    def _load_progress(self):
+        if not os.path.exists(self._progress_path):
+            return
+        with open(self._progress_path, "r") as f:
+            progress = json.load(f)
+        if (progress.get("start"), progress.get("length"), progress.get("window_size")) == (self.start, self.length, self.window_size):
+            self.done[progress["done"]] = True
+
+    def save_progress(self):
+        """Flushes a file-backed dump and records which windows it holds (removed once complete)."""
+        if self.path is None:
+            return
+        if self._mmap is not None:
+            self._mmap.flush()
+        if self.complete:
+            if os.path.exists(self._progress_path):
+                os.remove(self._progress_path)
+            return
+        with open(self._progress_path, "w") as f:
+            json.dump({"start": self.start, "length": self.length, "window_size": self.window_size,
+                       "done": np.flatnonzero(self.done).tolist()}, f)
+
+    def missing_windows(self):
+        """Offsets from base of the windows not read yet."""
+        return [int(idx) * self.window_size for idx in np.flatnonzero(~self.done)]
+
+    def missing_ranges(self):
+        """(address, length) of the missing parts of the requested range."""
+        ranges = []
+        for offset in self.missing_windows():
+            lo = max(self.base + offset, self.start)
+            hi = min(self.base + offset + self.window_size, self.start + self.length)
+            if ranges and ranges[-1][0] + ranges[-1][1] == lo:
+                ranges[-1] = (ranges[-1][0], hi - ranges[-1][0])
+            else:
+                ranges.append((lo, hi - lo))
+        return ranges
+
+    def put(self, offset: int, data: bytes):
+        lo = max(self.base + offset, self.start)
+        hi = min(self.base + offset + len(data), self.start + self.length)
+        self.buffer[lo - self.start:hi - self.start] = data[lo - self.base - offset:hi - self.base - offset]
+        self.done[offset // self.window_size] = True
+
+    @property
+    def complete(self):
+        return bool(self.done.all())
+
+    def crc(self):
+        """STM32 CRC of the dumped range (crc32_stm), None if its length is not a whole number of words."""
+        if self.length % 4 != 0:
+            return None
+        return crc32_stm_fast(self.buffer)
+
+    def close(self):
+        """Saves the progress and unmaps a file-backed dump; its buffer (the "data" of Blt_DumpFlash) is not usable afterwards."""
+        self.save_progress()
+        if self._mmap is not None:
+            self.buffer.release()
+            self._mmap.close()
+            self._mmap = None
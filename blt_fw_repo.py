@@ -0,0 +1,166 @@
+"""
+Firmware repository index of a FW directory (FWs/ by default).
+
+Every OMMCU_vXX_YY_ZZ_{r,m}.bin gets its version, file size, FW_size, CRC and validity (find_crc_and_size)
+recorded in a JSON index next to the binaries. refresh() rescans only the files whose size or mtime changed,
+spreading the CRC scans over a process pool, so the "latest image" / "image with this CRC" lookups are dict
+reads instead of re-hashing the directory.
+
+    repo = FWRepository("FWs")
+    repo.refresh()
+    entry = repo.latest("r")
+    om.Blt_CheckCRC(1, file_path=entry["path"])
+"""
+import os
+import re
+import sys
+import json
+import hashlib
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from blt_logic import find_crc_and_size, find_fill_runs, fw_info_cache
+
+
+FW_REPO_DIR         = "FWs"
+FW_REPO_INDEX       = "fw_index.json"
+FW_REPO_INDEX_VER   = 1
+FW_NAME_RE          = re.compile(r"^OMMCU_v(\d{2})_(\d{2})_(\d{2})_([rm])\.bin$")
+
+
+def FW_parse_name(file_name: str):
+    """OMMCU_v02_09_07_r.bin -> {"version": "02.09.07", "version_tuple": [2, 9, 7], "kind": "r"}, None for other names."""
+    match = FW_NAME_RE.match(file_name)
+    if match is None:
+        return None
+    major, minor, fix, kind = match.groups()
+    return {"version": f"{major}.{minor}.{fix}", "version_tuple": [int(major), int(minor), int(fix)], "kind": kind}
+
+
+def _analyze_fw_file(path: str):
+    """Worker of the process pool: find_crc_and_size() plus content hash and fill runs of one file."""
+    with open(path, "rb") as f:
+        content = f.read()
+    info = find_crc_and_size(content)
+    info["sha256"] = hashlib.sha256(content).hexdigest()
+    info["fill_runs"] = find_fill_runs(content)
+    return info
+
+
+class FWRepository:
+    """Persistent index of the FW binaries of one directory."""
+    def __init__(self, fw_dir: str = FW_REPO_DIR, index_path: str = None, workers: int = None):
+        self.fw_dir = fw_dir
+        self.index_path = index_path or os.path.join(fw_dir, FW_REPO_INDEX)
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._files = {}
+        self._by_crc = {}
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, "r") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return
+        if index.get("version") == FW_REPO_INDEX_VER:
+            self._files = index.get("files", {})
+            self._rebuild()
+
+    def _save(self):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": FW_REPO_INDEX_VER, "files": self._files}, f, indent=1)
+        os.replace(tmp_path, self.index_path)
+
+    def _rebuild(self):
+        self._by_crc = {}
+        for entry in sorted(self._files.values(), key=lambda entry: entry["version_tuple"]):
+            entry["path"] = os.path.join(self.fw_dir, entry["file"])
+            if entry["valid"]:
+                self._by_crc.setdefault(entry["CRC"], []).append(entry)
+            fw_info_cache.seed({key: entry[key] for key in ("file_size", "FW_size", "CRC", "crc_match", "size_match", "sha256", "fill_runs")
+                                if key in entry})
+
+    def refresh(self):
+        """
+        Rescans the directory: new and changed files are analyzed in parallel, removed ones dropped.
+        Returns:
+            dict: {"added": [...], "updated": [...], "removed": [...]} file names
+        """
+        with self._lock:
+            found = {}
+            for file_name in sorted(os.listdir(self.fw_dir)):
+                parsed = FW_parse_name(file_name)
+                if parsed is None:
+                    continue
+                st = os.stat(os.path.join(self.fw_dir, file_name))
+                found[file_name] = (parsed, st)
+
+            stale = [file_name for file_name, (_, st) in found.items()
+                     if file_name not in self._files or self._files[file_name]["file_size"] != st.st_size
+                     or self._files[file_name]["mtime_ns"] != st.st_mtime_ns]
+            paths = [os.path.join(self.fw_dir, file_name) for file_name in stale]
+            if len(paths) > 1:
+                with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                    infos = list(pool.map(_analyze_fw_file, paths))
+            else:
+                infos = [_analyze_fw_file(path) for path in paths]
+
+            changes = {"added": [], "updated": [], "removed": [name for name in self._files if name not in found]}
+            for file_name in changes["removed"]:
+                del self._files[file_name]
+            for file_name, path, info in zip(stale, paths, infos):
+                parsed, st = found[file_name]
+                changes["updated" if file_name in self._files else "added"].append(file_name)
+                entry = {"file": file_name, "path": path, "mtime_ns": st.st_mtime_ns}
+                entry.update(parsed)
+                entry.update(info)
+                entry["valid"] = info["crc_match"] and info["size_match"]
+                self._files[file_name] = entry
+
+            self._rebuild()
+            if stale or changes["removed"] or not os.path.exists(self.index_path):
+                self._save()
+            return changes
+
+    def entries(self, kind: str = None):
+        """All indexed images, oldest version first."""
+        with self._lock:
+            return sorted((dict(entry) for entry in self._files.values() if kind is None or entry["kind"] == kind),
+                          key=lambda entry: entry["version_tuple"])
+
+    def latest(self, kind: str = "r"):
+        """Newest valid image of the kind ("r" or "m"), None if there is none."""
+        with self._lock:
+            valid = [entry for entry in self._files.values() if entry["valid"] and entry["kind"] == kind]
+            return dict(max(valid, key=lambda entry: entry["version_tuple"])) if valid else None
+
+    def by_crc(self, crc: int, kind: str = None):
+        """Newest valid image whose CRC equals crc (e.g. the one reported by the device), None if unknown."""
+        with self._lock:
+            matches = [entry for entry in self._by_crc.get(crc, []) if kind is None or entry["kind"] == kind]
+            return dict(matches[-1]) if matches else None
+
+    def by_version(self, version: str, kind: str = "r"):
+        """Image of the version as printed by OM_parse_FWVer ("02.09.07")."""
+        with self._lock:
+            for entry in self._files.values():
+                if entry["version"] == version and entry["kind"] == kind:
+                    return dict(entry)
+            return None
+
+
+def main():
+    fw_dir = sys.argv[1] if len(sys.argv) > 1 else FW_REPO_DIR
+    repo = FWRepository(fw_dir)
+    print(repo.refresh())
+    for entry in repo.entries():
+        print(f"{entry['file']:28} {entry['version']} {entry['kind']} FW_size {entry['FW_size']:7} "
+              f"CRC 0x{entry['CRC']:08X} {'valid' if entry['valid'] else 'INVALID'}")
+    return
+
+if __name__ == "__main__":
+    main()
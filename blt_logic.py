@@ -3,8 +3,13 @@ import ctypes
 from enum import Enum
 import zlib
 import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
 from OM_registers import *
-from CRC_lib import crc32_stm
+from CRC_lib import crc32_stm, crc32_stm_find_end
 
 
 
@@ -23,10 +28,21 @@ FLASH_CMD_ERASE_ONE_SECTOR          = 0x12
 # ResetSrc
 
 
-#define FLASH_STAT_LOAD_OK              0x10
-#define FLASH_STAT_MASK_NIX_ERR         0xC0
-#define FLASH_STAT_MASK_ERR             0x80
-#define FLASH_STAT_FATAL_ERR            0xFF
+FLASH_STAT_LOAD_OK                  = 0x10
+FLASH_STAT_MASK_NIX_ERR             = 0xC0
+FLASH_STAT_MASK_ERR                 = 0x80
+FLASH_STAT_FATAL_ERR                = 0xFF
+
+# CAN-wrapper offset of the bootloader control block (flash image is mapped from 0x00)
+FLASH_CB_OFFSET                     = 0x00080000
+
+# Two-image flash, STM32F4 layout: absolute (offset, length) per sector number of OM_build_BltEraseSector
+FLASH_IMG_SIZE                      = 0x00040000
+FLASH_SECTORS                       = [(0x00000, 0x4000), (0x04000, 0x4000), (0x08000, 0x4000), (0x0C000, 0x4000),
+                                       (0x10000, 0x10000), (0x20000, 0x20000), (0x40000, 0x20000), (0x60000, 0x20000)]
+
+# File contents kept by FWInfoCache (least recently used dropped first), the metadata is kept for every file
+FW_CACHE_MAX_FILES                  = 4
 
 
 
@@ -238,24 +254,10 @@ def find_crc_and_size(file_content):
               otherwise None. 
               FW size is returned as it is written in FW: in words, CRC included, filesize not included.
     """
-    addr = 0
-    ret = -1
-    calculated_crc = 0xFFFFFFFF  # Initialize CRC as in C code (CRC->CR = 1)
     file_size = len(file_content)
-    
-    prev_crc = 0
-    CRC_match: bool= False
-    Size_match: bool = False
-
-    # Iterate through the file content in 4-byte chunks (assuming 32-bit words)
-    for addr in range(0, file_size-4, 4):  # Equivalent to ptr < 0x00080000/4-1
-        if calculated_crc == 0:
-            CRC_match = True
-            if addr == int.from_bytes(file_content[addr:addr+4], 'little')*4:
-                Size_match = True
-            break
-        prev_crc = calculated_crc
-        calculated_crc: int = crc32_stm(file_content[addr:addr + 4], crc=calculated_crc) & 0xFFFFFFFF # Update CRC
+    idx, prev_crc, CRC_match = crc32_stm_find_end(file_content)
+    addr = idx * 4
+    Size_match: bool = CRC_match and idx == int.from_bytes(file_content[addr:addr + 4], "little")
 
     return {
         "file_size":    file_size,
@@ -266,26 +268,136 @@ def find_crc_and_size(file_content):
     }
 
 
-def analyze_bin_file(file_path):
+def find_fill_runs(file_content, chunk_size: int = 8, values: tuple = (0xFF, 0xFE)):
+    """
+    Run-length map of the chunks made of one repeated byte value (erased flash 0xFF, 0xFE padding).
+
+    Returns:
+        list: [start, length, value] runs in bytes, chunk aligned, ascending.
+    """
+    n = len(file_content) // chunk_size
+    if n == 0:
+        return []
+    chunks = np.frombuffer(file_content, dtype=np.uint8, count=n * chunk_size).reshape(n, chunk_size)
+    uniform = (chunks == chunks[:, :1]).all(axis=1) & np.isin(chunks[:, 0], values)
+    fill = np.where(uniform, chunks[:, 0].astype(np.int16), -1)
+    edges = np.flatnonzero(np.diff(fill)) + 1
+    starts = np.concatenate(([0], edges))
+    ends = np.concatenate((edges, [n]))
+    return [[int(start) * chunk_size, int(end - start) * chunk_size, int(fill[start])]
+            for start, end in zip(starts, ends) if fill[start] >= 0]
+
+
+class FWInfoCache:
+    """
+    Memo of find_crc_and_size() results.
+    Entries are keyed by path and validated by size + mtime; on a stat change the content SHA-256 is checked,
+    so a touched but identical file is not rescanned. With a sidecar path the results by hash persist in a JSON index.
+    Only the metadata is kept for every file; the content of the last max_files files is kept as read-only copies
+    (no file stays open, FW files can be replaced freely), older ones are read again on demand.
+    """
+    def __init__(self, sidecar: str = None, max_files: int = FW_CACHE_MAX_FILES):
+        self._lock = threading.Lock()
+        self._by_path = {}
+        self._by_hash = {}
+        self._views = OrderedDict()
+        self.max_files = max_files
+        self.sidecar = None
+        if sidecar is not None:
+            self.set_sidecar(sidecar)
+
+    def set_sidecar(self, sidecar: str):
+        """Loads (and from now on updates) the on-disk index, None to disable it."""
+        with self._lock:
+            self.sidecar = sidecar
+            if sidecar is not None and os.path.exists(sidecar):
+                with open(sidecar, "r") as f:
+                    self._by_hash.update(json.load(f))
+
+    def seed(self, info: dict):
+        """Adds an already computed result (find_crc_and_size() keys plus "sha256"), e.g. from the FW repository index."""
+        with self._lock:
+            self._by_hash.setdefault(info["sha256"], dict(info))
+
+    def clear(self):
+        with self._lock:
+            self._by_path = {}
+            self._by_hash = {}
+            self._views.clear()
+
+    def _save_sidecar(self):
+        tmp_path = self.sidecar + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._by_hash, f, indent=1)
+        os.replace(tmp_path, self.sidecar)
+
+    def _keep_view(self, key: tuple, view):
+        self._views[key] = view
+        self._views.move_to_end(key)
+        while len(self._views) > self.max_files:
+            self._views.popitem(last=False)
+
+    def get(self, file_path: str):
+        """
+        Returns:
+            tuple: (info dict, read-only memoryview of the file content).
+                   info has find_crc_and_size() keys plus "sha256" and "fill_runs" (find_fill_runs).
+        """
+        path = os.path.abspath(file_path)
+        st = os.stat(path)
+        key = (path, st.st_size, st.st_mtime_ns)
+        with self._lock:
+            info = self._by_path.get(key)
+            view = self._views.get(key)
+            if info is not None and view is not None:
+                self._views.move_to_end(key)
+                return dict(info), view
+
+            view = _read_file(path)
+            if info is not None and len(view) == st.st_size:
+                self._keep_view(key, view)
+                return dict(info), view
+
+            sha256 = hashlib.sha256(view).hexdigest()
+            info = self._by_hash.get(sha256)
+            if info is None or "fill_runs" not in info:
+                info = dict(info) if info is not None else find_crc_and_size(view)
+                info["sha256"] = sha256
+                info["fill_runs"] = find_fill_runs(view)
+                self._by_hash[sha256] = info
+                if self.sidecar is not None:
+                    self._save_sidecar()
+            self._by_path = {k: v for k, v in self._by_path.items() if k[0] != path}
+            self._by_path[key] = info
+            self._keep_view(key, view)
+            return dict(info), view
+
+
+def _read_file(path: str):
+    with open(path, "rb") as f:
+        return memoryview(f.read())
+
+
+fw_info_cache = FWInfoCache()
+
+
+def analyze_bin_file(file_path, cache: FWInfoCache = fw_info_cache):
     """
     Analyzes a binary file to extract FW CRC32, FW size, file size and binaries themselves.
+    Results are memoized in cache (see FWInfoCache), so repeated calls on the same file skip the CRC scan.
 
     Args:
         file_path (str): The path to the binary file.
 
     Returns:
-        dict: A dictionary containing the FW CRC32, FW size and file size values and bytes of file.
-              Returns None if the file does not exist or if an error occurs during processing.
+        dict: A dictionary containing the FW CRC32, FW size and file size values and a read-only memoryview
+              of the file content. Returns None if the file does not exist or if an error occurs during processing.
     """
 
     try:
         if not os.path.exists(file_path):
-            raise Exception("Error: File not found at {file_path}")
-        with open(file_path, "rb") as f:
-            file_content = f.read()
-
-        result = find_crc_and_size(file_content)
-        return result, file_content
+            raise Exception(f"Error: File not found at {file_path}")
+        return cache.get(file_path)
     
     except Exception as e:
         print(f"An error occurred: {e}")
@@ -1,4 +1,5 @@
 from OM_worker_base import OM_Interface
+from OM_data import OM_CMD_TAKE_HS
 from modbus_worker import ModbusWorker
 from MB_over_CAN_worker import MBOverCANWorker
 from usb_can_driver.usb_can import USB_CAN_Driver
@@ -138,14 +139,11 @@ def MnfProcess(OM_entry: OM_Interface):
 
 def Example_Read_Grayscale_Photo(OM_entry: OM_Interface, save_path='OM_img.png', photo_take=False):
     if photo_take:
-        OM_entry.Cmd_SSTake()
-        time.sleep(0.2)
-        res = OM_entry.Data_GetSS()
+        res = OM_entry.Take_And_Read_SS()
         logger.info(f"SS_read_data result: {res}")
         res = OM_entry.Data_GetCmdStatus()
         logger.info(f"SS_cmd_status result: {res}")
 
-    time.sleep(0.3)
     # Read the full 480x480 grayscale image
     result = OM_entry.Read_SS_Grayscale_Photo()
     if "error" in result:
@@ -189,8 +187,10 @@ def Example_Read_Grayscale_Lines(OM_entry: OM_Interface, start_line: int, end_li
 
 def Example_Read_Thermal_Photo(OM_entry: OM_Interface, save_path=None, photo_take=False):
     if photo_take:
-        OM_entry.Cmd_HSTake()
-        time.sleep(0.3)
+        response = OM_entry.Exec_And_Wait(OM_entry.Cmd_HSTake, OM_CMD_TAKE_HS)
+        if "error" in response:
+            print(f"Error taking thermal photo: {response['error']}")
+            return
 
     # Read the full 32x24 thermal image
     result = OM_entry.Read_Thermal_Photo()
@@ -214,8 +214,10 @@ def Example_Read_Thermal_Photo(OM_entry: OM_Interface, save_path=None, photo_tak
 
 def Example_Read_Thermal_Cluster(OM_entry: OM_Interface, photo_take=False):
     if photo_take:
-        OM_entry.Cmd_HSTake()
-        time.sleep(0.3)
+        response = OM_entry.Exec_And_Wait(OM_entry.Cmd_HSTake, OM_CMD_TAKE_HS)
+        if "error" in response:
+            print(f"Error taking thermal photo: {response['error']}")
+            return
 
     # Read the full 32x24 clustered image
     result = OM_entry.Read_Thermal_Cluster_Photo()
@@ -232,23 +234,25 @@ def Example_Read_Thermal_Cluster(OM_entry: OM_Interface, photo_take=False):
         plt.show(block=False)
         plt.pause(0.001)
 
-def Example_GetGAM(OM_entry: OM_Interface):
-    ret = OM_entry.Cmd_GAMTake()
-    # logger.info(f"GAM cmd sent: {ret}")
+def Example_Burst(OM_entry: OM_Interface, kind="SS", count=10, save_dir='Logs/Burst'):
+    # Frames are taken and read back-to-back, normalising and saving runs in the background
+    result = OM_entry.Burst_Capture(kind=kind, count=count, save_dir=save_dir)
+    for frame in result["data"]:
+        if frame is not None:
+            logger.info(f"Frame {frame['frame']}: min {frame['min']}, max {frame['max']}, saved to {frame['path']}")
+    for index, error in result["errors"].items():
+        logger.error(f"Frame {index} failed: {error}")
+    logger.info(f"Burst of {count} frames: capture {result['capture_s']:.2f} s, total {result['total_s']:.2f} s")
 
-    ret = OM_entry.Data_GetGAM()
+def Example_GetGAM(OM_entry: OM_Interface):
+    ret = OM_entry.Take_And_Read_GAM()
     logger.info(f"GAM: {ret}")
 
 def Example_GetSSData(OM_entry: OM_Interface):
     for i in range(1):
         logger.info(f"Iteration {i+1}")
-        res = OM_entry.Cmd_SSTake()
-        logger.info(f"SS_take_data result: {res}")
-        time.sleep(0.2)
- 
-        res = OM_entry.Data_GetSS()
+        res = OM_entry.Take_And_Read_SS()
         logger.info(f"SS_read_data result: {res}")
-        time.sleep(0.1)
 
         res = OM_entry.Data_GetCmdStatus()
         logger.info(f"SS_cmd_status result: {res}")
@@ -273,23 +277,25 @@ def Example_GetFW_ID(OM_entry: OM_Interface):
     logger.info(f"Current DFW_ID result: {FWID_rd_res}")
 
 def Example_FLASHSectRd(OM_entry: OM_Interface):
-    flash_frag = []
-    for i in range(0, 64, 8):
-        Flash_resp = OM_entry.CANWrp_ReadFlashFrag(i)
-        if "data" in Flash_resp:
-            flash_frag.extend(Flash_resp["data"])
-        else:
-            logger.error(f"Err occured at {i}: {Flash_resp}")
-            break
+    Flash_resp = OM_entry.Blt_DumpFlash(0, 64, progress=False)
+    if "error" in Flash_resp:
+        logger.error(f"Err occured: {Flash_resp['error']}")
 
-    # flash_frag contains bytes. Print them as 32-bit hexes with 0 at the beginning if needed
+    # Print the dump as 32-bit hexes, bytes in flash order
+    flash_frag = Flash_resp["data"]
     for i in range(0, len(flash_frag), 4):
-        val = (int.from_bytes(flash_frag[i]) << 24) | (int.from_bytes(flash_frag[i+1]) << 16) | (int.from_bytes(flash_frag[i+2]) << 8) | int.from_bytes(flash_frag[i+3])
-        print(f"{val:08X}")
+        print(f"{int.from_bytes(flash_frag[i:i+4], 'big'):08X}")
 
     Example_GetSSData(OM_entry)
 
 
+def Example_FLASHDump(OM_entry: OM_Interface, path='Logs/flash_img.bin', length=0x40000):
+    # Resumes from Logs/flash_img.bin.progress if a previous dump was interrupted
+    resp = OM_entry.Blt_DumpFlash(0, length, path=path)
+    logger.info(f"Flash dump: CRC {resp.get('CRC')}, {resp['KB_per_s']:.2f} KB/s, missing {resp['missing']}")
+    resp["dump"].close()
+
+
 def Example_SysCmd(OM_entry: OM_Interface):
     # OM_entry._Cmd_SetMnfID()
 
@@ -377,10 +383,11 @@ def Example_Reboot(OM_entry: OM_Interface):
     CB_resp = OM_entry.CANWrp_ReadCB()
     logger.info(f"Current CB: {CB_resp}")
     
-    resp = OM_entry.Blt_Restart()
+    resp = OM_entry.Blt_Restart(wait=True)
     logger.info(f"Restart resp: {resp}")
-
-    time.sleep(0.1)
+    if not resp.get("restarted"):
+        logger.error("Bootloader restart not observed, stopping")
+        return
 
     CB_resp = OM_entry.CANWrp_ReadCB()
     logger.info(f"Current CB: {CB_resp}")
@@ -395,10 +402,11 @@ def Example_SetPref(OM_entry: OM_Interface):
     CB_resp = OM_entry.CANWrp_ReadCB()
     logger.info(f"Current CB: {CB_resp}")
 
-    resp = OM_entry.Blt_Restart()
+    resp = OM_entry.Blt_Restart(wait=True)
     logger.info(f"Restart resp: {resp}")
-
-    time.sleep(2)
+    if not resp.get("restarted"):
+        logger.error("Bootloader restart not observed, stopping")
+        return
 
     # return
 
@@ -409,10 +417,11 @@ def Example_SetPref(OM_entry: OM_Interface):
     CB_resp = OM_entry.CANWrp_ReadCB()
     logger.info(f"Current CB: {CB_resp}")
 
-    resp = OM_entry.Blt_Restart()
+    resp = OM_entry.Blt_Restart(wait=True)
     logger.info(f"Restart resp: {resp}")
-    
-    time.sleep(2)
+    if not resp.get("restarted"):
+        logger.error("Bootloader restart not observed, stopping")
+        return
     
     CB_resp = OM_entry.CANWrp_ReadCB()
     logger.info(f"Current CB: {CB_resp}")
@@ -426,10 +435,11 @@ def Example_CopyAndGo(OM_entry: OM_Interface):
     resp = OM_entry.Blt_CheckCRC(1, file_path='FWs/OMMCU_v02_09_12_m.bin')
     logger.info(f"Check valid of MainFW in img_1 res: {resp}")
 
-    resp = OM_entry.Blt_CopyAndGo(file_path='FWs/OMMCU_v02_09_12_m.bin')
+    resp = OM_entry.Blt_CopyAndGo(file_path='FWs/OMMCU_v02_09_12_m.bin', wait=True)
     logger.info(f"Copy and go res: {resp}")
-
-    time.sleep(1)
+    if not resp.get("restarted"):
+        logger.error("Bootloader restart not observed, stopping")
+        return
 
     Example_CheckValid(OM_entry=OM_entry)
     Example_GetFW_ID(OM_entry)
@@ -445,17 +455,16 @@ def Example_UploadFW(OM_entry: OM_Interface):
     ret = OM_entry.Blt_SetPref(pref=0)
     logger.info(f"Set_pref ret: {ret}")
 
-    logger.info("Restarting the device... (may not return any value)")
-    resp = OM_entry.Blt_Restart()
+    logger.info("Restarting the device...")
+    resp = OM_entry.Blt_Restart(wait=True)
     logger.info(f"Restart resp: {resp}")
-
-    time.sleep(1)
+    if not resp.get("restarted"):
+        logger.error("Bootloader restart not observed, stopping")
+        return
 
     logger.info("Erasing second half of flash memory...")
     Example_EraseHalf(OM_entry)
 
-    time.sleep(5)
-
     logger.info("Getting FW_ID and checking validity after erase...")
     Example_GetFW_ID(OM_entry)
     Example_CheckValid(OM_entry)
@@ -466,9 +475,11 @@ def Example_UploadFW(OM_entry: OM_Interface):
 
     logger.info("Checking validity after upload...")
     Example_CheckValid(OM_entry)
-    OM_entry.Blt_Restart()
-
-    time.sleep(1)
+    resp = OM_entry.Blt_Restart(wait=True)
+    logger.info(f"Restart resp: {resp}")
+    if not resp.get("restarted"):
+        logger.error("Bootloader restart not observed, stopping")
+        return
 
     logger.info("Checking validity after restart...")
     Example_CheckValid(OM_entry)
@@ -487,15 +498,14 @@ def Example_UploadFWAndCopyAndGo(OM_entry: OM_Interface):
     ret = OM_entry.Blt_SetPref(pref=0)
     logger.info(f"FW_upload ret: {ret}")
 
-    resp = OM_entry.Blt_Restart()
+    resp = OM_entry.Blt_Restart(wait=True)
     logger.info(f"Restart resp: {resp}")
-
-    time.sleep(1)
+    if not resp.get("restarted"):
+        logger.error("Bootloader restart not observed, stopping")
+        return
 
     Example_EraseHalf(OM_entry)
 
-    time.sleep(5)
-
     Example_GetFW_ID(OM_entry)
     Example_CheckValid(OM_entry)
 
@@ -504,10 +514,11 @@ def Example_UploadFWAndCopyAndGo(OM_entry: OM_Interface):
 
     Example_CheckValid(OM_entry)
 
-    resp = OM_entry.Blt_CopyAndGo(file_path='FWs/OMMCU_v02_10_07_m.bin')
+    resp = OM_entry.Blt_CopyAndGo(file_path='FWs/OMMCU_v02_10_07_m.bin', wait=True)
     logger.info(f"Copy and go res: {resp}")
-    
-    time.sleep(1)
+    if not resp.get("restarted"):
+        logger.error("Bootloader restart not observed, stopping")
+        return
 
     Example_CheckValid(OM_entry)
     Example_GetFW_ID(OM_entry)
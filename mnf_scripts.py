@@ -78,14 +78,12 @@ def OM_mnf_ForceSetMnfID(OM_entry: OM_Interface, ID: int):
 
 
 def OM_periph_tst(OM_entry: OM_Interface, path_to_work:str, MnfID_undertest:str):
-    FWID_rd_res = OM_entry.Data_GetFW_ID()
-    logger.info(f"FW_ID: {FWID_rd_res}")
-
-    ret = OM_entry.Data_GetDevID()
-    logger.info(f"DevID: {ret}")
-
-    ret = OM_entry.Data_GetMnfID()
-    logger.info(f"MnfID: {ret}")
+    ret = OM_entry.Data_GetIdentity()
+    if "data" in ret:
+        for field, value in ret["data"].items():
+            logger.info(f"{field}: {value}")
+    else:
+        logger.info(f"Identity: {ret}")
 
     Example_CheckCRC(OM_entry)
 
@@ -2,10 +2,13 @@ import threading
 import queue
 from pymodbus.exceptions import ConnectionException
 from pymodbus.client import ModbusSerialClient as ModbusClient
+from pymodbus.client import AsyncModbusSerialClient as AsyncModbusClient
 from OM_comm_interface import *
+from OM_metrics import CommMetrics
 import struct
 from loguru import logger
 import time
+import asyncio
 
 
 def PackToRegisters(pack:list = []):
@@ -38,7 +41,8 @@ class ModbusWorker(threading.Thread, OMCommInterface):
         self.bytesize = bytesize
         self.timeout = timeout
         self.request_queue = queue.Queue(maxsize=100)
-        self.response_queue = queue.Queue()
+        self.pending = PendingRequests()
+        self.metrics = CommMetrics()
         self.running = False
         self.client : ModbusClient = ModbusClient(
                 port=self.port,
@@ -87,6 +91,7 @@ class ModbusWorker(threading.Thread, OMCommInterface):
         self.running = False
         self.request_queue.put(None)
         self.join()
+        self.metrics.stop_log()
 
     def handle_request(self, request, silent=False):
         if request.type == ModbusRequestType.READ:
@@ -120,21 +125,6 @@ class ModbusWorker(threading.Thread, OMCommInterface):
             logger.error(f"Unknown request type: {request.type}")
             return {"error": "Unknown request type"}
 
-    def send_request(self, request, blocking=True, timeout=5, silent=False):
-        self.request_queue.put((request, silent))
-        if blocking:
-            start_time = time.time()
-            while True:
-                try:
-                    response: dict[str, str] = self.response_queue.get(timeout=0.1)
-                    return response
-                except queue.Empty:
-                    if time.time() - start_time > timeout:
-                        logger.warning(f"Request timed out after {timeout} seconds")
-                        return {"error": "Timeout"}
-        else:
-            return None
-
     def run(self):
         if not self.connect():
             return
@@ -142,20 +132,115 @@ class ModbusWorker(threading.Thread, OMCommInterface):
         self.running = True
         while self.running:
             try:
-                item = self.request_queue.get(timeout=1)
-                if item is None:
+                pending = self.request_queue.get(timeout=1)
+                if pending is None:
                     continue
-                if isinstance(item, tuple):
-                    request, silent = item
-                else:
-                    request, silent = item, False
-                if not silent:
-                    logger.debug(f"Processing request: {request.__dict__}")
-                response = self.handle_request(request, silent=silent)
-                if not silent:
-                    logger.debug(f"Received response: {response}")
-                self.response_queue.put(response)
+                self._process_pending(pending)
             except queue.Empty:
                 pass
 
-        self.disconnect()
\ No newline at end of file
+        self.disconnect()
+
+class AsyncModbusWorker(AsyncOMCommInterface):
+    """
+    Modbus RTU link driven by the caller's event loop (pymodbus async serial client).
+    Requests from concurrent tasks are serialized on the link by a lock.
+    """
+    def __init__(self, port, baudrate, stopbits, parity, bytesize, timeout=1):
+        self.port = port
+        self.baudrate = baudrate
+        self.stopbits = stopbits
+        self.parity = parity
+        self.bytesize = bytesize
+        self.timeout = timeout
+        self.lock = None
+        self.metrics = CommMetrics()
+        self.client : AsyncModbusClient = AsyncModbusClient(
+                port=self.port,
+                baudrate=self.baudrate,
+                stopbits=self.stopbits,
+                parity=self.parity,
+                bytesize=self.bytesize,
+                timeout=self.timeout,
+            )
+
+    async def start(self):
+        self.lock = asyncio.Lock()
+        try:
+            connected = await self.client.connect()
+            if connected:
+                logger.info(f"Connected to Modbus on {self.port}")
+            else:
+                logger.error(f"Failed to connect to Modbus on {self.port}")
+            return connected
+        except ConnectionException as e:
+            logger.error(f"Failed to connect to Modbus: {e}")
+            return False
+
+    async def stop(self):
+        self.metrics.stop_log()
+        if self.client:
+            self.client.close()
+            logger.info(f"Disconnected from Modbus on {self.port}")
+
+    async def handle_request(self, request, silent=False):
+        if request.type == ModbusRequestType.READ:
+            if not silent:
+                logger.debug(f"Sending READ request to address {request.address}, count {request.count}, slave {request.slave_id}")
+            try:
+                result = await self.client.read_holding_registers(
+                    request.address, count=request.count, device_id=request.slave_id
+                )
+                if result.isError():
+                    return {"error": str(result)}
+                return {"data": result.registers}
+            except Exception as e:
+                return {"error": str(e)}
+        elif request.type == ModbusRequestType.WRITE_MULTY:
+            if not silent:
+                logger.debug(f"Sending WRITE request to address {request.address}, value {request.registers}, slave {request.slave_id}")
+            try:
+                result = await self.client.write_registers(
+                    request.address, request.registers, device_id=request.slave_id
+                )
+                if result.isError():
+                    return {"error": str(result)}
+                return {"status": "success"}
+            except Exception as e:
+                return {"error": str(e)}
+        elif request.type == ModbusRequestType.WRITE_SINGLE:
+            logger.error("Unsupported!")
+            return {"error": "Unsupported"}
+        else:
+            logger.error(f"Unknown request type: {request.type}")
+            return {"error": "Unknown request type"}
+
+    async def send_request(self, request, timeout=5, silent=False):
+        submitted = time.perf_counter()
+        try:
+            async with asyncio.timeout(timeout):
+                async with self.lock:
+                    return await self._handle_measured(request, silent=silent, queue_wait=time.perf_counter() - submitted)
+        except TimeoutError:
+            logger.warning(f"Request {request.id} timed out after {timeout} seconds")
+            self.metrics.record_timeout(request)
+            return {"error": "Timeout"}
+
+    async def send_batch(self, requests, timeout=5, silent=False, stop_on_error=True):
+        submitted = time.perf_counter()
+        responses = []
+        try:
+            async with asyncio.timeout(timeout):
+                async with self.lock:
+                    queue_wait = time.perf_counter() - submitted
+                    for request in requests:
+                        if stop_on_error and responses and "error" in responses[-1]:
+                            responses.append({"error": "Not executed"})
+                            continue
+                        responses.append(await self._handle_measured(request, silent=silent, queue_wait=queue_wait))
+        except TimeoutError:
+            logger.warning(f"Batch of {len(requests)} requests timed out after {timeout} seconds")
+            for request in requests[len(responses):]:
+                self.metrics.record_timeout(request)
+            responses.extend({"error": "Timeout"} for _ in range(len(requests) - len(responses)))
+        return responses
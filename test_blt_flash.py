@@ -0,0 +1,103 @@
+import pytest
+from OM_simulator import OMSimBus, OMSimDevice, SimModbusWorker, OM_sim_build_fw
+from OM_worker_base import OM_Interface
+from blt_flash import OMFlashUploader, BLT_WINDOW_SIZE
+
+
+def _om(error_rate=0.0, flash_error_rate=0.0):
+    bus = OMSimBus([OMSimDevice(slave_id=1, erase_time=0.05, flash_error_rate=flash_error_rate)],
+                   error_rate=error_rate, no_response_time=0.002)
+    worker = SimModbusWorker(bus)
+    worker.start()
+    return bus.devices[0], worker, OM_Interface(worker, slave_id=1)
+
+
+@pytest.fixture
+def sim():
+    started = []
+
+    def make(error_rate=0.0, flash_error_rate=0.0):
+        dev, worker, om = _om(error_rate, flash_error_rate)
+        started.append(worker)
+        return dev, om
+    yield make
+    for worker in started:
+        worker.stop()
+
+
+def test_upload_writes_image(sim):
+    dev, om = sim()
+    data = OM_sim_build_fw(2048)
+    upload = OMFlashUploader(om).upload(data, progress=False)
+    assert "error" not in upload
+    # Clean checks double the interval: far fewer status reads than windows
+    assert upload["data"]["cb_checks"] < upload["data"]["windows"] // 2
+    assert bytes(dev.image(1)[:len(data)]) == data
+
+
+def test_upload_resends_failed_frames(sim):
+    dev, om = sim(error_rate=0.05)
+    data = OM_sim_build_fw(4096, seed=1)
+    upload = OMFlashUploader(om).upload(data, progress=False)
+    assert "error" not in upload
+    assert upload["data"]["resent_windows"] > 0
+    assert bytes(dev.image(1)[:len(data)]) == data
+
+
+def test_upload_repairs_failed_flash_writes(sim):
+    dev, om = sim(flash_error_rate=0.01)
+    data = OM_sim_build_fw(8192, seed=4)
+    upload = OMFlashUploader(om).upload(data, progress=False)
+    assert "error" not in upload
+    assert 0 < upload["data"]["resent_windows"] < upload["data"]["windows"]
+    assert bytes(dev.image(1)[:len(data)]) == data
+
+
+def test_upload_stops_on_error_status(sim):
+    dev, om = sim()
+    data = OM_sim_build_fw(2048, seed=2)
+    dev.image(1)[:] = b'\x00' * len(dev.image(1))
+    # Windows given frame subsets go through the same path as the ones written in full
+    frames = {BLT_WINDOW_SIZE: [0, 1]}
+    upload = OMFlashUploader(om).upload(data, progress=False, frames=frames)
+    assert upload["error"].startswith("Error status 0x81")
+    assert upload["offset"] == 0
+
+
+def test_upload_fw_erases_and_retries(sim, tmp_path):
+    dev, om = sim()
+    path = tmp_path / "fw.bin"
+    path.write_bytes(OM_sim_build_fw(2048, seed=3))
+    dev.image(1)[:] = b'\x00' * len(dev.image(1))
+    assert "error" in om.Blt_UploadFW(1, str(path), retries=0)
+    response = om.Blt_UploadFW(1, str(path))
+    assert response.get("status") == "success"
+
+
+def test_update_diff_rewrites_only_differing_sectors(sim, tmp_path):
+    dev, om = sim()
+    path = tmp_path / "fw.bin"
+    data = OM_sim_build_fw(0x9000, seed=5)
+    path.write_bytes(data)
+    dev.current_block = 1
+    image = dev.image(0)
+    image[:len(data)] = data
+    image[0x5000:0x5010] = b'\x00' * 16
+    image[0x8000:0x8010] = b'\x00' * 16
+    response = om.Blt_UpdateFW_Diff(0, str(path))
+    assert response["mode"] == "diff"
+    assert response["sectors"] == [1, 2]
+    assert bytes(image[:len(data) - 8]) == data[:len(data) - 8]
+    assert om.Blt_UpdateFW_Diff(0, str(path))["mode"] == "same"
+
+
+def test_bootloader_waits_observe_the_device(sim):
+    dev, om = sim()
+    # A zero status is an ordinary status, not "busy": silence and answering again end the erase and the restart
+    dev.flash_status = 0x00
+    assert om.Blt_EraseHalf()["Status"] == "Ok"
+    dev.flash_status = 0x00
+    assert om.Blt_Restart(wait=True)["restarted"]
+    # The device keeps answering unchanged: no restart seen
+    waited = om.Blt_WaitRestart(timeout=0.2)
+    assert waited["error"] == "Restart not observed" and not waited["restarted"]
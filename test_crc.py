@@ -0,0 +1,46 @@
+import numpy as np
+from CRC_lib import crc32_stm, crc32_stm_fast, check_firmware_crc
+from blt_logic import find_crc_and_size
+from OM_simulator import OM_sim_build_fw
+
+
+def _find_crc_and_size_ref(content):
+    """Word-by-word scan with the reference crc32_stm."""
+    addr, prev_crc, crc = 0, 0, 0xFFFFFFFF
+    for addr in range(0, ((len(content) - 1) // 4) * 4, 4):
+        if crc == 0:
+            return {"FW_size": addr, "CRC": prev_crc, "crc_match": True,
+                    "size_match": addr == int.from_bytes(content[addr:addr + 4], "little") * 4}
+        prev_crc = crc
+        crc = crc32_stm(content[addr:addr + 4], crc)
+    return {"FW_size": addr, "CRC": prev_crc, "crc_match": False, "size_match": False}
+
+
+def test_crc32_stm_fast_matches_reference():
+    rng = np.random.default_rng(0)
+    for length in (0, 4, 8, 100, 4096):
+        data = rng.integers(0, 256, length, dtype=np.uint8).tobytes()
+        for crc in (0xFFFFFFFF, 0, 0x12345678):
+            assert crc32_stm_fast(data, crc) == crc32_stm(data, crc)
+    assert crc32_stm_fast(memoryview(data)) == crc32_stm(data)
+
+
+def test_find_crc_and_size_matches_reference():
+    good = OM_sim_build_fw(4096, seed=1)
+    corrupted = bytearray(good)
+    corrupted[100] ^= 0x01
+    wrong_size = bytearray(good)
+    fw_size = find_crc_and_size(good)["FW_size"]
+    wrong_size[fw_size:fw_size + 4] = b'\x01\x00\x00\x00'
+    for content in (good, bytes(corrupted), bytes(wrong_size), OM_sim_build_fw(64, seed=2), b'', b'\x00' * 12):
+        info = find_crc_and_size(content)
+        ref = _find_crc_and_size_ref(content)
+        assert {key: info[key] for key in ref} == ref
+        assert check_firmware_crc(content) == (ref["crc_match"] and ref["size_match"])
+
+
+def test_found_crc_is_the_image_crc():
+    fw = OM_sim_build_fw(2048, seed=3)
+    info = find_crc_and_size(fw)
+    assert info["crc_match"] and info["size_match"]
+    assert info["CRC"] == crc32_stm_fast(fw[:info["FW_size"] - 4])
@@ -0,0 +1,53 @@
+import os
+from blt_fw_repo import FWRepository, FW_parse_name
+from blt_logic import FWInfoCache, find_crc_and_size
+from OM_simulator import OM_sim_build_fw
+
+
+def _write(path, content):
+    path.write_bytes(content)
+    return find_crc_and_size(content)["CRC"]
+
+
+def test_parse_name():
+    assert FW_parse_name("OMMCU_v02_09_07_r.bin") == {"version": "02.09.07", "version_tuple": [2, 9, 7], "kind": "r"}
+    assert FW_parse_name("OMMCU_v02_09_07.bin") is None
+
+
+def test_repository_refresh_and_lookups(tmp_path):
+    old_crc = _write(tmp_path / "OMMCU_v02_09_07_r.bin", OM_sim_build_fw(1024, seed=1))
+    new_crc = _write(tmp_path / "OMMCU_v02_10_00_r.bin", OM_sim_build_fw(1024, seed=2))
+    _write(tmp_path / "OMMCU_v02_11_00_r.bin", OM_sim_build_fw(1024, seed=3)[:-16])
+    _write(tmp_path / "notes.bin", b"\x00" * 16)
+
+    repo = FWRepository(str(tmp_path))
+    changes = repo.refresh()
+    assert sorted(changes["added"]) == ["OMMCU_v02_09_07_r.bin", "OMMCU_v02_10_00_r.bin", "OMMCU_v02_11_00_r.bin"]
+    # The truncated newest file has no CRC and size words: never the latest or found by CRC
+    assert repo.latest("r")["version"] == "02.10.00"
+    assert repo.by_crc(old_crc)["version"] == "02.09.07"
+    assert repo.by_crc(new_crc, kind="m") is None
+    assert not repo.by_version("02.11.00")["valid"]
+
+    reopened = FWRepository(str(tmp_path))
+    assert reopened.refresh() == {"added": [], "updated": [], "removed": []}
+    os.remove(tmp_path / "OMMCU_v02_10_00_r.bin")
+    newer_crc = _write(tmp_path / "OMMCU_v02_09_07_r.bin", OM_sim_build_fw(2048, seed=4))
+    changes = reopened.refresh()
+    assert changes["updated"] == ["OMMCU_v02_09_07_r.bin"] and changes["removed"] == ["OMMCU_v02_10_00_r.bin"]
+    assert reopened.latest("r")["CRC"] == newer_crc
+
+
+def test_info_cache_keeps_content_of_last_files(tmp_path):
+    cache = FWInfoCache(max_files=2)
+    paths = []
+    for seed in range(4):
+        paths.append(tmp_path / f"fw{seed}.bin")
+        _write(paths[-1], OM_sim_build_fw(1024, seed=seed))
+        cache.get(str(paths[-1]))
+    info, view = cache.get(str(paths[0]))
+    assert info["crc_match"] and bytes(view) == paths[0].read_bytes()
+    _write(paths[0], OM_sim_build_fw(2048, seed=9))
+    info, view = cache.get(str(paths[0]))
+    assert info == find_crc_and_size(bytes(view)) | {key: info[key] for key in ("sha256", "fill_runs")}
+    assert info["FW_size"] > 2048
@@ -0,0 +1,157 @@
+import struct
+import threading
+import numpy as np
+import pytest
+from OM_simulator import OMSimBus, OMSimDevice, SimModbusWorker, SIM_bytes_to_registers
+from OM_worker_base import OM_Interface, OM_CMD_SETTLE, OM_CMD_TIMEOUT
+from OM_comm_interface import ModbusRequest, ModbusRequestType, PendingRequests
+from OM_read_planner import OM_plan_reads, OM_IDENTITY_FIELDS, OM_FIELDS
+from OM_data import *
+
+
+@pytest.fixture
+def sim():
+    started = []
+
+    def make(error_rate=0.0, **device_kwargs):
+        bus = OMSimBus([OMSimDevice(slave_id=1, **device_kwargs)], error_rate=error_rate, no_response_time=0.002)
+        worker = SimModbusWorker(bus)
+        worker.start()
+        started.append(worker)
+        return bus, OM_Interface(worker, slave_id=1)
+    yield make
+    for worker in started:
+        worker.stop()
+
+
+def test_decode_byte_order():
+    block = bytearray(OM_SS_DATA_LEN * 2)
+    struct.pack_into("<7fHH", block, 0, 0.25, -0.5, 0.75, 120.0, 360.5, 10.0, -45.0, 0x0102, 0)
+    parsed = OM_SS_parse(SIM_bytes_to_registers(block))
+    assert (parsed["X"], parsed["Y"], parsed["X_pt"], parsed["Y_pt"], parsed["Azt"]) == (0.25, -0.5, 120.0, 360.5, -45.0)
+    assert parsed["Status"] == 0x0102
+    assert OM_parse_CmdState(SIM_bytes_to_registers(struct.pack("<HH", OM_CMD_TAKE_SS, OM_CMD_STATE_DONE))) == \
+        {"Cmd": OM_CMD_TAKE_SS, "State": OM_CMD_STATE_DONE}
+    assert OM_parse_FWVer(SIM_bytes_to_registers(struct.pack("<HHH", 21, 10, 2))) == {"FWVer": "02.10.21"}
+
+
+def test_photo_decode_matches_device(sim):
+    bus, om = sim()
+    dev = bus.devices[0]
+    ss = om.Read_SS_Grayscale_Photo()
+    assert "error" not in ss
+    assert np.array_equal(ss["data"], np.frombuffer(dev.ss_image, "<u2").reshape(OM_SS_PHOTO_HGHT, OM_SS_PHOTO_WDTH))
+    hs = om.Read_Thermal_Photo()
+    assert np.array_equal(hs["data"], np.frombuffer(dev.hs_image, "<f4").reshape(OM_HS_PHOTO_HGHT, OM_HS_PHOTO_WDTH))
+
+
+def test_frame_resume_reads_only_missing_parts(sim):
+    bus, om = sim(error_rate=0.2)
+    first = om.Read_SS_Grayscale_Photo(retry_budget=0)
+    frame = first["frame"]
+    missing = len(frame.missing_parts())
+    assert "error" in first and missing > 0 and first["invalid_lines"] == frame.invalid_lines()
+
+    bus.error_rate = 0.0
+    transactions = bus.transactions
+    resumed = om.Resume_SS_Grayscale_Photo(frame)
+    assert "error" not in resumed and frame.complete
+    assert bus.transactions - transactions == missing
+    expected = np.frombuffer(bus.devices[0].ss_image, "<u2").reshape(OM_SS_PHOTO_HGHT, OM_SS_PHOTO_WDTH)
+    assert np.array_equal(resumed["data"], expected)
+
+
+def test_ss_retries_budget():
+    retries = OMSSRetries(part_retries=2, budget=3)
+    assert retries.failed(0, 0, "e1") and retries.failed(0, 0, "e2")
+    assert not retries.failed(0, 0, "e3")
+    assert retries.failed(1, 0, "e4")
+    assert not retries.failed(2, 0, "e5")
+    assert retries.budget == 0 and retries.last_error == "e5"
+
+
+def test_roi_matches_device_image(sim):
+    bus, om = sim()
+    dev = bus.devices[0]
+    image = np.frombuffer(dev.ss_image, "<u2").reshape(OM_SS_PHOTO_HGHT, OM_SS_PHOTO_WDTH)
+    transactions = bus.transactions
+    roi = om.Read_SS_ROI(100, 50, 260, 70)
+    assert np.array_equal(roi["data"], image[50:70, 100:260])
+    # Columns 100..259 lie in parts 0..2 of the 4 parts per line
+    assert bus.transactions - transactions == 20 * 3
+
+    roi = om.Read_SS_ROI(0, 0, 40, 30, center_on_sun=True)
+    x0, y0 = roi["x0"], roi["y0"]
+    assert abs(x0 + 20 - dev.sun[0]) <= 1 and abs(y0 + 15 - dev.sun[1]) <= 1
+    assert np.array_equal(roi["data"], image[y0:y0 + 30, x0:x0 + 40])
+    assert "error" in om.Read_SS_ROI(10, 10, 10, 20)
+
+
+def test_read_planner_merges_fields(sim):
+    spans = OM_plan_reads(OM_IDENTITY_FIELDS)
+    assert len(spans) == 1
+    assert {field.name for field in spans[0].fields} == set(OM_IDENTITY_FIELDS)
+    split = OM_plan_reads(["FWVer", "SS", "GAM"])
+    assert [span.block for span in split] == sorted({OM_FIELDS[name].block for name in ["FWVer", "SS", "GAM"]})
+    assert all(span.count <= 4 for span in OM_plan_reads(["FWVer", "CurRegion", "MnfID"], max_regs=4))
+
+    bus, om = sim()
+    transactions = bus.transactions
+    fields = om.Data_GetFields(["FWVer", "DevID", "MnfID"], refresh=True)
+    assert bus.transactions - transactions == 1
+    assert fields["data"]["FWVer"] == {"FWVer": "02.10.21"}
+    assert fields["data"]["DevID"] == {"DevID": 1}
+
+
+def _field_request(name: str):
+    field = OM_FIELDS[name]
+    return ModbusRequest(ModbusRequestType.READ, field.block + field.offset, count=field.length, slave_id=1)
+
+
+def test_request_ids_correlate_responses(sim):
+    bus, om = sim()
+    worker = om.modbus_worker
+    fields = ["FWVer", "DevID", "MnfID", "GitHash"]
+    expected = {name: worker.send_request(_field_request(name))["data"] for name in fields}
+    errors = []
+
+    def reader(name):
+        for _ in range(20):
+            if worker.send_request(_field_request(name))["data"] != expected[name]:
+                errors.append(name)
+    threads = [threading.Thread(target=reader, args=(name,)) for name in fields]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+
+    request = _field_request("FWVer")
+    first, second = (worker.send_request(request, blocking=False) for _ in range(2))
+    assert first.id != second.id
+    assert worker.wait_response(first)["data"] == worker.wait_response(second)["data"] == expected["FWVer"]
+
+
+def test_cancelled_request_drops_late_response():
+    pending = PendingRequests()
+    handle = pending.register(ModbusRequest(ModbusRequestType.READ, 0x1000, count=1))
+    pending.cancel(handle)
+    assert not pending.complete(handle, {"data": [1]})
+    assert handle.response is None and not handle.done()
+
+
+def test_wait_for_completion(sim):
+    bus, om = sim()
+    done = om.Exec_And_Wait(om.Cmd_SSTake, OM_CMD_TAKE_SS)
+    assert done["data"]["State"] == OM_CMD_STATE_DONE
+    # The DONE left by the previous run does not complete the next one before the device is done again
+    again = om.Exec_And_Wait(om.Cmd_SSTake, OM_CMD_TAKE_SS)
+    assert again["data"]["elapsed_s"] >= bus.devices[0].take_time[OM_CMD_TAKE_SS]
+
+    bus, om = sim(status_window=False)
+    dev = bus.devices[0]
+    for cmd, state in ((0, 0), (OM_CMD_TAKE_SS, 0x5A5A), (0x1234, OM_CMD_STATE_DONE)):
+        struct.pack_into("<HH", dev.cmd_block, OM_STATUS_OFF * 2, cmd, state)
+        unused = om.Exec_And_Wait(om.Cmd_SSTake, OM_CMD_TAKE_SS)
+        assert unused["data"]["State"] is None
+        assert OM_CMD_SETTLE <= unused["data"]["elapsed_s"] < OM_CMD_TIMEOUT